@@ -0,0 +1,164 @@
+from datetime import timedelta
+from decimal import Decimal
+import numpy as np
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .models import AccountBalance, TransactionLine
+from .utils import NORMAL_DEBIT_TYPES
+
+ANALYTICS_WINDOWS = (30, 90, 365)
+OPERATING_ASSET_CLASSES = ('RECEIVABLE', 'INVENTORY', 'CURRENT')
+
+def _cents(amount):
+    return int((amount or 0) * 100)
+
+def _money(cents):
+    return (Decimal(int(round(cents))) / 100).quantize(Decimal('0.01'))
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
+
+def rolling_mean(values, periods):
+    """Trailing mean over `periods` buckets; NaN until the window is full"""
+    values = np.asarray(values, dtype=float)
+    out = np.full(len(values), np.nan)
+    if 0 < periods <= len(values):
+        sums = np.cumsum(np.concatenate(([0.0], values)))
+        out[periods - 1:] = (sums[periods:] - sums[:-periods]) / periods
+    return out
+
+class LedgerSeries:
+    """Debit/credit movements per (account_type, classification) and time bucket.
+
+    Amounts are int64 cents in arrays of shape (groups, buckets), so every
+    window, rolling average and trend below is array arithmetic over a
+    single load.
+    """
+
+    def __init__(self, keys, dates, debits, credits, opening, freq='day'):
+        self.keys = keys
+        self.dates = dates
+        self.debits = debits
+        self.credits = credits
+        self.opening = opening  # debit-positive net per group before dates[0]
+        self.freq = freq
+
+    @classmethod
+    def load(cls, user, end=None, periods=365, freq='day'):
+        """Load `periods` daily or monthly buckets ending at `end`"""
+        end = end or timezone.now().date()
+        if freq == 'month':
+            start = _add_months(end, -(periods - 1))
+            dates = [_add_months(start, i) for i in range(periods)]
+            bucket = TruncMonth('transaction__date')
+        else:
+            start = end - timedelta(days=periods - 1)
+            dates = [start + timedelta(days=i) for i in range(periods)]
+            bucket = F('transaction__date')
+
+        # No upper bound: movements dated after `end` still have to come off
+        # the stored totals to recover the opening balance
+        rows = list(TransactionLine.objects.filter(
+            account__user=user, transaction__date__gte=start
+        ).annotate(bucket=bucket).values(
+            'bucket', 'account__account_type', 'account__classification'
+        ).annotate(debits=Sum('debit_amount'), credits=Sum('credit_amount')))
+        totals = AccountBalance.objects.filter(account__user=user).values(
+            'account__account_type', 'account__classification'
+        ).annotate(debits=Sum('debit_total'), credits=Sum('credit_total'))
+
+        keys = sorted(
+            {(row['account__account_type'], row['account__classification']) for row in rows}
+            | {(row['account__account_type'], row['account__classification']) for row in totals}
+        )
+        index = {key: i for i, key in enumerate(keys)}
+        debits = np.zeros((len(keys), periods), dtype=np.int64)
+        credits = np.zeros((len(keys), periods), dtype=np.int64)
+        opening = np.zeros(len(keys), dtype=np.int64)
+
+        for row in totals:
+            i = index[(row['account__account_type'], row['account__classification'])]
+            opening[i] += _cents(row['debits']) - _cents(row['credits'])
+        for row in rows:
+            i = index[(row['account__account_type'], row['account__classification'])]
+            debit, credit = _cents(row['debits']), _cents(row['credits'])
+            opening[i] -= debit - credit
+            if freq == 'month':
+                position = (row['bucket'].year - start.year) * 12 + row['bucket'].month - start.month
+            else:
+                position = (row['bucket'] - start).days
+            if position < periods:
+                debits[i, position] += debit
+                credits[i, position] += credit
+
+        return cls(keys, dates, debits, credits, opening, freq)
+
+    def _rows(self, account_type, classifications=None):
+        return [
+            i for i, (kind, classification) in enumerate(self.keys)
+            if kind == account_type and (classifications is None or classification in classifications)
+        ]
+
+    def _sign(self, account_type):
+        return 1 if account_type in NORMAL_DEBIT_TYPES else -1
+
+    def debit_flow(self, account_type, classifications=None):
+        return self.debits[self._rows(account_type, classifications)].sum(axis=0)
+
+    def flow(self, account_type, classifications=None):
+        """Normal-signed net movement per bucket"""
+        rows = self._rows(account_type, classifications)
+        net = self.debits[rows].sum(axis=0) - self.credits[rows].sum(axis=0)
+        return self._sign(account_type) * net
+
+    def level(self, account_type, classifications=None):
+        """Normal-signed closing balance per bucket"""
+        opening = self._sign(account_type) * self.opening[self._rows(account_type, classifications)].sum()
+        return opening + np.cumsum(self.flow(account_type, classifications))
+
+    def net_income(self):
+        return self.flow('REVENUE') - self.flow('EXPENSE')
+
+    def operating_cash_flow(self):
+        """Indirect method per bucket: net income less growth in working capital"""
+        return (
+            self.net_income()
+            - self.flow('ASSET', OPERATING_ASSET_CLASSES)
+            + self.flow('LIABILITY', ('CURRENT',))
+        )
+
+    def window(self, periods):
+        """Flow and average inputs over the trailing `periods` buckets"""
+        periods = max(1, min(periods, len(self.dates)))
+        return {
+            'operating_cash_flow': _money(self.operating_cash_flow()[-periods:].sum()),
+            # Sales on account post as receivable debits
+            'net_credit_sales': _money(self.debit_flow('ASSET', ('RECEIVABLE',))[-periods:].sum()),
+            'average_receivables': _money(self.level('ASSET', ('RECEIVABLE',))[-periods:].mean()),
+            'net_income': _money(self.net_income()[-periods:].sum()),
+            'cash_change': _money(self.flow('ASSET', ('CASH',))[-periods:].sum()),
+        }
+
+    def trends(self, rolling=None):
+        """Chart series in currency units, optionally smoothed by a trailing mean"""
+        series = {
+            'cash': self.level('ASSET', ('CASH',)),
+            'receivables': self.level('ASSET', ('RECEIVABLE',)),
+            'revenue': self.flow('REVENUE'),
+            'expenses': self.flow('EXPENSE'),
+            'net_income': self.net_income(),
+            'operating_cash_flow': self.operating_cash_flow(),
+        }
+        result = {}
+        for name, values in series.items():
+            values = values / 100.0
+            if rolling:
+                values = rolling_mean(values, rolling)
+            result[name] = [None if np.isnan(v) else round(float(v), 2) for v in values]
+        return {
+            'freq': self.freq,
+            'dates': [day.isoformat() for day in self.dates],
+            'series': result,
+        }
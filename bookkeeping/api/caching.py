@@ -0,0 +1,68 @@
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from ..versioning import ledger_version_key, ledger_version
+
+def _stats_key(name, outcome):
+    return f'bookkeeping:response-stats:{name}:{outcome}'
+
+def _count(name, outcome):
+    key = _stats_key(name, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+def response_cache_stats(names):
+    """Hit/miss/not-modified counters per cached endpoint"""
+    outcomes = ('hit', 'miss', 'not_modified')
+    counts = cache.get_many([_stats_key(name, outcome) for name in names for outcome in outcomes])
+    stats = {}
+    for name in names:
+        row = {outcome: counts.get(_stats_key(name, outcome), 0) for outcome in outcomes}
+        served = row['hit'] + row['miss'] + row['not_modified']
+        row['hit_rate'] = round((row['hit'] + row['not_modified']) / served, 3) if served else None
+        stats[name] = row
+    return stats
+
+def versioned_response(request, name, build):
+    """Serve `build()` with a ledger-version ETag and a per-user payload cache.
+
+    The version and the cached (version, payload) pair come back in one
+    get_many, so an unchanged ledger never reaches the ledger tables.
+    Payloads include trailing-window metrics, so the date is part of the
+    version too.
+    """
+    user_id = request.user.pk
+    payload_key = f'bookkeeping:response:{name}:{user_id}'
+    cached = cache.get_many([ledger_version_key(user_id), payload_key])
+    version = cached.get(ledger_version_key(user_id))
+    if version is None:
+        version = ledger_version(user_id)
+    tag = f'{version}-{timezone.now().date():%Y%m%d}'
+    etag = f'"{name}-{user_id}-{tag}"'
+
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        _count(name, 'not_modified')
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        stored = cached.get(payload_key)
+        if stored and stored[0] == tag:
+            _count(name, 'hit')
+            payload = stored[1]
+        else:
+            _count(name, 'miss')
+            # Plain JSON types, so the cached value never drags serializer state along
+            payload = json.loads(json.dumps(build(), cls=DjangoJSONEncoder))
+            cache.set(payload_key, (tag, payload), settings.BOOKKEEPING_RESPONSE_CACHE_TIMEOUT)
+        response = Response(payload)
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,56 @@
+import base64
+from datetime import date
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+class TransactionPagination(PageNumberPagination):
+    """Page numbers by default; pass ?cursor= (empty for the first page) for keyset paging.
+
+    Keyset pages walk (date, id) newest first using the user/date/id index,
+    so there is no COUNT(*) and no OFFSET however deep the client goes.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-date', '-id')
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            day, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(date__lt=day) | Q(date=day, id__lt=pk))
+
+        rows = list(queryset[:page_size + 1])
+        self.next_cursor = self.encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        next_link = None
+        if self.next_cursor:
+            next_link = replace_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor
+            )
+        return Response({'next': next_link, 'results': data})
+
+    def encode_cursor(self, row):
+        # Rows are model instances, or dicts when the lean serializer is in use
+        day, pk = (row['date'], row['id']) if isinstance(row, dict) else (row.date, row.pk)
+        return base64.urlsafe_b64encode(f'{day.isoformat()}|{pk}'.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            day, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return date.fromisoformat(day), int(pk)
+        except ValueError:
+            raise NotFound('Invalid cursor')
@@ -1,3 +1,4 @@
+from django.db import transaction as db_transaction
 from rest_framework import serializers
 from ..models import Account, Transaction, TransactionLine, FinancialStatement
 from django.contrib.auth.models import User
@@ -36,13 +37,51 @@ class TransactionSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         lines_data = validated_data.pop('lines')
-        transaction = Transaction.objects.create(**validated_data)
-        
-        for line_data in lines_data:
-            TransactionLine.objects.create(transaction=transaction, **line_data)
+        # Entry and lines commit together with their AccountBalance updates
+        with db_transaction.atomic():
+            transaction = Transaction.objects.create(**validated_data)
+            
+            for line_data in lines_data:
+                TransactionLine.objects.create(transaction=transaction, **line_data)
         
         return transaction
 
+class LeanTransactionSerializer:
+    """Read-only TransactionSerializer output built from values() rows.
+
+    Lines for the whole page come from one query, so a page of any size
+    costs two queries and no model instances.
+    """
+    fields = ['id', 'date', 'reference_number', 'description', 'status', 'source']
+    line_fields = ['id', 'transaction_id', 'account_id', 'account__name', 'description',
+                   'debit_amount', 'credit_amount']
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    @property
+    def data(self):
+        lines = {}
+        for line in TransactionLine.objects.filter(
+            transaction_id__in=[row['id'] for row in self.rows]
+        ).order_by('id').values(*self.line_fields):
+            lines.setdefault(line['transaction_id'], []).append({
+                'id': line['id'],
+                'account': line['account_id'],
+                'account_name': line['account__name'],
+                'description': line['description'],
+                'debit_amount': str(line['debit_amount']),
+                'credit_amount': str(line['credit_amount']),
+            })
+        return [
+            dict(
+                {field: row[field] for field in self.fields},
+                date=row['date'].isoformat(),
+                lines=lines.get(row['id'], [])
+            )
+            for row in self.rows
+        ]
+
 class MetricsSerializer(serializers.Serializer):
     quick_ratio = serializers.FloatField()
     current_ratio = serializers.FloatField()
@@ -9,6 +9,10 @@ router.register(r'transactions', views.TransactionViewSet, basename='transaction
 urlpatterns = [
     path('', include(router.urls)),
     path('metrics/', views.MetricsAPIView.as_view(), name='metrics'),
+    path('analytics/', views.AnalyticsAPIView.as_view(), name='analytics'),
     path('dashboard/', views.DashboardAPIView.as_view(), name='dashboard'),
+    path('cache-stats/', views.ResponseCacheStatsAPIView.as_view(), name='cache-stats'),
+    path('trial-balance/', views.TrialBalanceAPIView.as_view(), name='trial-balance'),
+    path('imports/statement/', views.StatementImportAPIView.as_view(), name='statement-import'),
     path('auth/', include('rest_framework.urls')),
 ] 
\ No newline at end of file
@@ -1,12 +1,23 @@
+from django.conf import settings
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models import Sum, F
+from rest_framework.parsers import JSONParser, MultiPartParser
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_date
 from ..models import Account, Transaction, TransactionLine
+from ..balances import balance_expression
 from ..metrics import BusinessMetrics
+from ..analytics import ANALYTICS_WINDOWS, LedgerSeries
+from ..utils import build_trial_balance
+from ..ingestion import BulkJournalIngestor
+from ..importers import StatementImporter, PARSERS, detect_format
+from .parsers import NDJSONParser
+from .caching import versioned_response, response_cache_stats
+from .pagination import TransactionPagination
 from .serializers import (
-    AccountSerializer, TransactionSerializer, 
+    AccountSerializer, TransactionSerializer, LeanTransactionSerializer,
     MetricsSerializer, UserSerializer
 )
 
@@ -16,59 +27,226 @@ class AccountViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         return Account.objects.filter(user=self.request.user).annotate(
-            balance=Sum(
-                F('transactionline__debit_amount') - F('transactionline__credit_amount')
-            )
+            balance=balance_expression()
         )
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+def transactions_with_lines(user):
+    """Transactions newest first with lines and their accounts prefetched"""
+    return Transaction.objects.filter(user=user).prefetch_related(
+        Prefetch('lines', queryset=TransactionLine.objects.select_related('account').order_by('id'))
+    ).order_by('-date', '-id')
+
 class TransactionViewSet(viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TransactionPagination
     
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user)
+        return transactions_with_lines(self.request.user)
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
+    def list(self, request, *args, **kwargs):
+        """?lean=1 renders the same shape from values() rows"""
+        if not request.query_params.get('lean'):
+            return super().list(request, *args, **kwargs)
+        queryset = Transaction.objects.filter(user=request.user).order_by('-date', '-id').values(
+            *LeanTransactionSerializer.fields
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(LeanTransactionSerializer(page).data)
+        return Response(LeanTransactionSerializer(queryset).data)
+    
     @action(detail=False, methods=['get'])
     def recent(self, request):
-        recent_transactions = self.get_queryset().order_by('-date')[:5]
+        recent_transactions = self.get_queryset()[:5]
         serializer = self.get_serializer(recent_transactions, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """Create many balanced entries; accepts a JSON array, {"entries": [...]} or NDJSON"""
+        entries = request.data
+        if isinstance(entries, dict):
+            entries = entries.get('entries')
+        if not isinstance(entries, list):
+            return Response(
+                {'error': 'Expected a list of entries'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(entries) > settings.BOOKKEEPING_BULK_MAX_ENTRIES:
+            return Response(
+                {'error': f'At most {settings.BOOKKEEPING_BULK_MAX_ENTRIES} entries per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', 0)) or None
+        except ValueError:
+            return Response(
+                {'error': 'chunk_size must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ingestor = BulkJournalIngestor(request.user, chunk_size=chunk_size)
+        outcome = ingestor.ingest(entries)
+        if entries and outcome['summary']['invalid'] == len(entries):
+            # Nothing was writable; the per-entry results carry the line errors
+            return Response(outcome, status=status.HTTP_400_BAD_REQUEST)
+        return Response(outcome)
 
 class MetricsAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
+        return versioned_response(request, 'metrics', lambda: self.build_payload(request))
+    
+    def build_payload(self, request):
         metrics = BusinessMetrics(request.user)
-        serializer = MetricsSerializer(metrics.get_all_metrics())
-        return Response(serializer.data)
+        return MetricsSerializer(metrics.get_all_metrics()).data
+
+def _bounded_int(value, maximum):
+    """Positive int clamped to maximum; None when absent, ValueError otherwise"""
+    if value in (None, ''):
+        return None
+    number = int(value)
+    if number < 1:
+        raise ValueError(value)
+    return min(number, maximum)
+
+class AnalyticsAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        """Trailing-window metrics and trend series; ?freq=day|month&periods=&rolling=&windows=30,90"""
+        freq = request.query_params.get('freq', 'day')
+        if freq not in ('day', 'month'):
+            return Response({'error': 'freq must be day or month'}, status=status.HTTP_400_BAD_REQUEST)
+        max_periods = settings.BOOKKEEPING_ANALYTICS_MAX_PERIODS
+        try:
+            windows = list(dict.fromkeys(
+                _bounded_int(value, max_periods['day'])
+                for value in request.query_params.get('windows', '').split(',') if value
+            )) or list(ANALYTICS_WINDOWS)
+            periods = _bounded_int(request.query_params.get('periods'), max_periods[freq])
+            periods = periods or (12 if freq == 'month' else max(windows))
+            rolling = _bounded_int(request.query_params.get('rolling'), max_periods[freq])
+        except ValueError:
+            return Response(
+                {'error': 'windows, periods and rolling must be positive integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(windows) > settings.BOOKKEEPING_ANALYTICS_MAX_WINDOWS:
+            return Response(
+                {'error': f'At most {settings.BOOKKEEPING_ANALYTICS_MAX_WINDOWS} windows per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if freq == 'day':
+            # Windows and trends share one daily series
+            window_days = getattr(settings, 'BOOKKEEPING_METRICS_WINDOW_DAYS', 365)
+            series = LedgerSeries.load(request.user, periods=max([periods, window_days] + windows))
+            metrics = BusinessMetrics(request.user, series=series)
+        else:
+            series = LedgerSeries.load(request.user, periods=periods, freq='month')
+            metrics = BusinessMetrics(request.user)
+        
+        trends = series.trends(rolling)
+        if freq == 'day' and len(trends['dates']) > periods:
+            trends['dates'] = trends['dates'][-periods:]
+            trends['series'] = {name: values[-periods:] for name, values in trends['series'].items()}
+        return Response({
+            'windows': metrics.get_window_metrics(windows),
+            'trends': trends,
+        })
 
 class DashboardAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
+        return versioned_response(request, 'dashboard', lambda: self.build_payload(request))
+    
+    def build_payload(self, request):
         # Get account balances
         accounts = Account.objects.filter(user=request.user).annotate(
-            balance=Sum(
-                F('transactionline__debit_amount') - F('transactionline__credit_amount')
-            )
+            balance=balance_expression()
         )
         
         # Get recent transactions
-        recent_transactions = Transaction.objects.filter(
-            user=request.user
-        ).order_by('-date')[:5]
+        recent_transactions = transactions_with_lines(request.user)[:5]
         
         # Get metrics
         metrics = BusinessMetrics(request.user)
         
-        return Response({
+        return {
             'accounts': AccountSerializer(accounts, many=True).data,
             'recent_transactions': TransactionSerializer(recent_transactions, many=True).data,
             'metrics': MetricsSerializer(metrics.get_all_metrics()).data
-        }) 
\ No newline at end of file
+        }
+
+class ResponseCacheStatsAPIView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request):
+        return Response(response_cache_stats(['dashboard', 'metrics']))
+
+
+class TrialBalanceAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        """Trial balance; pass several comma-separated as_of dates for a side-by-side comparison"""
+        try:
+            as_of_dates = [
+                self._parse_date(value)
+                for value in request.query_params.get('as_of', '').split(',') if value
+            ]
+            start_date = self._parse_date(request.query_params.get('start_date'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        trial_balance = build_trial_balance(request.user, as_of_dates, start_date)
+        return Response(trial_balance.as_dict())
+    
+    def _parse_date(self, value):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError(f'Invalid date: {value}')
+        return parsed
+
+class StatementImportAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+    
+    def post(self, request):
+        """Import an uploaded bank statement file"""
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            fmt = request.data.get('format') or detect_format(upload.name)
+            if fmt not in PARSERS:
+                raise ValueError(f'Unsupported statement format: {fmt}')
+            bank_account = Account.objects.get(pk=request.data.get('bank_account'), user=request.user)
+            default_account = Account.objects.get(pk=request.data.get('default_account'), user=request.user)
+            start = int(request.data.get('resume_from') or 0)
+        except (ValueError, Account.DoesNotExist) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        importer = StatementImporter(request.user, bank_account, default_account)
+        try:
+            result = importer.run(upload, fmt, start=start)
+        except Exception as e:
+            return Response(
+                {'error': str(e), 'resume_position': importer.last_position},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return Response(result.as_dict())
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+class BookkeepingConfig(AppConfig):
+    name = 'bookkeeping'
+
+    def ready(self):
+        from . import signals  # noqa: F401
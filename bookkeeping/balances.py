@@ -0,0 +1,121 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Sum, Count, Max, Value, DateField, DecimalField
+from django.db.models.functions import Coalesce, Greatest
+from .models import AccountBalance, TransactionLine
+
+ZERO = Decimal('0')
+
+class BalanceDelta:
+    """Pending change to one account's running totals"""
+    __slots__ = ('debit', 'credit', 'count', 'last_date')
+
+    def __init__(self):
+        self.debit = ZERO
+        self.credit = ZERO
+        self.count = 0
+        self.last_date = None
+
+    def add(self, debit, credit, count, date=None):
+        self.debit += debit or ZERO
+        self.credit += credit or ZERO
+        self.count += count
+        if date and count > 0 and (self.last_date is None or date > self.last_date):
+            self.last_date = date
+
+def balance_expression(prefix=''):
+    """Debit-minus-credit balance read from the materialized AccountBalance row"""
+    return Coalesce(
+        F(f'{prefix}ledger_balance__debit_total') - F(f'{prefix}ledger_balance__credit_total'),
+        Value(ZERO),
+        output_field=DecimalField(max_digits=16, decimal_places=2)
+    )
+
+def collect_line_deltas(lines, sign=1, deltas=None):
+    """Aggregate (account_id, debit, credit, date) tuples into per-account deltas"""
+    deltas = {} if deltas is None else deltas
+    for account_id, debit, credit, date in lines:
+        deltas.setdefault(account_id, BalanceDelta()).add(
+            sign * (debit or ZERO), sign * (credit or ZERO), sign, date
+        )
+    return deltas
+
+def apply_balance_deltas(deltas):
+    """Apply per-account deltas to AccountBalance inside the caller's transaction"""
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        existing = set(AccountBalance.objects.select_for_update().filter(
+            account_id__in=deltas.keys()
+        ).values_list('account_id', flat=True))
+        AccountBalance.objects.bulk_create(
+            [AccountBalance(account_id=account_id) for account_id in deltas if account_id not in existing],
+            ignore_conflicts=True
+        )
+
+        for account_id, delta in deltas.items():
+            updates = {
+                'debit_total': F('debit_total') + delta.debit,
+                'credit_total': F('credit_total') + delta.credit,
+                'line_count': F('line_count') + delta.count,
+            }
+            if delta.last_date:
+                last_date = Value(delta.last_date, output_field=DateField())
+                updates['last_posted_date'] = Coalesce(Greatest('last_posted_date', last_date), last_date)
+            AccountBalance.objects.filter(account_id=account_id).update(**updates)
+
+def _ledger_totals(user=None):
+    lines = TransactionLine.objects.all()
+    if user is not None:
+        lines = lines.filter(account__user=user)
+    return {
+        row['account_id']: row
+        for row in lines.values('account_id').annotate(
+            debits=Sum('debit_amount'),
+            credits=Sum('credit_amount'),
+            lines=Count('id'),
+            last_date=Max('transaction__date'),
+        )
+    }
+
+def rebuild_account_balances(user=None):
+    """Recompute AccountBalance rows from the ledger in one grouped query"""
+    totals = _ledger_totals(user)
+
+    with transaction.atomic():
+        existing = AccountBalance.objects.all()
+        if user is not None:
+            existing = existing.filter(account__user=user)
+        existing.delete()
+        AccountBalance.objects.bulk_create([
+            AccountBalance(
+                account_id=account_id,
+                debit_total=row['debits'] or ZERO,
+                credit_total=row['credits'] or ZERO,
+                line_count=row['lines'],
+                last_posted_date=row['last_date'],
+            )
+            for account_id, row in totals.items()
+        ], batch_size=1000)
+
+    return len(totals)
+
+def verify_account_balances(user=None):
+    """Return accounts whose materialized totals disagree with the ledger"""
+    totals = _ledger_totals(user)
+    stored = AccountBalance.objects.all()
+    if user is not None:
+        stored = stored.filter(account__user=user)
+    stored = {b.account_id: b for b in stored}
+
+    mismatches = []
+    for account_id in set(totals) | set(stored):
+        row = totals.get(account_id, {})
+        expected = (row.get('debits') or ZERO, row.get('credits') or ZERO, row.get('lines', 0))
+        balance = stored.get(account_id)
+        actual = (balance.debit_total, balance.credit_total, balance.line_count) if balance else (ZERO, ZERO, 0)
+        if expected != actual:
+            mismatches.append({'account_id': account_id, 'expected': expected, 'actual': actual})
+
+    return mismatches
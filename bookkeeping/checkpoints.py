@@ -0,0 +1,177 @@
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncMonth
+from .models import AccountBalance, AccountBalanceCheckpoint, TransactionLine
+
+ZERO = Decimal('0')
+
+def month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+def last_closed_month_end(today=None):
+    today = today or date.today()
+    return today.replace(day=1) - timedelta(days=1)
+
+def _nearest_checkpoint(account_id, as_of_date):
+    return AccountBalanceCheckpoint.objects.filter(
+        account_id=account_id, as_of__lte=as_of_date
+    ).order_by('-as_of').values_list('as_of', 'debit_total', 'credit_total').first()
+
+def totals_as_of(account_id, as_of_date):
+    """(debits, credits) through as_of_date: nearest checkpoint plus the lines after it.
+
+    Read-only; checkpoints are only written by roll_forward_checkpoints and
+    rebuild_checkpoints, which hold the writers' balance locks.
+    """
+    checkpoint = _nearest_checkpoint(account_id, as_of_date)
+    lines = TransactionLine.objects.filter(account_id=account_id, transaction__date__lte=as_of_date)
+    debits, credits = ZERO, ZERO
+    if checkpoint:
+        lines = lines.filter(transaction__date__gt=checkpoint[0])
+        debits, credits = checkpoint[1], checkpoint[2]
+
+    tail = lines.aggregate(debits=Sum('debit_amount'), credits=Sum('credit_amount'))
+    return debits + (tail['debits'] or ZERO), credits + (tail['credits'] or ZERO)
+
+def user_totals_as_of(user, as_of_date):
+    """{account_id: (debits, credits)} through as_of_date for all of a user's accounts.
+
+    Two grouped queries: each account's nearest checkpoint, then the lines
+    no checkpoint at or before as_of_date covers.
+    """
+    covering = AccountBalanceCheckpoint.objects.filter(account_id=OuterRef('account_id'), as_of__lte=as_of_date)
+    totals = {
+        account_id: (debits, credits)
+        for account_id, debits, credits in AccountBalanceCheckpoint.objects.filter(
+            account__user=user,
+            as_of=Subquery(covering.order_by('-as_of').values('as_of')[:1])
+        ).values_list('account_id', 'debit_total', 'credit_total')
+    }
+    tail = TransactionLine.objects.filter(
+        account__user=user, transaction__date__lte=as_of_date
+    ).filter(
+        ~Exists(covering.filter(as_of__gte=OuterRef('transaction__date')))
+    ).values('account_id').annotate(debits=Sum('debit_amount'), credits=Sum('credit_amount'))
+    for row in tail:
+        debits, credits = totals.get(row['account_id'], (ZERO, ZERO))
+        totals[row['account_id']] = (debits + (row['debits'] or ZERO), credits + (row['credits'] or ZERO))
+    return totals
+
+def invalidate_checkpoints(account_ids, since):
+    """Drop checkpoints a back-dated change has made wrong; older ones stay valid"""
+    return AccountBalanceCheckpoint.objects.filter(
+        account_id__in=account_ids, as_of__gte=since
+    ).delete()[0]
+
+def _lock_balances(user=None, account_ids=None):
+    """Take the AccountBalance row locks every ledger write holds until it commits.
+
+    While they are held no line can land between reading the ledger and
+    writing checkpoints built from it.
+    """
+    balances = AccountBalance.objects.select_for_update()
+    if user is not None:
+        balances = balances.filter(account__user=user)
+    if account_ids is not None:
+        balances = balances.filter(account_id__in=account_ids)
+    list(balances.values_list('pk', flat=True))
+
+def roll_forward_checkpoints(user=None, account_ids=None, through=None):
+    """Extend each account's checkpoints past its latest one, up to the last closed month.
+
+    Re-creates what invalidate_checkpoints dropped and adds months closed
+    since, reading only lines newer than each account's latest checkpoint.
+    """
+    through = through or last_closed_month_end()
+    with transaction.atomic():
+        _lock_balances(user, account_ids)
+        return _roll_forward(user, account_ids, through)
+
+def _roll_forward(user, account_ids, through):
+    covering = AccountBalanceCheckpoint.objects.filter(account_id=OuterRef('account_id'), as_of__lte=through)
+    checkpoints = AccountBalanceCheckpoint.objects.filter(
+        as_of=Subquery(covering.order_by('-as_of').values('as_of')[:1])
+    )
+    lines = TransactionLine.objects.filter(transaction__date__lte=through).filter(
+        ~Exists(covering.filter(as_of__gte=OuterRef('transaction__date')))
+    )
+    if user is not None:
+        checkpoints = checkpoints.filter(account__user=user)
+        lines = lines.filter(account__user=user)
+    if account_ids is not None:
+        checkpoints = checkpoints.filter(account_id__in=account_ids)
+        lines = lines.filter(account_id__in=account_ids)
+
+    running = {
+        account_id: (as_of, debits, credits)
+        for account_id, as_of, debits, credits in checkpoints.values_list(
+            'account_id', 'as_of', 'debit_total', 'credit_total'
+        )
+    }
+    monthly = lines.annotate(
+        month=TruncMonth('transaction__date')
+    ).values('account_id', 'month').annotate(
+        debits=Sum('debit_amount'),
+        credits=Sum('credit_amount')
+    ).order_by('account_id', 'month')
+
+    new = []
+    for row in monthly:
+        _, debits, credits = running.get(row['account_id'], (None, ZERO, ZERO))
+        debits += row['debits'] or ZERO
+        credits += row['credits'] or ZERO
+        as_of = month_end(row['month'])
+        running[row['account_id']] = (as_of, debits, credits)
+        new.append(AccountBalanceCheckpoint(
+            account_id=row['account_id'],
+            as_of=as_of,
+            debit_total=debits,
+            credit_total=credits,
+        ))
+
+    AccountBalanceCheckpoint.objects.bulk_create(new, batch_size=1000, ignore_conflicts=True)
+    return len(new)
+
+def rebuild_checkpoints(user=None, through=None):
+    """Recompute month-end checkpoints up to the last closed month in one grouped query.
+
+    Only months with activity get a row; an as-of query landing in a quiet
+    month reads the previous checkpoint and finds no lines after it.
+    """
+    through = through or last_closed_month_end()
+    with transaction.atomic():
+        _lock_balances(user)
+        lines = TransactionLine.objects.filter(transaction__date__lte=through)
+        if user is not None:
+            lines = lines.filter(account__user=user)
+        monthly = lines.annotate(
+            month=TruncMonth('transaction__date')
+        ).values('account_id', 'month').annotate(
+            debits=Sum('debit_amount'),
+            credits=Sum('credit_amount')
+        ).order_by('account_id', 'month')
+
+        checkpoints = []
+        running = {}
+        for row in monthly:
+            debits, credits = running.get(row['account_id'], (ZERO, ZERO))
+            debits += row['debits'] or ZERO
+            credits += row['credits'] or ZERO
+            running[row['account_id']] = (debits, credits)
+            checkpoints.append(AccountBalanceCheckpoint(
+                account_id=row['account_id'],
+                as_of=month_end(row['month']),
+                debit_total=debits,
+                credit_total=credits,
+            ))
+
+        existing = AccountBalanceCheckpoint.objects.all()
+        if user is not None:
+            existing = existing.filter(account__user=user)
+        existing.delete()
+        AccountBalanceCheckpoint.objects.bulk_create(checkpoints, batch_size=1000)
+
+    return len(checkpoints)
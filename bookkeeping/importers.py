@@ -0,0 +1,304 @@
+import csv
+import hashlib
+import io
+import re
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import iterparse
+from django.conf import settings
+from .models import Account
+from .ingestion import write_entries
+
+class StatementRow:
+    """One parsed statement line; position is where a resumed import should restart"""
+    __slots__ = ('date', 'amount', 'description', 'reference', 'counterparty', 'position')
+
+    def __init__(self, date, amount, description, reference='', counterparty='', position=0):
+        self.date = date
+        self.amount = amount
+        self.description = description
+        self.reference = reference
+        self.counterparty = counterparty
+        self.position = position
+
+class RejectedRow(Exception):
+    pass
+
+def _parse_amount(value):
+    try:
+        return Decimal(str(value).replace(',', '').strip())
+    except InvalidOperation:
+        raise RejectedRow(f'Invalid amount: {value!r}')
+
+def _parse_date(value, formats):
+    value = value.strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise RejectedRow(f'Invalid date: {value!r}')
+
+def iter_csv_rows(fileobj, start=0, columns=None, date_formats=('%Y-%m-%d', '%m/%d/%Y')):
+    """Yield rows from a CSV statement with a header line; start is a data row ordinal.
+
+    One csv.reader over the decoded stream, so quoted fields may span lines.
+    """
+    columns = columns or {}
+    fileobj.seek(0)
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        header = next(reader, [])
+        index = {name.strip().lower(): i for i, name in enumerate(header)}
+
+        def field(values, name):
+            column = index.get(columns.get(name, name))
+            return values[column] if column is not None and column < len(values) else ''
+
+        ordinal = 0
+        while True:
+            try:
+                values = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                ordinal += 1
+                if ordinal > start:
+                    yield RejectedRow(f'Row {ordinal}: {e}')
+                continue
+            except UnicodeDecodeError as e:
+                # The decoder cannot resync mid-stream; report where it stopped
+                yield RejectedRow(f'Row {ordinal + 1}: {e}')
+                return
+            if not any(value.strip() for value in values):
+                continue
+            ordinal += 1
+            if ordinal <= start:
+                continue
+            try:
+                amount = field(values, 'amount')
+                if not amount:
+                    amount = _parse_amount(field(values, 'credit') or 0) - _parse_amount(field(values, 'debit') or 0)
+                yield StatementRow(
+                    date=_parse_date(field(values, 'date'), date_formats),
+                    amount=_parse_amount(amount),
+                    description=field(values, 'description'),
+                    reference=field(values, 'reference'),
+                    counterparty=field(values, 'account'),
+                    position=ordinal,
+                )
+            except RejectedRow as e:
+                yield RejectedRow(f'Row {ordinal}: {e}')
+    finally:
+        # Hand the caller's file back open
+        text.detach()
+
+def _iter_blocks(fileobj, start, opening, closing, chunk_size=64 * 1024):
+    """Yield (block, end_offset) for every opening..closing block, reading in fixed chunks"""
+    fileobj.seek(start)
+    offset = start
+    buffer = b''
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return
+        buffer += chunk
+        while True:
+            end = buffer.find(closing)
+            if end == -1:
+                # Only keep the unfinished block (or a possible partial tag) so memory stays bounded
+                begin = buffer.rfind(opening)
+                if begin == -1:
+                    begin = max(len(buffer) - len(opening), 0)
+                offset += begin
+                buffer = buffer[begin:]
+                break
+            end += len(closing)
+            begin = buffer.find(opening)
+            offset += end
+            if 0 <= begin < end:
+                yield buffer[begin:end], offset
+            buffer = buffer[end:]
+
+OFX_FIELD = re.compile(rb'<(DTPOSTED|TRNAMT|FITID|NAME|MEMO)>([^<\r\n]*)', re.IGNORECASE)
+
+def iter_ofx_rows(fileobj, start=0):
+    """Yield rows from OFX/QFX STMTTRN blocks; start is a byte offset"""
+    for block, position in _iter_blocks(fileobj, start, b'<STMTTRN>', b'</STMTTRN>'):
+        fields = {name.upper().decode(): value.strip().decode('latin-1') for name, value in OFX_FIELD.findall(block)}
+        try:
+            yield StatementRow(
+                date=_parse_date(fields.get('DTPOSTED', '')[:8], ('%Y%m%d',)),
+                amount=_parse_amount(fields.get('TRNAMT', '')),
+                description=fields.get('NAME') or fields.get('MEMO', ''),
+                reference=fields.get('FITID', ''),
+                position=position,
+            )
+        except RejectedRow as e:
+            yield RejectedRow(f'Byte {position}: {e}')
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def _find_text(element, name):
+    """Text of the first descendant with the given local name, ignoring namespaces"""
+    for child in element.iter():
+        if _local(child.tag) == name and child.text:
+            return child.text.strip()
+    return ''
+
+def iter_camt_rows(fileobj, start=0):
+    """Yield rows from camt.053 Ntry elements; start is an entry ordinal"""
+    fileobj.seek(0)
+    ordinal = 0
+    parents = []
+    for event, element in iterparse(fileobj, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        if _local(element.tag) != 'Ntry':
+            continue
+        ordinal += 1
+        if ordinal > start:
+            try:
+                amount = _parse_amount(_find_text(element, 'Amt'))
+                if _find_text(element, 'CdtDbtInd') == 'DBIT':
+                    amount = -amount
+                yield StatementRow(
+                    date=_parse_date(_find_text(element, 'Dt')[:10], ('%Y-%m-%d',)),
+                    amount=amount,
+                    description=_find_text(element, 'Ustrd') or _find_text(element, 'AddtlNtryInf'),
+                    reference=_find_text(element, 'AcctSvcrRef') or _find_text(element, 'NtryRef'),
+                    position=ordinal,
+                )
+            except RejectedRow as e:
+                yield RejectedRow(f'Entry {ordinal}: {e}')
+        # Detach the entry too; clear() alone leaves an empty Ntry per row on the Stmt
+        if parents:
+            parents[-1].remove(element)
+
+PARSERS = {
+    'csv': iter_csv_rows,
+    'ofx': iter_ofx_rows,
+    'qfx': iter_ofx_rows,
+    'camt': iter_camt_rows,
+    'xml': iter_camt_rows,
+}
+
+def detect_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in PARSERS:
+        raise ValueError(f'Unsupported statement format: {filename}')
+    return extension
+
+class ImportResult:
+    def __init__(self, start):
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.rejections = []
+        self.resume_position = start
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'rejections': self.rejections,
+            'resume_position': self.resume_position,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows / self.elapsed, 1) if self.elapsed else None,
+        }
+
+class StatementImporter:
+    """Stream a bank statement into balanced IMPORT entries in bounded batches"""
+    max_rejections_kept = 100
+
+    def __init__(self, user, bank_account, default_account, batch_size=None):
+        self.user = user
+        self.bank_account = bank_account
+        self.default_account = default_account
+        self.batch_size = batch_size or settings.BOOKKEEPING_BULK_CHUNK_SIZE
+        self._accounts = None
+        self.last_position = 0
+
+    def run(self, fileobj, fmt, start=0):
+        self.last_position = start
+        result = ImportResult(start)
+        batch = []
+        for row in PARSERS[fmt](fileobj, start):
+            result.rows += 1
+            if isinstance(row, RejectedRow):
+                self._reject(result, str(row))
+                continue
+            try:
+                batch.append((row.position, self._build_entry(row)))
+            except RejectedRow as e:
+                self._reject(result, f'Position {row.position}: {e}')
+                continue
+            if len(batch) >= self.batch_size:
+                self._flush(batch, result)
+                batch = []
+        self._flush(batch, result)
+        return result
+
+    def _reject(self, result, message):
+        result.rejected += 1
+        if len(result.rejections) < self.max_rejections_kept:
+            result.rejections.append(message)
+
+    def _flush(self, batch, result):
+        if not batch:
+            return
+        outcome = write_entries(self.user, [entry for _, entry in batch], source='IMPORT')
+        created = sum(1 for _, was_created in outcome if was_created)
+        result.imported += created
+        result.duplicates += len(outcome) - created
+        result.resume_position = self.last_position = batch[-1][0]
+
+    def _lookup_account(self, account_number):
+        """Map counterparty account numbers to ids from a table loaded once per import"""
+        if self._accounts is None:
+            self._accounts = dict(Account.objects.filter(
+                user=self.user, is_active=True
+            ).values_list('account_number', 'id'))
+        if not account_number:
+            return self.default_account.id
+        try:
+            return self._accounts[account_number]
+        except KeyError:
+            raise RejectedRow(f'Unknown account {account_number!r}')
+
+    def _build_entry(self, row):
+        if not row.amount:
+            raise RejectedRow('Zero amount')
+        counter_account = self._lookup_account(row.counterparty)
+        amount = abs(row.amount)
+        fingerprint = row.reference or hashlib.sha1(
+            f'{row.date}|{row.amount}|{row.description}|{row.position}'.encode()
+        ).hexdigest()[:20]
+        bank_line = (self.bank_account.id, row.description[:200], amount, Decimal('0'))
+        counter_line = (counter_account, row.description[:200], Decimal('0'), amount)
+        if row.amount < 0:
+            bank_line, counter_line = (
+                (self.bank_account.id, row.description[:200], Decimal('0'), amount),
+                (counter_account, row.description[:200], amount, Decimal('0')),
+            )
+        return {
+            'date': row.date,
+            'reference_number': (row.reference or fingerprint)[:50],
+            'description': row.description or 'Imported transaction',
+            'status': 'POSTED',
+            'idempotency_key': f'import:{self.bank_account.id}:{fingerprint}'[:100],
+            'lines': [bank_line, counter_line],
+        }
@@ -0,0 +1,272 @@
+import time
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db import transaction as db_transaction, IntegrityError
+from django.utils.dateparse import parse_date
+from .models import Account, Transaction, TransactionLine
+from .balances import collect_line_deltas, apply_balance_deltas
+from .signals import ledger_changed
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+# TransactionLine amounts are max_digits=10, decimal_places=2
+MAX_AMOUNT = Decimal('100000000')
+
+def parse_amount(value):
+    """Parse a line amount, or return None if it would not fit a TransactionLine column"""
+    try:
+        amount = Decimal(str(value or 0))
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or abs(amount) >= MAX_AMOUNT or amount != amount.quantize(CENT):
+        return None
+    return amount.quantize(CENT)
+
+def write_entries(user, entries, source='MANUAL'):
+    """Write normalized, balanced entries with bulk_create in one DB transaction.
+
+    Each entry is a dict with date, reference_number, description, status,
+    idempotency_key and lines of (account_id, description, debit, credit).
+    Returns a (transaction_id, created) pair per entry, in input order.
+    """
+    keys = [entry['idempotency_key'] for entry in entries if entry.get('idempotency_key')]
+    existing = dict(Transaction.objects.filter(
+        user=user, idempotency_key__in=keys
+    ).values_list('idempotency_key', 'id')) if keys else {}
+
+    results = [None] * len(entries)
+    first_seen = {}
+    repeats = []
+    pending = []
+    for position, entry in enumerate(entries):
+        key = entry.get('idempotency_key')
+        if key in existing:
+            results[position] = (existing[key], False)
+        elif key and key in first_seen:
+            repeats.append((position, first_seen[key]))
+        else:
+            if key:
+                first_seen[key] = position
+            pending.append((position, entry))
+
+    if not pending:
+        return results
+
+    with db_transaction.atomic():
+        transactions = Transaction.objects.bulk_create([
+            Transaction(
+                user=user,
+                date=entry['date'],
+                reference_number=entry['reference_number'],
+                description=entry['description'],
+                status=entry.get('status', 'PENDING'),
+                source=source,
+                idempotency_key=entry.get('idempotency_key'),
+            )
+            for _, entry in pending
+        ])
+
+        lines = []
+        for txn, (_, entry) in zip(transactions, pending):
+            for account_id, description, debit, credit in entry['lines']:
+                lines.append(TransactionLine(
+                    transaction=txn,
+                    account_id=account_id,
+                    description=description,
+                    debit_amount=debit,
+                    credit_amount=credit,
+                ))
+        TransactionLine.objects.bulk_create(lines, batch_size=1000)
+
+        deltas = collect_line_deltas(
+            (line.account_id, line.debit_amount, line.credit_amount, line.transaction.date)
+            for line in lines
+        )
+        apply_balance_deltas(deltas)
+
+    for txn, (position, _) in zip(transactions, pending):
+        results[position] = (txn.id, True)
+    for position, original in repeats:
+        results[position] = (results[original][0], False)
+
+    ledger_changed.send(
+        sender=Transaction, user_id=user.pk, account_ids=list(deltas),
+        since=min(txn.date for txn in transactions)
+    )
+    return results
+
+def replace_entries(user, entries_by_id):
+    """Overwrite existing transactions {transaction_id: entry} and their lines in bulk"""
+    if not entries_by_id:
+        return
+
+    with db_transaction.atomic():
+        transactions = Transaction.objects.filter(user=user).in_bulk(list(entries_by_id))
+        if not transactions:
+            return
+        since = min(txn.date for txn in transactions.values())
+        # Reverse the old lines as one delta set; _raw_delete skips the per-line
+        # post_delete receivers (TransactionLine has no dependents to cascade to)
+        old_lines = TransactionLine.objects.filter(transaction_id__in=transactions.keys())
+        deltas = collect_line_deltas(
+            old_lines.values_list('account_id', 'debit_amount', 'credit_amount', 'transaction__date'),
+            sign=-1
+        )
+        old_lines._raw_delete(old_lines.db)
+
+        lines = []
+        for transaction_id, txn in transactions.items():
+            entry = entries_by_id[transaction_id]
+            txn.date = entry['date']
+            txn.reference_number = entry['reference_number']
+            txn.description = entry['description']
+            txn.status = entry.get('status', txn.status)
+            for account_id, description, debit, credit in entry['lines']:
+                lines.append(TransactionLine(
+                    transaction=txn,
+                    account_id=account_id,
+                    description=description,
+                    debit_amount=debit,
+                    credit_amount=credit,
+                ))
+        Transaction.objects.bulk_update(
+            transactions.values(), ['date', 'reference_number', 'description', 'status']
+        )
+        TransactionLine.objects.bulk_create(lines, batch_size=1000)
+
+        collect_line_deltas(
+            ((line.account_id, line.debit_amount, line.credit_amount, line.transaction.date) for line in lines),
+            deltas=deltas
+        )
+        apply_balance_deltas(deltas)
+
+    ledger_changed.send(
+        sender=Transaction, user_id=user.pk, account_ids=list(deltas),
+        since=min([since] + [txn.date for txn in transactions.values()])
+    )
+
+class BulkJournalIngestor:
+    """Validate and write large batches of journal entries in atomic chunks"""
+
+    def __init__(self, user, chunk_size=None, source='MANUAL'):
+        self.user = user
+        self.chunk_size = chunk_size or settings.BOOKKEEPING_BULK_CHUNK_SIZE
+        self.source = source
+        self._account_ids = None
+
+    def ingest(self, payload):
+        """Ingest raw entry dicts; returns per-entry results and a summary"""
+        started = time.monotonic()
+        results = [None] * len(payload)
+        valid = []
+        total_debit = total_credit = ZERO
+
+        # Single pass: normalize, validate and balance-check every entry
+        for index, raw in enumerate(payload):
+            entry, errors = self._normalize(raw)
+            if errors:
+                results[index] = {'index': index, 'status': 'invalid', 'errors': errors}
+                continue
+            total_debit += sum(line[2] for line in entry['lines'])
+            total_credit += sum(line[3] for line in entry['lines'])
+            valid.append((index, entry))
+
+        chunks = 0
+        for start in range(0, len(valid), self.chunk_size):
+            chunk = valid[start:start + self.chunk_size]
+            chunks += 1
+            self._write_chunk(chunk, results)
+
+        statuses = [result['status'] for result in results]
+        return {
+            'results': results,
+            'summary': {
+                'received': len(payload),
+                'created': statuses.count('created'),
+                'duplicates': statuses.count('duplicate'),
+                'invalid': statuses.count('invalid'),
+                'failed': statuses.count('failed'),
+                'total_debit': total_debit,
+                'total_credit': total_credit,
+                'chunks': chunks,
+                'elapsed_seconds': round(time.monotonic() - started, 3),
+            }
+        }
+
+    def _write_chunk(self, chunk, results):
+        entries = [entry for _, entry in chunk]
+        try:
+            outcome = write_entries(self.user, entries, self.source)
+        except IntegrityError:
+            # A concurrent request claimed one of our keys; the retry sees it as existing
+            try:
+                outcome = write_entries(self.user, entries, self.source)
+            except IntegrityError as e:
+                for index, _ in chunk:
+                    results[index] = {'index': index, 'status': 'failed', 'errors': [str(e)]}
+                return
+
+        for (index, _), (transaction_id, created) in zip(chunk, outcome):
+            results[index] = {
+                'index': index,
+                'status': 'created' if created else 'duplicate',
+                'id': transaction_id,
+            }
+
+    def _get_account_ids(self):
+        if self._account_ids is None:
+            self._account_ids = set(Account.objects.filter(
+                user=self.user, is_active=True
+            ).values_list('id', flat=True))
+        return self._account_ids
+
+    def _normalize(self, raw):
+        errors = []
+        if not isinstance(raw, dict):
+            return None, ['Entry must be an object']
+
+        try:
+            date = parse_date(str(raw.get('date') or ''))
+        except ValueError:
+            date = None
+        if date is None:
+            errors.append('date is required (YYYY-MM-DD)')
+        for field in ('reference_number', 'description'):
+            if not raw.get(field):
+                errors.append(f'{field} is required')
+        status = raw.get('status', 'PENDING')
+        if status not in dict(Transaction._meta.get_field('status').choices):
+            errors.append(f'Invalid status: {status}')
+
+        lines = []
+        raw_lines = raw.get('lines') or []
+        if len(raw_lines) < 2:
+            errors.append('At least two lines are required')
+        for number, line in enumerate(raw_lines):
+            if not isinstance(line, dict):
+                errors.append(f'Line {number}: must be an object')
+                continue
+            debit = parse_amount(line.get('debit_amount'))
+            credit = parse_amount(line.get('credit_amount'))
+            if debit is None or credit is None:
+                errors.append(f'Line {number}: amounts must be finite with at most 8 digits and 2 decimal places')
+                continue
+            if debit < 0 or credit < 0 or (debit and credit):
+                errors.append(f'Line {number}: use either a positive debit or a positive credit')
+            if line.get('account') not in self._get_account_ids():
+                errors.append(f"Line {number}: unknown account {line.get('account')}")
+            lines.append((line.get('account'), line.get('description', ''), debit, credit))
+
+        if sum(l[2] for l in lines) != sum(l[3] for l in lines):
+            errors.append('Total debits must equal total credits')
+
+        if errors:
+            return None, errors
+        return {
+            'date': date,
+            'reference_number': raw['reference_number'],
+            'description': raw['description'],
+            'status': status,
+            'idempotency_key': str(raw['idempotency_key']) if raw.get('idempotency_key') else None,
+            'lines': lines,
+        }, []
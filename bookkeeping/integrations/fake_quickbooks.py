@@ -0,0 +1,229 @@
+"""Local stand-in for the QuickBooks v3 query API, for offline sync benchmarks.
+
+Serves ``/v3/company/<realm>/query`` from an in-memory SyntheticCompany and
+understands the subset of the query language QuickBooksService emits:
+``SELECT * FROM <Entity> [WHERE ...] ORDERBY Metadata.LastUpdatedTime
+STARTPOSITION n MAXRESULTS m`` and ``SELECT * FROM <Entity> WHERE Id IN (...)``.
+"""
+import json
+import random
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+QUERY = re.compile(
+    r"select \* from (?P<entity>\w+)"
+    r"(?: where (?P<where>.*?))?"
+    r"(?: orderby [\w.]+)?"
+    r"(?: startposition (?P<start>\d+))?"
+    r"(?: maxresults (?P<max>\d+))?\s*$",
+    re.IGNORECASE
+)
+CONDITION = re.compile(r"(Metadata\.LastUpdatedTime|TxnDate) >= '([^']+)'", re.IGNORECASE)
+ID_IN = re.compile(r"Id IN \(([^)]*)\)", re.IGNORECASE)
+
+ACCOUNT_TYPES = [
+    ('Bank', 'Asset'),
+    ('Accounts Receivable', 'Asset'),
+    ('Accounts Payable', 'Liability'),
+    ('Income', 'Revenue'),
+    ('Expense', 'Expense'),
+    ('Cost of Goods Sold', 'Expense'),
+    ('Equity', 'Equity'),
+]
+
+class SyntheticCompany:
+    """Deterministic company data in QuickBooks JSON shape"""
+
+    def __init__(self, accounts=50, invoices=1000, bills=500, lines_per_entry=3, seed=0, start=None):
+        self.random = random.Random(seed)
+        self.clock = start or datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.entities = {'Account': [], 'Invoice': [], 'Bill': []}
+        self.lines_per_entry = lines_per_entry
+
+        for i in range(max(accounts, len(ACCOUNT_TYPES))):
+            account_type, classification = ACCOUNT_TYPES[i % len(ACCOUNT_TYPES)]
+            self.entities['Account'].append(self._stamp({
+                'Id': str(i + 1),
+                'Name': f'{account_type} {i + 1}',
+                'AccountType': account_type,
+                'Classification': classification,
+                'Active': True,
+            }))
+        for _ in range(invoices):
+            self.add_invoice()
+        for _ in range(bills):
+            self.add_bill()
+
+    def _stamp(self, record):
+        self.clock += timedelta(seconds=self.random.randint(1, 120))
+        record['MetaData'] = {'LastUpdatedTime': self.clock.isoformat()}
+        return record
+
+    def _accounts_of(self, account_type):
+        return [a['Id'] for a in self.entities['Account'] if a['AccountType'] == account_type]
+
+    def _amount(self):
+        return round(self.random.uniform(10, 5000), 2)
+
+    def add_invoice(self):
+        number = len(self.entities['Invoice']) + 1
+        invoice = self._stamp({
+            'Id': f'INV{number}',
+            'DocNumber': str(1000 + number),
+            'TxnDate': self.clock.date().isoformat(),
+            'ARAccountRef': {'value': self.random.choice(self._accounts_of('Accounts Receivable'))},
+            'Line': [
+                {
+                    'Amount': self._amount(),
+                    'DetailType': 'SalesItemLineDetail',
+                    'Description': f'Item {n}',
+                    'SalesItemLineDetail': {'ItemAccountRef': {'value': self.random.choice(self._accounts_of('Income'))}},
+                }
+                for n in range(self.lines_per_entry)
+            ],
+        })
+        self.entities['Invoice'].append(invoice)
+        return invoice
+
+    def add_bill(self):
+        number = len(self.entities['Bill']) + 1
+        bill = self._stamp({
+            'Id': f'BILL{number}',
+            'DocNumber': f'B{number}',
+            'TxnDate': self.clock.date().isoformat(),
+            'APAccountRef': {'value': self.random.choice(self._accounts_of('Accounts Payable'))},
+            'Line': [
+                {
+                    'Amount': self._amount(),
+                    'DetailType': 'AccountBasedExpenseLineDetail',
+                    'AccountBasedExpenseLineDetail': {'AccountRef': {'value': self.random.choice(self._accounts_of('Expense'))}},
+                }
+                for _ in range(self.lines_per_entry)
+            ],
+        })
+        self.entities['Bill'].append(bill)
+        return bill
+
+    def touch(self, entity, index):
+        """Mark a record as modified so the next incremental sync picks it up"""
+        return self._stamp(self.entities[entity][index])
+
+    def query(self, text):
+        match = QUERY.match(text.strip())
+        if not match:
+            raise ValueError(f'Unsupported query: {text}')
+        records = self.entities.get(match['entity'], [])
+        ids = ID_IN.search(match['where'] or '')
+        if ids:
+            wanted = {value.strip().strip("'") for value in ids.group(1).split(',')}
+            records = [r for r in records if r['Id'] in wanted]
+        for field, value in CONDITION.findall(match['where'] or ''):
+            if field.lower() == 'txndate':
+                records = [r for r in records if r.get('TxnDate', '') >= value]
+            else:
+                bound = datetime.fromisoformat(value)
+                records = [r for r in records if datetime.fromisoformat(r['MetaData']['LastUpdatedTime']) >= bound]
+        # Records are appended in LastUpdatedTime order except for touched ones
+        records = sorted(records, key=lambda r: r['MetaData']['LastUpdatedTime'])
+        start = int(match['start'] or 1) - 1
+        page = records[start:start + int(match['max'] or 100)]
+        return {'QueryResponse': {match['entity']: page, 'startPosition': start + 1, 'maxResults': len(page)}}
+
+class FakeQuickBooksServer:
+    """Threaded HTTP server for a SyntheticCompany; use as a context manager.
+
+    Set throttle_every=N to answer every Nth request with HTTP 429.
+    """
+
+    def __init__(self, company, host='127.0.0.1', port=0, throttle_every=None):
+        self.company = company
+        self.throttle_every = throttle_every
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def url(self):
+        return f'{self.base_url}/v3'
+
+    @property
+    def discovery_url(self):
+        """Use as QUICKBOOKS_ENVIRONMENT so AuthClient refreshes tokens against the fake"""
+        return f'{self.base_url}/.well-known/openid_configuration'
+
+    def discovery_document(self):
+        return {
+            'issuer': self.base_url,
+            'authorization_endpoint': f'{self.base_url}/oauth2/v1/authorize',
+            'token_endpoint': f'{self.base_url}/oauth2/v1/tokens/bearer',
+            'revocation_endpoint': f'{self.base_url}/oauth2/v1/tokens/revoke',
+            'userinfo_endpoint': f'{self.base_url}/oauth2/v1/userinfo',
+            'jwks_uri': f'{self.base_url}/oauth2/v1/keys',
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _respond(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self, query):
+                if self.path.startswith('/.well-known/'):
+                    self._respond(200, server.discovery_document())
+                    return
+                with server._lock:
+                    server.requests += 1
+                    throttled = server.throttle_every and server.requests % server.throttle_every == 0
+                if throttled:
+                    self._respond(429, {'Fault': {'Error': [{'code': '3001', 'Message': 'ThrottleExceeded'}]}})
+                    return
+                if self.path.startswith('/oauth2/'):
+                    self._respond(200, {'access_token': 'fake-access', 'refresh_token': 'fake-refresh',
+                                        'expires_in': 3600, 'x_refresh_token_expires_in': 8726400})
+                    return
+                try:
+                    self._respond(200, server.company.query(query))
+                except ValueError as e:
+                    self._respond(400, {'Fault': {'Error': [{'code': '4000', 'Message': str(e)}]}})
+
+            def do_GET(self):
+                self._handle(parse_qs(urlparse(self.path).query).get('query', [''])[0])
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self._handle(self.rfile.read(length).decode())
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
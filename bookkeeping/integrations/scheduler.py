@@ -0,0 +1,328 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from ..models import QuickBooksIntegration
+from ..services import QuickBooksService
+
+logger = logging.getLogger(__name__)
+
+class ThrottledError(Exception):
+    def __init__(self, message='', retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def is_throttled(exc):
+    """QuickBooks reports throttling as HTTP 429 / fault code 3001"""
+    code = str(getattr(exc, 'error_code', '') or getattr(exc, 'status_code', ''))
+    return code in ('429', '3001') or 'throttl' in str(exc).lower()
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity` banked"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait_for = (tokens - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+class RateLimitedClient:
+    """Proxy that takes a bucket token before every API query"""
+
+    def __init__(self, client, bucket):
+        self._client = client
+        self._bucket = bucket
+
+    def query(self, *args, **kwargs):
+        self._bucket.acquire()
+        return self._client.query(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+class ClientPool:
+    """Process-wide API clients keyed by tenant, so their HTTP sessions outlive a pass.
+
+    A client is checked out by one worker at a time; the least recently
+    returned ones are dropped past `max_clients`.
+    """
+
+    def __init__(self, max_clients):
+        self.max_clients = max_clients
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def checkout(self, key):
+        with self._lock:
+            return self._clients.pop(key, None)
+
+    def checkin(self, key, client):
+        with self._lock:
+            self._clients[key] = client
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+
+_client_pool = None
+_client_pool_lock = threading.Lock()
+
+def get_client_pool():
+    global _client_pool
+    with _client_pool_lock:
+        if _client_pool is None:
+            _client_pool = ClientPool(settings.INTEGRATION_SYNC['pooled_clients'])
+        return _client_pool
+
+class SyncJob:
+    def __init__(self, provider, tenant_id, user_id, last_sync):
+        self.provider = provider
+        self.tenant_id = tenant_id
+        self.user_id = user_id
+        self.last_sync = last_sync
+        self.attempts = 0
+
+    @property
+    def key(self):
+        return f'{self.provider}:{self.tenant_id}'
+
+class SyncProvider:
+    """One accounting provider: how to find due tenants and how to sync one"""
+    name = None
+
+    def discover(self, due_before):
+        """Claim tenants not attempted since due_before and return their jobs; job.last_sync is the last success"""
+        raise NotImplementedError
+
+    def run(self, job, clients, bucket):
+        """Sync one tenant with a client from the `clients` pool; return the number of rows written"""
+        raise NotImplementedError
+
+class QuickBooksProvider(SyncProvider):
+    name = 'quickbooks'
+    refresh_margin = timedelta(minutes=5)
+
+    def discover(self, due_before):
+        """Claim due integrations by stamping last_attempt, so concurrent schedulers split them.
+
+        Rows another scheduler has locked are skipped, and a row it has just
+        claimed no longer matches the due filter once its update commits.
+        """
+        with transaction.atomic():
+            integrations = QuickBooksIntegration.objects.filter(is_active=True).filter(
+                Q(last_attempt__isnull=True) | Q(last_attempt__lte=due_before)
+            ).order_by(F('last_attempt').asc(nulls_first=True)).select_for_update(skip_locked=True)
+            due = list(integrations.values_list('id', 'user_id', 'last_sync'))
+            QuickBooksIntegration.objects.filter(pk__in=[pk for pk, _, _ in due]).update(
+                last_attempt=timezone.now()
+            )
+        return [SyncJob(self.name, pk, user_id, last_sync) for pk, user_id, last_sync in due]
+
+    def run(self, job, clients, bucket):
+        integration = QuickBooksIntegration.objects.select_related('user').get(pk=job.tenant_id)
+        client = clients.checkout(job.key)
+        if client is None:
+            client = QuickBooksService(integration.user, integration).client
+        try:
+            self._refresh_token(client, integration)
+            service = QuickBooksService(integration.user, integration, client=RateLimitedClient(client, bucket))
+            stats = service.sync()
+        finally:
+            clients.checkin(job.key, client)
+        return stats['accounts'] + stats['transactions']['synced']
+
+    def _refresh_token(self, client, integration):
+        """Refresh ahead of expiry so a long sync never stalls on a 401"""
+        auth_client = client.auth_client
+        expires_at = integration.token_expires_at
+        if expires_at and expires_at > timezone.now() + self.refresh_margin:
+            # A pooled client may predate a refresh made by another process
+            auth_client.access_token = integration.access_token
+            auth_client.refresh_token = client.refresh_token = integration.refresh_token
+            return
+        auth_client.refresh(refresh_token=integration.refresh_token)
+        client.refresh_token = auth_client.refresh_token
+        integration.access_token = auth_client.access_token
+        integration.refresh_token = auth_client.refresh_token
+        integration.token_expires_at = timezone.now() + timedelta(seconds=auth_client.expires_in or 3600)
+        integration.save(update_fields=['access_token', 'refresh_token', 'token_expires_at'])
+
+class ProviderStats:
+    def __init__(self):
+        self.completed = 0
+        self.failed = 0
+        self.throttled = 0
+        self.rows = 0
+        self.busy_seconds = 0.0
+
+    def as_dict(self):
+        return {
+            'completed': self.completed,
+            'failed': self.failed,
+            'throttled': self.throttled,
+            'rows': self.rows,
+            'rows_per_second': round(self.rows / self.busy_seconds, 1) if self.busy_seconds else None,
+        }
+
+class SyncScheduler:
+    """Run due integration syncs on a bounded worker pool.
+
+    Each provider gets its own concurrency cap and token bucket; throttled
+    jobs are re-queued with exponential backoff and jitter. Clients come
+    from the process-wide ClientPool, so a tenant's HTTP session is reused
+    across passes. While a pass runs, `on_progress` (or the log) gets
+    metrics() every `progress_seconds`.
+    """
+
+    def __init__(self, providers=None, workers=None, interval=None, max_attempts=None, on_progress=None):
+        config = settings.INTEGRATION_SYNC
+        self.providers = {p.name: p for p in (providers or [QuickBooksProvider()])}
+        self.workers = workers or config['workers']
+        self.interval = interval or timedelta(minutes=config['interval_minutes'])
+        self.max_attempts = max_attempts or config['max_attempts']
+        self.progress_seconds = config['progress_seconds']
+        self.on_progress = on_progress
+        self.limits = {
+            name: config['providers'].get(name, {'concurrency': 1, 'rate': 1})
+            for name in self.providers
+        }
+        self.buckets = {
+            name: TokenBucket(limit['rate'], limit.get('burst'))
+            for name, limit in self.limits.items()
+        }
+        self.stats = {name: ProviderStats() for name in self.providers}
+        self.lag = {}
+        self._queue = []
+        self._counter = itertools.count()
+        self._running = {name: 0 for name in self.providers}
+        self._clients = get_client_pool()
+
+    def discover(self):
+        """Queue every integration not attempted within the interval; lag runs from its last success"""
+        now = timezone.now()
+        queued = 0
+        for provider in self.providers.values():
+            for job in provider.discover(now - self.interval):
+                self.lag[job.key] = (now - job.last_sync).total_seconds() if job.last_sync else None
+                self._push(job, time.monotonic())
+                queued += 1
+        return queued
+
+    def _push(self, job, ready_at):
+        heapq.heappush(self._queue, (ready_at, next(self._counter), job))
+
+    def run_once(self):
+        """Discover due integrations and drain the queue"""
+        self.discover()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sync') as executor:
+            futures = {}
+            report_at = time.monotonic() + self.progress_seconds
+            while self._queue or futures:
+                for job in self._take_ready():
+                    futures[executor.submit(self._run_job, job)] = job
+                now = time.monotonic()
+                if now >= report_at:
+                    self._report()
+                    report_at = now + self.progress_seconds
+                timeout = report_at - now
+                if self._queue and self._queue[0][0] > now:
+                    timeout = min(timeout, self._queue[0][0] - now)
+                if not futures:
+                    # Everything left is backing off
+                    time.sleep(max(timeout, 0))
+                    continue
+                done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(futures.pop(future), future)
+        return self.metrics()
+
+    def _report(self):
+        metrics = self.metrics()
+        if self.on_progress:
+            self.on_progress(metrics)
+        else:
+            logger.info('Sync progress: queue_depth=%s running=%s', metrics['queue_depth'], metrics['running'])
+
+    def _take_ready(self):
+        """Pop ready jobs whose provider still has a free concurrency slot"""
+        now = time.monotonic()
+        ready, deferred = [], []
+        while self._queue and self._queue[0][0] <= now:
+            item = heapq.heappop(self._queue)
+            provider = item[2].provider
+            if self._running[provider] < self.limits[provider]['concurrency']:
+                self._running[provider] += 1
+                ready.append(item[2])
+            else:
+                deferred.append(item)
+        for item in deferred:
+            heapq.heappush(self._queue, item)
+        return ready
+
+    def _run_job(self, job):
+        started = time.monotonic()
+        try:
+            rows = self.providers[job.provider].run(job, self._clients, self.buckets[job.provider])
+        except Exception as e:
+            if is_throttled(e):
+                raise ThrottledError(str(e), getattr(e, 'retry_after', None))
+            raise
+        finally:
+            close_old_connections()
+        return rows, time.monotonic() - started
+
+    def _finish(self, job, future):
+        self._running[job.provider] -= 1
+        stats = self.stats[job.provider]
+        try:
+            rows, elapsed = future.result()
+        except ThrottledError as e:
+            stats.throttled += 1
+            job.attempts += 1
+            if job.attempts >= self.max_attempts:
+                stats.failed += 1
+                logger.warning('Giving up on %s after %s throttled attempts', job.key, job.attempts)
+                return
+            delay = e.retry_after or min(60, 2 ** job.attempts) * random.uniform(0.5, 1.0)
+            self._push(job, time.monotonic() + delay)
+            return
+        except Exception:
+            stats.failed += 1
+            logger.exception('Sync failed for %s', job.key)
+            return
+
+        stats.completed += 1
+        stats.rows += rows
+        stats.busy_seconds += elapsed
+        self.lag[job.key] = 0
+
+    def metrics(self):
+        """Queue depth and running jobs right now, plus per-provider totals and lag for this pass"""
+        lags = [lag for lag in self.lag.values() if lag is not None]
+        return {
+            'queue_depth': len(self._queue),
+            'running': dict(self._running),
+            'providers': {name: stats.as_dict() for name, stats in self.stats.items()},
+            'lag_seconds': dict(self.lag),
+            'max_lag_seconds': max(lags) if lags else None,
+        }
@@ -0,0 +1,65 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.test.utils import override_settings
+from bookkeeping.models import Transaction, TransactionLine, QuickBooksIntegration
+from bookkeeping.balances import verify_account_balances
+from bookkeeping.services import QuickBooksService
+from bookkeeping.integrations.fake_quickbooks import SyntheticCompany, FakeQuickBooksServer
+
+class Command(BaseCommand):
+    help = 'Benchmark QuickBooks sync against a local fake server (writes into a scratch user\'s ledger)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, required=True, help='Id of a scratch user to sync into')
+        parser.add_argument('--accounts', type=int, default=50)
+        parser.add_argument('--invoices', type=int, default=10000)
+        parser.add_argument('--bills', type=int, default=5000)
+        parser.add_argument('--page-size', type=int, default=1000)
+        parser.add_argument('--touch', type=int, default=100,
+                            help='Records modified before the second, incremental run')
+
+    def handle(self, *args, **options):
+        user = User.objects.get(pk=options['user'])
+        if Transaction.objects.filter(user=user).exclude(source='QUICKBOOKS').exists():
+            raise CommandError('User has non-QuickBooks transactions; use a scratch user')
+
+        company = SyntheticCompany(options['accounts'], options['invoices'], options['bills'])
+        integration, _ = QuickBooksIntegration.objects.update_or_create(
+            user=user,
+            defaults={'access_token': 'fake', 'refresh_token': 'fake', 'realm_id': '1',
+                      'last_sync': None, 'sync_cursors': {}, 'is_active': True}
+        )
+
+        with FakeQuickBooksServer(company) as server, override_settings(
+            QUICKBOOKS_API_URL=server.url, QUICKBOOKS_PAGE_SIZE=options['page_size']
+        ):
+            self._run('Full sync', QuickBooksService(user, integration), options['invoices'] + options['bills'])
+
+            for index in range(min(options['touch'], options['invoices'])):
+                company.touch('Invoice', index)
+            self._run('Incremental sync', QuickBooksService(user, integration), options['touch'])
+
+        expected = options['invoices'] + options['bills']
+        synced = Transaction.objects.filter(user=user, idempotency_key__startswith='qb:').count()
+        totals = TransactionLine.objects.filter(transaction__user=user).aggregate(
+            debits=Sum('debit_amount'), credits=Sum('credit_amount')
+        )
+        mismatches = verify_account_balances(user)
+
+        self.stdout.write(f'Transactions: {synced}/{expected}')
+        self.stdout.write(f"Debits {totals['debits']} / credits {totals['credits']}")
+        self.stdout.write(f'Balance mismatches: {len(mismatches)}')
+        if synced != expected or totals['debits'] != totals['credits'] or mismatches:
+            raise CommandError('Synced ledger does not match the synthetic company')
+        self.stdout.write(self.style.SUCCESS('Synced ledger matches the synthetic company'))
+
+    def _run(self, label, service, rows):
+        started = time.monotonic()
+        stats = service.sync()
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{label}: {stats['accounts']} accounts, {stats['transactions']['synced']} transactions "
+            f"in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)"
+        )
@@ -0,0 +1,32 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from bookkeeping.checkpoints import month_end
+from bookkeeping.statements import StatementEngine
+
+class Command(BaseCommand):
+    help = 'Store (or refresh stale) statements for recently closed months'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Limit to a single user id')
+        parser.add_argument('--months', type=int, default=12, help='Closed months to cover')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(account__isnull=False).distinct()
+        if options['user']:
+            users = users.filter(pk=options['user'])
+
+        for user in users:
+            engine = StatementEngine(user)
+            end = engine.closed_through
+            months = []
+            for _ in range(options['months']):
+                months.append(end.replace(day=1))
+                end = end.replace(day=1) - timedelta(days=1)
+            # Oldest first so each balance sheet rolls forward from the previous one
+            for start in reversed(months):
+                engine.balance_sheet_totals(month_end(start))
+                engine.income_statement_totals(start, month_end(start))
+                engine.cash_flow(start, month_end(start))
+            self.stdout.write(f'{user.username}: {len(months)} months through {engine.closed_through}')
+        self.stdout.write(self.style.SUCCESS('Financial statements are up to date'))
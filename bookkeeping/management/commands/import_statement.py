@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from bookkeeping.models import Account
+from bookkeeping.importers import StatementImporter, PARSERS, detect_format
+
+class Command(BaseCommand):
+    help = 'Stream a CSV, OFX/QFX or camt.053 bank statement into the ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--bank-account', type=int, required=True,
+                            help='Id of the bank Account the statement belongs to')
+        parser.add_argument('--default-account', type=int, required=True,
+                            help='Id of the Account used when a row has no counterparty')
+        parser.add_argument('--format', choices=sorted(PARSERS), help='Defaults to the file extension')
+        parser.add_argument('--resume-from', type=int, default=0,
+                            help='Byte offset for OFX, row or entry number for CSV and camt, as reported by a failed run')
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        bank_account = Account.objects.select_related('user').get(pk=options['bank_account'])
+        default_account = Account.objects.get(pk=options['default_account'], user=bank_account.user)
+        fmt = options['format'] or detect_format(options['path'])
+
+        importer = StatementImporter(
+            bank_account.user, bank_account, default_account, batch_size=options['batch_size']
+        )
+        with open(options['path'], 'rb') as fileobj:
+            try:
+                result = importer.run(fileobj, fmt, start=options['resume_from'])
+            except Exception as e:
+                raise CommandError(
+                    f'Import failed: {e}. Resume with --resume-from {importer.last_position}'
+                )
+
+        for rejection in result.rejections:
+            self.stdout.write(self.style.WARNING(rejection))
+        summary = result.as_dict()
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['imported']} of {summary['rows']} rows "
+            f"({summary['duplicates']} duplicates, {summary['rejected']} rejected) "
+            f"at {summary['rows_per_second']} rows/s"
+        ))
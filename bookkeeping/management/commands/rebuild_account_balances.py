@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from bookkeeping.balances import rebuild_account_balances, verify_account_balances
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the materialized per-account balance table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Limit to a single user id')
+        parser.add_argument('--verify', action='store_true',
+                            help='Only compare stored balances with the ledger')
+
+    def handle(self, *args, **options):
+        user = User.objects.get(pk=options['user']) if options['user'] else None
+
+        if options['verify']:
+            mismatches = verify_account_balances(user)
+            for mismatch in mismatches:
+                self.stdout.write(
+                    f"Account {mismatch['account_id']}: expected {mismatch['expected']}, "
+                    f"stored {mismatch['actual']}"
+                )
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} account balances are out of date')
+            self.stdout.write(self.style.SUCCESS('All account balances match the ledger'))
+            return
+
+        count = rebuild_account_balances(user)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt balances for {count} accounts'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from bookkeeping.checkpoints import rebuild_checkpoints, roll_forward_checkpoints
+
+class Command(BaseCommand):
+    help = 'Rebuild month-end balance checkpoints used for as-of balance queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Limit to a single user id')
+        parser.add_argument('--roll-forward', action='store_true',
+                            help='Only add checkpoints after each account\'s latest one (for the daily run)')
+
+    def handle(self, *args, **options):
+        user = User.objects.get(pk=options['user']) if options['user'] else None
+        if options['roll_forward']:
+            count = roll_forward_checkpoints(user)
+        else:
+            count = rebuild_checkpoints(user)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} balance checkpoints'))
@@ -0,0 +1,28 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from bookkeeping.integrations.scheduler import SyncScheduler
+
+class Command(BaseCommand):
+    help = 'Sync every due accounting integration on a bounded worker pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int)
+        parser.add_argument('--loop', action='store_true', help='Keep discovering and syncing')
+        parser.add_argument('--pause', type=int, default=60, help='Seconds between passes with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            scheduler = SyncScheduler(
+                workers=options['workers'],
+                on_progress=lambda metrics: self.stdout.write(json.dumps(metrics, default=str))
+            )
+            started = time.monotonic()
+            metrics = scheduler.run_once()
+            self.stdout.write(json.dumps(metrics, default=str))
+            self.stdout.write(self.style.SUCCESS(
+                f'Sync pass finished in {time.monotonic() - started:.1f}s'
+            ))
+            if not options['loop']:
+                return
+            time.sleep(options['pause'])
@@ -1,89 +1,185 @@
 from decimal import Decimal
-from django.db.models import Sum, F, Q
-from datetime import datetime, timedelta
-from .models import Account, Transaction, TransactionLine
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from .models import AccountBalance
+from .utils import normal_balance
+from .analytics import ANALYTICS_WINDOWS, LedgerSeries
+
+CURRENT_ASSET_CLASSES = ('CASH', 'RECEIVABLE', 'INVENTORY', 'CURRENT')
+
+# Named inputs as (account_type, classification) keys of the balance vector;
+# a classification of None matches every account of that type
+BALANCE_INPUTS = {
+    'cash': [('ASSET', 'CASH')],
+    'receivables': [('ASSET', 'RECEIVABLE')],
+    'inventory': [('ASSET', 'INVENTORY')],
+    'current_assets': [('ASSET', c) for c in CURRENT_ASSET_CLASSES],
+    'current_liabilities': [('LIABILITY', 'CURRENT')],
+    'total_liabilities': [('LIABILITY', None)],
+    'total_equity': [('EQUITY', None)],
+    'revenue': [('REVENUE', None)],
+    'cogs': [('EXPENSE', 'COGS')],
+}
+
+def _divide(numerator, denominator):
+    if not denominator:
+        return None
+    return numerator / denominator
+
+class Ratio:
+    """A metric declared by its named inputs and a formula over them"""
+
+    def __init__(self, name, inputs, formula):
+        self.name = name
+        self.inputs = inputs
+        self.formula = formula
+
+    def evaluate(self, values):
+        args = [values.get(name) for name in self.inputs]
+        if any(arg is None for arg in args):
+            return None
+        return self.formula(*args)
+
+RATIOS = [
+    Ratio('quick_ratio', ('current_assets', 'inventory', 'current_liabilities'),
+          lambda assets, inventory, liabilities: _divide(assets - inventory, liabilities)),
+    Ratio('current_ratio', ('current_assets', 'current_liabilities'), _divide),
+    Ratio('operating_cash_flow_ratio', ('operating_cash_flow', 'current_liabilities'), _divide),
+    Ratio('gross_profit_margin', ('revenue', 'cogs'),
+          lambda revenue, cogs: _divide((revenue - cogs) * 100, revenue)),
+    Ratio('debt_to_equity_ratio', ('total_liabilities', 'total_equity'), _divide),
+    Ratio('accounts_receivable_turnover', ('net_credit_sales', 'average_receivables'), _divide),
+]
+
+def metrics_cache_key(user_id):
+    return f'bookkeeping:metrics:{user_id}'
+
+def invalidate_metrics(user_id):
+    """Drop cached metrics once the write commits; earlier, a reader could re-cache the old balances"""
+    key = metrics_cache_key(user_id)
+    transaction.on_commit(lambda: cache.delete(key))
 
 class BusinessMetrics:
-    def __init__(self, user):
+    def __init__(self, user, series=None):
         self.user = user
+        self._balances = None
+        self._values = None
+        self._series = series
+        self.window_days = getattr(settings, 'BOOKKEEPING_METRICS_WINDOW_DAYS', 365)
 
     def quick_ratio(self):
         """Calculate Quick Ratio (Acid-Test Ratio)"""
-        current_assets = self._get_account_balance('ASSET', ['cash', 'receivable'])
-        inventory = self._get_account_balance('ASSET', ['inventory'])
-        current_liabilities = self._get_account_balance('LIABILITY', ['current'])
-        
-        if current_liabilities == 0:
-            return None
-        return (current_assets - inventory) / current_liabilities
+        return self._evaluate('quick_ratio')
 
     def current_ratio(self):
         """Calculate Current Ratio"""
-        current_assets = self._get_account_balance('ASSET', ['current'])
-        current_liabilities = self._get_account_balance('LIABILITY', ['current'])
-        
-        if current_liabilities == 0:
-            return None
-        return current_assets / current_liabilities
+        return self._evaluate('current_ratio')
 
     def operating_cash_flow_ratio(self):
         """Calculate Operating Cash Flow Ratio"""
-        operating_cash_flow = self._calculate_operating_cash_flow()
-        current_liabilities = self._get_account_balance('LIABILITY', ['current'])
-        
-        if current_liabilities == 0:
-            return None
-        return operating_cash_flow / current_liabilities
+        return self._evaluate('operating_cash_flow_ratio')
 
     def gross_profit_margin(self):
         """Calculate Gross Profit Margin"""
-        revenue = self._get_account_balance('REVENUE')
-        cogs = self._get_account_balance('EXPENSE', ['cogs'])
-        
-        if revenue == 0:
-            return None
-        return ((revenue - cogs) / revenue) * 100
+        return self._evaluate('gross_profit_margin')
 
     def debt_to_equity_ratio(self):
         """Calculate Debt to Equity Ratio"""
-        total_liabilities = self._get_account_balance('LIABILITY')
-        total_equity = self._get_account_balance('EQUITY')
-        
-        if total_equity == 0:
-            return None
-        return total_liabilities / total_equity
+        return self._evaluate('debt_to_equity_ratio')
 
     def accounts_receivable_turnover(self):
         """Calculate Accounts Receivable Turnover"""
-        net_credit_sales = self._get_credit_sales()
-        avg_accounts_receivable = self._get_average_receivables()
-        
-        if avg_accounts_receivable == 0:
-            return None
-        return net_credit_sales / avg_accounts_receivable
+        return self._evaluate('accounts_receivable_turnover')
 
-    def _get_account_balance(self, account_type, tags=None):
-        query = Account.objects.filter(
-            user=self.user,
-            account_type=account_type,
-            is_active=True
-        )
-        if tags:
-            query = query.filter(tags__name__in=tags)
-        
-        return query.aggregate(
-            balance=Sum(
-                F('transactionline__debit_amount') - F('transactionline__credit_amount')
+    def _evaluate(self, name):
+        ratio = next(r for r in RATIOS if r.name == name)
+        return ratio.evaluate(self._get_values())
+
+    def _get_balance_vector(self):
+        """Normal-signed balances grouped by (account_type, classification), one query"""
+        if self._balances is None:
+            rows = AccountBalance.objects.filter(
+                account__user=self.user,
+                account__is_active=True
+            ).values(
+                'account__account_type', 'account__classification'
+            ).annotate(
+                debits=Sum('debit_total'),
+                credits=Sum('credit_total')
             )
-        )['balance'] or Decimal('0')
+            self._balances = {
+                (row['account__account_type'], row['account__classification']): normal_balance(
+                    row['account__account_type'],
+                    row['debits'] or Decimal('0'),
+                    row['credits'] or Decimal('0')
+                )
+                for row in rows
+            }
+        return self._balances
+
+    def _get_account_balance(self, account_type, classifications=None):
+        balances = self._get_balance_vector()
+        return sum(
+            (balance for (kind, classification), balance in balances.items()
+             if kind == account_type and (classifications is None or classification in classifications)),
+            Decimal('0')
+        )
+
+    def _get_series(self):
+        """Daily ledger series covering the longest window, loaded once"""
+        if self._series is None:
+            self._series = LedgerSeries.load(self.user, periods=max(self.window_days, *ANALYTICS_WINDOWS))
+        return self._series
 
-    def get_all_metrics(self):
+    def _calculate_operating_cash_flow(self, days=None):
+        return self._get_series().window(days or self.window_days)['operating_cash_flow']
+
+    def _get_credit_sales(self, days=None):
+        return self._get_series().window(days or self.window_days)['net_credit_sales']
+
+    def _get_average_receivables(self, days=None):
+        return self._get_series().window(days or self.window_days)['average_receivables']
+
+    def _get_values(self):
+        """Resolve every named input needed by RATIOS"""
+        if self._values is None:
+            values = {}
+            for name, keys in BALANCE_INPUTS.items():
+                values[name] = sum(
+                    (self._get_account_balance(account_type, None if classification is None else [classification])
+                     for account_type, classification in keys),
+                    Decimal('0')
+                )
+            values['operating_cash_flow'] = self._calculate_operating_cash_flow()
+            values['net_credit_sales'] = self._get_credit_sales()
+            values['average_receivables'] = self._get_average_receivables()
+            self._values = values
+        return self._values
+
+    def get_window_metrics(self, windows=ANALYTICS_WINDOWS):
+        """Window inputs and ratios for several trailing windows from one series load"""
+        balances = self._get_values()
+        result = {}
+        for days in windows:
+            inputs = self._get_series().window(days)
+            values = dict(balances, **inputs)
+            result[days] = dict(inputs, **{ratio.name: ratio.evaluate(values) for ratio in RATIOS})
+        return result
+
+    def get_all_metrics(self, use_cache=True):
         """Return all calculated metrics"""
-        return {
-            'quick_ratio': self.quick_ratio(),
-            'current_ratio': self.current_ratio(),
-            'operating_cash_flow_ratio': self.operating_cash_flow_ratio(),
-            'gross_profit_margin': self.gross_profit_margin(),
-            'debt_to_equity_ratio': self.debt_to_equity_ratio(),
-            'accounts_receivable_turnover': self.accounts_receivable_turnover(),
-        } 
\ No newline at end of file
+        key = metrics_cache_key(self.user.pk)
+        if use_cache:
+            metrics = cache.get(key)
+            if metrics is not None:
+                return metrics
+
+        values = self._get_values()
+        metrics = {ratio.name: ratio.evaluate(values) for ratio in RATIOS}
+        cache.set(key, metrics, getattr(settings, 'BOOKKEEPING_METRICS_CACHE_TIMEOUT', 3600))
+        return metrics
+
+def calculate_business_metrics(user):
+    return BusinessMetrics(user).get_all_metrics()
@@ -12,10 +12,23 @@ class Account(models.Model):
         ('REVENUE', 'Revenue'),
         ('EXPENSE', 'Expense'),
     ])
+    classification = models.CharField(max_length=20, blank=True, choices=[
+        ('CASH', 'Cash'),
+        ('RECEIVABLE', 'Receivable'),
+        ('INVENTORY', 'Inventory'),
+        ('CURRENT', 'Other Current'),
+        ('NON_CURRENT', 'Non-current'),
+        ('COGS', 'Cost of Goods Sold'),
+        ('OPERATING', 'Operating'),
+    ])
     account_number = models.CharField(max_length=20, unique=True)
     description = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    external_id = models.CharField(max_length=64, null=True, blank=True)  # Id in the connected accounting system
+    
+    class Meta:
+        unique_together = ['user', 'external_id']
     
     def __str__(self):
         return f"{self.account_number} - {self.name}"
@@ -36,6 +49,14 @@ class Transaction(models.Model):
         ('QUICKBOOKS', 'QuickBooks'),
         ('IMPORT', 'File Import'),
     ], default='MANUAL')
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True)
+    
+    class Meta:
+        unique_together = ['user', 'idempotency_key']
+        indexes = [
+            # Keyset pagination walks (date, id) within a user's ledger
+            models.Index(fields=['user', 'date', 'id'], name='bookkeeping_txn_user_date_id'),
+        ]
     
     def __str__(self):
         return f"{self.date} - {self.reference_number}"
@@ -50,12 +71,43 @@ class TransactionLine(models.Model):
     def __str__(self):
         return f"{self.account.name}: D{self.debit_amount} C{self.credit_amount}"
 
+class AccountBalance(models.Model):
+    """Running ledger totals per account, kept in step with every TransactionLine write"""
+    account = models.OneToOneField(Account, on_delete=models.CASCADE, related_name='ledger_balance')
+    debit_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    credit_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    line_count = models.IntegerField(default=0)
+    last_posted_date = models.DateField(null=True, blank=True)
+    
+    @property
+    def balance(self):
+        return self.debit_total - self.credit_total
+    
+    def __str__(self):
+        return f"{self.account}: D{self.debit_total} C{self.credit_total}"
+
+class AccountBalanceCheckpoint(models.Model):
+    """Cumulative account totals through a month end, for fast as-of balances"""
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    as_of = models.DateField()
+    debit_total = models.DecimalField(max_digits=16, decimal_places=2)
+    credit_total = models.DecimalField(max_digits=16, decimal_places=2)
+    
+    class Meta:
+        unique_together = ['account', 'as_of']
+    
+    def __str__(self):
+        return f"{self.account} as of {self.as_of}"
+
 class QuickBooksIntegration(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     access_token = models.TextField()
     refresh_token = models.TextField()
+    token_expires_at = models.DateTimeField(null=True, blank=True)
     realm_id = models.CharField(max_length=50)
-    last_sync = models.DateTimeField(null=True)
+    last_sync = models.DateTimeField(null=True)  # Last successful run
+    last_attempt = models.DateTimeField(null=True)  # Last run started by the scheduler
+    sync_cursors = models.JSONField(default=dict)  # Last committed LastUpdatedTime per entity
     is_active = models.BooleanField(default=True)
     
     def __str__(self):
@@ -72,9 +124,11 @@ class FinancialStatement(models.Model):
     period_end = models.DateField()
     generated_at = models.DateTimeField(auto_now_add=True)
     data = models.JSONField()  # Stores the statement data in JSON format
+    is_stale = models.BooleanField(default=False)  # A later entry landed inside the period
     
     class Meta:
         ordering = ['-period_end']
+        unique_together = ['user', 'statement_type', 'period_start', 'period_end']
     
     def __str__(self):
         return f"{self.statement_type} ({self.period_start} to {self.period_end})" 
\ No newline at end of file
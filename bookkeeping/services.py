@@ -1,17 +1,39 @@
+import hashlib
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from intuitlib.client import AuthClient
 from intuitlib.enums import Scopes
 from quickbooks import QuickBooks
-from quickbooks.objects.account import Account as QBAccount
-from quickbooks.objects.bill import Bill
-from quickbooks.objects.invoice import Invoice
 from .models import Account, Transaction, TransactionLine, QuickBooksIntegration
+from .ingestion import write_entries, replace_entries
+from .signals import ledger_changed
+
+ACCOUNT_CLASSIFICATIONS = {
+    'Bank': 'CASH',
+    'Accounts Receivable': 'RECEIVABLE',
+    'Other Current Asset': 'CURRENT',
+    'Fixed Asset': 'NON_CURRENT',
+    'Other Asset': 'NON_CURRENT',
+    'Accounts Payable': 'CURRENT',
+    'Credit Card': 'CURRENT',
+    'Other Current Liability': 'CURRENT',
+    'Long Term Liability': 'NON_CURRENT',
+    'Cost of Goods Sold': 'COGS',
+    'Expense': 'OPERATING',
+    'Income': 'OPERATING',
+}
 
 class QuickBooksService:
-    def __init__(self, user):
+    def __init__(self, user, integration=None, client=None):
         self.user = user
-        self.integration = QuickBooksIntegration.objects.get(user=user)
-        self.client = self._get_client()
-    
+        self.integration = integration or QuickBooksIntegration.objects.get(user=user)
+        self.client = client or self._get_client()
+        self.page_size = settings.QUICKBOOKS_PAGE_SIZE
+        self._accounts = None
+
     def _get_client(self):
         auth_client = AuthClient(
             client_id=settings.QUICKBOOKS_CLIENT_ID,
@@ -21,33 +43,249 @@ class QuickBooksService:
         )
         auth_client.access_token = self.integration.access_token
         auth_client.refresh_token = self.integration.refresh_token
-        
-        return QuickBooks(
+
+        client = QuickBooks(
             auth_client=auth_client,
             refresh_token=self.integration.refresh_token,
             company_id=self.integration.realm_id
         )
-    
+        if settings.QUICKBOOKS_API_URL:
+            client.api_url_v3 = client.sandbox_api_url_v3 = settings.QUICKBOOKS_API_URL
+        return client
+
+    def sync(self):
+        """Pull every entity changed since its last committed cursor"""
+        result = {
+            'accounts': self.sync_accounts(),
+            'transactions': self.sync_transactions(),
+        }
+        # sync_cursors hold the data watermarks; last_sync is when a run last succeeded
+        self.integration.last_sync = timezone.now()
+        self.integration.save(update_fields=['last_sync'])
+        return result
+
     def sync_accounts(self):
         """Sync QuickBooks accounts with local accounts"""
-        qb_accounts = QBAccount.all(qb=self.client)
-        
-        for qb_account in qb_accounts:
-            Account.objects.update_or_create(
-                user=self.user,
-                account_number=qb_account.AcctNum,
-                defaults={
-                    'name': qb_account.Name,
-                    'account_type': self._map_account_type(qb_account.AccountType),
-                    'description': qb_account.Description or '',
-                }
-            )
-    
+        synced = 0
+        for page in self._iter_changed('Account'):
+            with db_transaction.atomic():
+                self._upsert_accounts(page)
+                self._commit_cursor('Account', page)
+            synced += len(page)
+        return synced
+
     def sync_transactions(self, start_date=None):
-        """Sync QuickBooks transactions with local transactions"""
-        # Implement transaction sync logic here
-        pass
-    
+        """Sync QuickBooks invoices and bills with local transactions.
+
+        Records whose accounts can't be resolved yet are kept in the
+        integration's unresolved list and fetched again by id on every run,
+        so moving the cursor past them never loses them. 'skipped' counts
+        the records still unresolved after this run.
+        """
+        stats = {'synced': 0, 'retried': 0, 'skipped': 0}
+        extra = f"TxnDate >= '{start_date}'" if start_date else None
+        for entity, build_entry in (('Invoice', self._invoice_entry), ('Bill', self._bill_entry)):
+            for page, is_retry in self._iter_pending(entity, extra):
+                entries, unresolved = [], []
+                for record in page:
+                    entry = build_entry(record)
+                    if entry is None:
+                        unresolved.append(record['Id'])
+                    else:
+                        entries.append(entry)
+                with db_transaction.atomic():
+                    self._write_transactions(entries)
+                    self._commit_cursor(entity, page, unresolved, advance=not is_retry)
+                stats['synced'] += len(entries)
+                if is_retry:
+                    stats['retried'] += len(entries)
+            stats['skipped'] += len(self.integration.sync_cursors.get('unresolved', {}).get(entity, []))
+        return stats
+
+    def _iter_pending(self, entity, extra_where=None):
+        """Previously unresolved records by id, then everything changed since the cursor"""
+        ids = list(self.integration.sync_cursors.get('unresolved', {}).get(entity, []))
+        for start in range(0, len(ids), self.page_size):
+            quoted = ', '.join(f"'{pk}'" for pk in ids[start:start + self.page_size])
+            response = self.client.query(f"SELECT * FROM {entity} WHERE Id IN ({quoted})")
+            page = response.get('QueryResponse', {}).get(entity, [])
+            if page:
+                yield page, True
+        for page in self._iter_changed(entity, extra_where):
+            yield page, False
+
+    def _iter_changed(self, entity, extra_where=None):
+        """Page through records whose Metadata.LastUpdatedTime is at or after the cursor"""
+        conditions = []
+        since = self.integration.sync_cursors.get(entity)
+        if since:
+            # Inclusive bound: records sharing the cursor timestamp are re-read and upserted
+            conditions.append(f"Metadata.LastUpdatedTime >= '{since}'")
+        if extra_where:
+            conditions.append(extra_where)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ''
+
+        position = 1
+        while True:
+            response = self.client.query(
+                f"SELECT * FROM {entity} {where}ORDERBY Metadata.LastUpdatedTime "
+                f"STARTPOSITION {position} MAXRESULTS {self.page_size}"
+            )
+            page = response.get('QueryResponse', {}).get(entity, [])
+            if page:
+                yield page
+            if len(page) < self.page_size:
+                return
+            position += len(page)
+
+    def _commit_cursor(self, entity, page, unresolved=(), advance=True):
+        """Advance the entity cursor and track unresolved ids inside the batch's DB transaction"""
+        cursors = dict(self.integration.sync_cursors)
+        if advance:
+            cursors[entity] = max((record['MetaData']['LastUpdatedTime'] for record in page), key=parse_datetime)
+        pending = dict(cursors.get('unresolved', {}))
+        ids = set(pending.get(entity, [])) - {record['Id'] for record in page}
+        ids.update(unresolved)
+        pending[entity] = sorted(ids)
+        cursors['unresolved'] = pending
+        self.integration.sync_cursors = cursors
+        self.integration.save(update_fields=['sync_cursors'])
+
+    def _upsert_accounts(self, page):
+        existing = {
+            account.external_id: account
+            for account in Account.objects.filter(
+                user=self.user, external_id__in=[record['Id'] for record in page]
+            )
+        }
+        # account_number is unique across every user, so a number another
+        # company (or a manual account) already holds falls back to a generated one
+        wanted = {record.get('AcctNum') for record in page if record.get('AcctNum')}
+        taken = set(Account.objects.filter(account_number__in=wanted).values_list('account_number', flat=True))
+        new, changed = [], []
+        for record in page:
+            fields = {
+                'name': record['Name'][:100],
+                'account_type': self._map_account_type(record.get('Classification') or record.get('AccountType')),
+                'classification': ACCOUNT_CLASSIFICATIONS.get(record.get('AccountType'), ''),
+                'description': record.get('Description') or '',
+                'is_active': record.get('Active', True),
+            }
+            account = existing.get(record['Id'])
+            if account is None:
+                number = record.get('AcctNum')
+                if not number or number in taken or len(number) > 20:
+                    number = self._generated_account_number(record['Id'])
+                taken.add(number)
+                new.append(Account(
+                    user=self.user,
+                    external_id=record['Id'],
+                    account_number=number,
+                    **fields
+                ))
+            else:
+                for field, value in fields.items():
+                    setattr(account, field, value)
+                changed.append(account)
+
+        Account.objects.bulk_create(new)
+        Account.objects.bulk_update(changed, ['name', 'account_type', 'classification', 'description', 'is_active'])
+        self._accounts = None
+        ledger_changed.send(
+            sender=Account, user_id=self.user.pk,
+            account_ids=[account.pk for account in new + changed], since=None
+        )
+
+    def _generated_account_number(self, external_id):
+        digest = hashlib.sha1(f'{self.integration.realm_id}:{external_id}'.encode()).hexdigest()
+        return f'QB-{digest[:16]}'
+
+    def _write_transactions(self, entries):
+        keys = [entry['idempotency_key'] for entry in entries]
+        existing = dict(Transaction.objects.filter(
+            user=self.user, idempotency_key__in=keys
+        ).values_list('idempotency_key', 'id'))
+
+        write_entries(
+            self.user,
+            [entry for entry in entries if entry['idempotency_key'] not in existing],
+            source='QUICKBOOKS'
+        )
+        replace_entries(self.user, {
+            existing[entry['idempotency_key']]: entry
+            for entry in entries if entry['idempotency_key'] in existing
+        })
+
+    def _get_accounts(self):
+        """QuickBooks account id -> (local id, account_type, classification), in account_number order"""
+        if self._accounts is None:
+            self._accounts = {
+                external_id: (pk, account_type, classification)
+                for pk, external_id, account_type, classification in Account.objects.filter(
+                    user=self.user, external_id__isnull=False
+                ).order_by('account_number').values_list('id', 'external_id', 'account_type', 'classification')
+            }
+        return self._accounts
+
+    def _resolve_account(self, ref, account_type, classification=None):
+        """Local account for a QuickBooks AccountRef.
+
+        A ref to an account not synced yet resolves to None so the record is
+        retried later. Only records without a ref fall back to the matching
+        account with the lowest account_number.
+        """
+        accounts = self._get_accounts()
+        if ref and ref.get('value'):
+            return accounts[ref['value']][0] if ref['value'] in accounts else None
+        for pk, kind, account_classification in accounts.values():
+            if kind == account_type and (classification is None or account_classification == classification):
+                return pk
+        return None
+
+    def _entry(self, entity, record, lines):
+        return {
+            'date': parse_date(record['TxnDate']),
+            'reference_number': (record.get('DocNumber') or record['Id'])[:50],
+            'description': record.get('PrivateNote') or f"{entity} {record.get('DocNumber') or record['Id']}",
+            'status': 'POSTED',
+            'idempotency_key': f"qb:{entity}:{record['Id']}",
+            'lines': lines,
+        }
+
+    def _invoice_entry(self, record):
+        """Debit receivables, credit the income account of each sales line"""
+        receivable = self._resolve_account(record.get('ARAccountRef'), 'ASSET', 'RECEIVABLE')
+        lines = []
+        for line in record.get('Line', []):
+            if line.get('DetailType') != 'SalesItemLineDetail':
+                continue
+            detail = line.get('SalesItemLineDetail', {})
+            revenue = self._resolve_account(detail.get('ItemAccountRef'), 'REVENUE')
+            lines.append((revenue, (line.get('Description') or '')[:200], Decimal('0'), Decimal(str(line['Amount']))))
+
+        total = sum((line[3] for line in lines), Decimal('0'))
+        if receivable is None or not lines or any(line[0] is None for line in lines):
+            return None
+        lines.append((receivable, f"Invoice {record.get('DocNumber', '')}"[:200], total, Decimal('0')))
+        return self._entry('Invoice', record, lines)
+
+    def _bill_entry(self, record):
+        """Debit the expense account of each bill line, credit payables"""
+        payable = self._resolve_account(record.get('APAccountRef'), 'LIABILITY', 'CURRENT')
+        lines = []
+        for line in record.get('Line', []):
+            detail = line.get('AccountBasedExpenseLineDetail')
+            if detail is None and line.get('DetailType') != 'ItemBasedExpenseLineDetail':
+                continue
+            expense = self._resolve_account((detail or {}).get('AccountRef'), 'EXPENSE')
+            lines.append((expense, (line.get('Description') or '')[:200], Decimal(str(line['Amount'])), Decimal('0')))
+
+        total = sum((line[2] for line in lines), Decimal('0'))
+        if payable is None or not lines or any(line[0] is None for line in lines):
+            return None
+        lines.append((payable, f"Bill {record.get('DocNumber', '')}"[:200], Decimal('0'), total))
+        return self._entry('Bill', record, lines)
+
     def _map_account_type(self, qb_account_type):
         """Map QuickBooks account types to local account types"""
         mapping = {
@@ -55,6 +293,7 @@ class QuickBooksService:
             'Liability': 'LIABILITY',
             'Equity': 'EQUITY',
             'Income': 'REVENUE',
+            'Revenue': 'REVENUE',
             'Expense': 'EXPENSE',
         }
-        return mapping.get(qb_account_type, 'ASSET') 
\ No newline at end of file
+        return mapping.get(qb_account_type, 'ASSET')
@@ -0,0 +1,98 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver, Signal
+from .models import Account, Transaction, TransactionLine
+from .balances import collect_line_deltas, apply_balance_deltas
+from .metrics import invalidate_metrics
+from .checkpoints import invalidate_checkpoints
+from .statements import mark_statements_stale
+from .versioning import bump_ledger_version
+
+# Sent after ledger rows for a user change; bulk writers send it explicitly
+# since bulk_create/update bypass model signals.
+# Arguments: user_id, account_ids, since (earliest affected date or None)
+ledger_changed = Signal()
+
+@receiver(pre_save, sender=TransactionLine)
+def remember_previous_line(sender, instance, **kwargs):
+    """Keep the stored amounts so post_save can apply only the difference"""
+    instance._ledger_previous = None
+    if instance.pk:
+        instance._ledger_previous = TransactionLine.objects.filter(pk=instance.pk).values_list(
+            'account_id', 'debit_amount', 'credit_amount', 'transaction__date'
+        ).first()
+
+@receiver(post_save, sender=TransactionLine)
+def update_balance_on_save(sender, instance, **kwargs):
+    deltas = {}
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous:
+        collect_line_deltas([previous], sign=-1, deltas=deltas)
+    date = instance.transaction.date
+    collect_line_deltas([
+        (instance.account_id, instance.debit_amount, instance.credit_amount, date)
+    ], deltas=deltas)
+    apply_balance_deltas(deltas)
+
+    since = min(date, previous[3]) if previous else date
+    ledger_changed.send(
+        sender=TransactionLine, user_id=instance.transaction.user_id,
+        account_ids=list(deltas), since=since
+    )
+
+@receiver(post_delete, sender=TransactionLine)
+def update_balance_on_delete(sender, instance, **kwargs):
+    apply_balance_deltas(collect_line_deltas([
+        (instance.account_id, instance.debit_amount, instance.credit_amount, None)
+    ], sign=-1))
+
+    transaction = instance.transaction
+    ledger_changed.send(
+        sender=TransactionLine, user_id=transaction.user_id,
+        account_ids=[instance.account_id], since=transaction.date
+    )
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_date(sender, instance, **kwargs):
+    instance._ledger_previous_date = None
+    if instance.pk:
+        instance._ledger_previous_date = Transaction.objects.filter(
+            pk=instance.pk
+        ).values_list('date', flat=True).first()
+
+@receiver(post_save, sender=Transaction)
+def transaction_redated(sender, instance, created, **kwargs):
+    """Moving an entry to another date changes as-of balances of all its accounts"""
+    previous = getattr(instance, '_ledger_previous_date', None)
+    if created or previous is None or previous == instance.date:
+        return
+    ledger_changed.send(
+        sender=Transaction, user_id=instance.user_id,
+        account_ids=list(instance.lines.values_list('account_id', flat=True)),
+        since=min(previous, instance.date)
+    )
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def transaction_changed(sender, instance, **kwargs):
+    """Header edits (description, status) don't move balances but do change responses"""
+    bump_ledger_version(instance.user_id)
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def account_changed(sender, instance, **kwargs):
+    ledger_changed.send(sender=Account, user_id=instance.user_id, account_ids=[instance.pk], since=None)
+
+@receiver(ledger_changed)
+def invalidate_cached_metrics(sender, user_id, **kwargs):
+    invalidate_metrics(user_id)
+    bump_ledger_version(user_id)
+
+@receiver(ledger_changed)
+def invalidate_balance_checkpoints(sender, account_ids, since, **kwargs):
+    if since is not None and account_ids:
+        invalidate_checkpoints(account_ids, since)
+
+@receiver(ledger_changed)
+def invalidate_financial_statements(sender, user_id, since, **kwargs):
+    if since is not None:
+        mark_statements_stale(user_id, since)
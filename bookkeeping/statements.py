@@ -0,0 +1,293 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .models import Account, FinancialStatement, TransactionLine
+from .checkpoints import month_end, last_closed_month_end
+from .utils import normal_balance
+from .versioning import ledger_version
+
+ZERO = Decimal('0')
+CURRENT_OPERATING_ASSETS = ('RECEIVABLE', 'INVENTORY', 'CURRENT')
+
+def _load(data):
+    return {int(k): (Decimal(d), Decimal(c)) for k, (d, c) in data.items()}
+
+def _dump(totals):
+    return {str(k): [str(d), str(c)] for k, (d, c) in totals.items()}
+
+def _merge(*parts):
+    merged = {}
+    for part in parts:
+        for account_id, (debits, credits) in part.items():
+            d, c = merged.get(account_id, (ZERO, ZERO))
+            merged[account_id] = (d + debits, c + credits)
+    return merged
+
+def _month_starts(start, end):
+    month = start.replace(day=1)
+    while month <= end:
+        yield month
+        month = month_end(month) + timedelta(days=1)
+
+class StatementEngine:
+    """Balance sheet, income statement and cash flow backed by FinancialStatement.
+
+    Statements for closed months are stored as per-account debit/credit
+    totals and served without touching the ledger. Anything later is the
+    latest stored balance sheet rolled forward by the lines since then.
+    Presentation (sections, totals) is derived on read, so renaming or
+    reclassifying an account never invalidates stored data.
+    """
+
+    def __init__(self, user, today=None):
+        self.user = user
+        self.today = today or timezone.now().date()
+        # Read before any totals; _persist only stores while it still matches
+        self.ledger_version = ledger_version(user.pk)
+        self.closed_through = last_closed_month_end(self.today)
+        self._accounts = None
+
+    def balance_sheet(self, as_of):
+        return self._present_balance_sheet(as_of, self.balance_sheet_totals(as_of))
+
+    def income_statement(self, start, end):
+        return self._present_income_statement(start, end, self.income_statement_totals(start, end))
+
+    def cash_flow(self, start, end):
+        closed = self._is_closed_month(start, end)
+        stored = self._stored('CASH_FLOW', start, end) if closed else None
+        if stored:
+            data = stored.data
+        else:
+            data = {
+                'opening': _dump(self.balance_sheet_totals(start - timedelta(days=1))),
+                'closing': _dump(self.balance_sheet_totals(end)),
+                'income': _dump(self.income_statement_totals(start, end)),
+            }
+            if closed:
+                self._persist('CASH_FLOW', start, end, data)
+        return self._present_cash_flow(
+            start, end, _load(data['opening']), _load(data['closing']), _load(data['income'])
+        )
+
+    def balance_sheet_totals(self, as_of):
+        """Cumulative per-account totals through as_of"""
+        period_start = as_of.replace(day=1)
+        closed = as_of == month_end(as_of) and as_of <= self.closed_through
+        if closed:
+            stored = self._stored('BALANCE_SHEET', period_start, as_of)
+            if stored:
+                return _load(stored.data['accounts'])
+
+        base = FinancialStatement.objects.filter(
+            user=self.user,
+            statement_type='BALANCE_SHEET',
+            is_stale=False,
+            period_end__lt=as_of
+        ).order_by('-period_end').first()
+        lines = TransactionLine.objects.filter(transaction__date__lte=as_of)
+        if base:
+            lines = lines.filter(transaction__date__gt=base.period_end)
+        totals = _merge(_load(base.data['accounts']) if base else {}, self._line_totals(lines))
+
+        if closed:
+            self._persist('BALANCE_SHEET', period_start, as_of, {'accounts': _dump(totals)})
+        return totals
+
+    def income_statement_totals(self, start, end):
+        """Per-account revenue and expense totals for [start, end]"""
+        if start.day != 1:
+            return self._line_totals(self._pl_lines(start, end))
+
+        # Whole closed months come from storage, missing ones are filled in one query
+        closed_end = min(end, self.closed_through)
+        months = [m for m in _month_starts(start, closed_end) if month_end(m) <= closed_end]
+        stored = {
+            statement.period_start: _load(statement.data['accounts'])
+            for statement in FinancialStatement.objects.filter(
+                user=self.user,
+                statement_type='INCOME_STATEMENT',
+                is_stale=False,
+                period_start__in=months
+            )
+            if statement.period_end == month_end(statement.period_start)
+        }
+        missing = [m for m in months if m not in stored]
+        if missing:
+            by_month = self._line_totals_by_month(self._pl_lines(missing[0], month_end(missing[-1])))
+            for month in missing:
+                stored[month] = by_month.get(month, {})
+                self._persist('INCOME_STATEMENT', month, month_end(month), {'accounts': _dump(stored[month])})
+
+        parts = [stored[m] for m in months]
+        tail_start = month_end(months[-1]) + timedelta(days=1) if months else start
+        if tail_start <= end:
+            parts.append(self._line_totals(self._pl_lines(tail_start, end)))
+        return _merge(*parts)
+
+    def _is_closed_month(self, start, end):
+        return start.day == 1 and end == month_end(start) and end <= self.closed_through
+
+    def _stored(self, statement_type, start, end):
+        return FinancialStatement.objects.filter(
+            user=self.user,
+            statement_type=statement_type,
+            period_start=start,
+            period_end=end,
+            is_stale=False
+        ).first()
+
+    def _persist(self, statement_type, start, end, data):
+        """Store a closed period unless the ledger moved since this engine started.
+
+        A write committing between the check and the update has already
+        bumped the version when it marks statements stale, so the second
+        check flags what mark_statements_stale could not see yet.
+        """
+        if ledger_version(self.user.pk) != self.ledger_version:
+            return
+        statement, _ = FinancialStatement.objects.update_or_create(
+            user=self.user,
+            statement_type=statement_type,
+            period_start=start,
+            period_end=end,
+            defaults={'data': data, 'is_stale': False}
+        )
+        if ledger_version(self.user.pk) != self.ledger_version:
+            FinancialStatement.objects.filter(pk=statement.pk).update(is_stale=True)
+
+    def _pl_lines(self, start, end):
+        return TransactionLine.objects.filter(
+            account__account_type__in=['REVENUE', 'EXPENSE'],
+            transaction__date__gte=start,
+            transaction__date__lte=end
+        )
+
+    def _line_totals(self, lines):
+        rows = lines.filter(account__user=self.user).values('account_id').annotate(
+            debits=Sum('debit_amount'), credits=Sum('credit_amount')
+        )
+        return {row['account_id']: (row['debits'] or ZERO, row['credits'] or ZERO) for row in rows}
+
+    def _line_totals_by_month(self, lines):
+        rows = lines.filter(account__user=self.user).annotate(
+            month=TruncMonth('transaction__date')
+        ).values('month', 'account_id').annotate(
+            debits=Sum('debit_amount'), credits=Sum('credit_amount')
+        )
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row['month'], {})[row['account_id']] = (row['debits'] or ZERO, row['credits'] or ZERO)
+        return by_month
+
+    def _get_accounts(self):
+        if self._accounts is None:
+            self._accounts = Account.objects.filter(user=self.user).in_bulk()
+        return self._accounts
+
+    def _rows(self, totals, account_type):
+        accounts = self._get_accounts()
+        rows = []
+        for account_id, (debits, credits) in totals.items():
+            account = accounts.get(account_id)
+            if account is None or account.account_type != account_type:
+                continue
+            balance = normal_balance(account_type, debits, credits)
+            if balance:
+                rows.append({
+                    'account_id': account_id,
+                    'account_number': account.account_number,
+                    'name': account.name,
+                    'balance': balance,
+                })
+        return sorted(rows, key=lambda row: row['account_number'])
+
+    def _total(self, rows):
+        return sum((row['balance'] for row in rows), ZERO)
+
+    def _present_balance_sheet(self, as_of, totals):
+        assets = self._rows(totals, 'ASSET')
+        liabilities = self._rows(totals, 'LIABILITY')
+        equity = self._rows(totals, 'EQUITY')
+        retained_earnings = self._total(self._rows(totals, 'REVENUE')) - self._total(self._rows(totals, 'EXPENSE'))
+        return {
+            'as_of': as_of,
+            'assets': assets,
+            'liabilities': liabilities,
+            'equity': equity,
+            'total_assets': self._total(assets),
+            'total_liabilities': self._total(liabilities),
+            'retained_earnings': retained_earnings,
+            'total_equity': self._total(equity) + retained_earnings,
+            'total_liabilities_and_equity': self._total(liabilities) + self._total(equity) + retained_earnings,
+        }
+
+    def _present_income_statement(self, start, end, totals):
+        revenue = self._rows(totals, 'REVENUE')
+        expenses = self._rows(totals, 'EXPENSE')
+        return {
+            'period_start': start,
+            'period_end': end,
+            'revenue': revenue,
+            'expenses': expenses,
+            'total_revenue': self._total(revenue),
+            'total_expenses': self._total(expenses),
+            'net_income': self._total(revenue) - self._total(expenses),
+        }
+
+    def _present_cash_flow(self, start, end, opening, closing, income):
+        """Indirect method; every account lands in exactly one bucket so the statement reconciles"""
+        accounts = self._get_accounts()
+        net_income = self._present_income_statement(start, end, income)['net_income']
+        operating, investing, financing = net_income, ZERO, ZERO
+        opening_cash = closing_cash = ZERO
+
+        for account_id in set(opening) | set(closing):
+            account = accounts.get(account_id)
+            if account is None or account.account_type not in ('ASSET', 'LIABILITY', 'EQUITY'):
+                continue
+            before = opening.get(account_id, (ZERO, ZERO))
+            after = closing.get(account_id, (ZERO, ZERO))
+            change = (after[0] - after[1]) - (before[0] - before[1])  # debit-positive
+
+            if account.account_type == 'ASSET' and account.classification == 'CASH':
+                opening_cash += before[0] - before[1]
+                closing_cash += after[0] - after[1]
+            elif account.account_type == 'ASSET' and account.classification in CURRENT_OPERATING_ASSETS:
+                operating -= change
+            elif account.account_type == 'ASSET':
+                investing -= change
+            elif account.account_type == 'LIABILITY' and account.classification == 'CURRENT':
+                operating -= change
+            else:
+                financing -= change
+
+        return {
+            'period_start': start,
+            'period_end': end,
+            'net_income': net_income,
+            'operating': operating,
+            'investing': investing,
+            'financing': financing,
+            'opening_cash': opening_cash,
+            'closing_cash': closing_cash,
+            'net_change_in_cash': closing_cash - opening_cash,
+        }
+
+def mark_statements_stale(user_id, since):
+    """Flag stored statements that an entry dated `since` changes.
+
+    Balance sheets and cash-flow statements (which store opening and
+    closing balances) are cumulative, so every one ending on or after the
+    date is affected; income statements only if their period contains it.
+    """
+    statements = FinancialStatement.objects.filter(user_id=user_id, is_stale=False)
+    cumulative = statements.filter(statement_type__in=['BALANCE_SHEET', 'CASH_FLOW'], period_end__gte=since)
+    income = statements.filter(
+        statement_type='INCOME_STATEMENT',
+        period_start__lte=since,
+        period_end__gte=since
+    )
+    return cumulative.update(is_stale=True) + income.update(is_stale=True)
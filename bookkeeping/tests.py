@@ -0,0 +1,654 @@
+import io
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .analytics import LedgerSeries, rolling_mean
+from .balances import rebuild_account_balances, verify_account_balances
+from .checkpoints import roll_forward_checkpoints, totals_as_of
+from .importers import RejectedRow, StatementImporter, iter_camt_rows, iter_csv_rows
+from .ingestion import BulkJournalIngestor, replace_entries, write_entries
+from .integrations.fake_quickbooks import SyntheticCompany
+from .integrations.scheduler import QuickBooksProvider, SyncJob, SyncProvider, SyncScheduler, ThrottledError
+from .metrics import BusinessMetrics
+from .models import (
+    Account, AccountBalance, AccountBalanceCheckpoint, FinancialStatement, QuickBooksIntegration, Transaction,
+    TransactionLine
+)
+from .services import QuickBooksService
+from .statements import StatementEngine
+from .utils import build_trial_balance, generate_trial_balance
+
+def connect_quickbooks(username, realm_id='1'):
+    user = User.objects.create_user(username)
+    integration = QuickBooksIntegration.objects.create(
+        user=user, access_token='access', refresh_token='refresh', realm_id=realm_id
+    )
+    return user, integration
+
+class QuickBooksSyncTests(TestCase):
+    def sync(self, user, integration, company, page_size=50):
+        service = QuickBooksService(user, integration, client=company)
+        service.page_size = page_size
+        return service.sync()
+
+    def test_incremental_sync_is_idempotent(self):
+        user, integration = connect_quickbooks('tenant')
+        company = SyntheticCompany(accounts=10, invoices=30, bills=20, seed=1)
+        first = self.sync(user, integration, company)
+        self.assertEqual(first['transactions']['synced'], 50)
+        self.assertIsNotNone(integration.last_sync)
+
+        company.touch('Invoice', 0)
+        company.add_bill()
+        second = self.sync(user, integration, company)
+        self.assertEqual(Transaction.objects.filter(user=user).count(), 51)
+        self.assertLess(second['transactions']['synced'], 10)
+
+    def test_unresolved_records_are_retried(self):
+        user, integration = connect_quickbooks('tenant')
+        company = SyntheticCompany(accounts=7, invoices=5, bills=0, seed=2)
+        company.entities['Invoice'][0]['ARAccountRef'] = {'value': '999'}
+        stats = self.sync(user, integration, company)
+        self.assertEqual(stats['transactions']['skipped'], 1)
+        self.assertEqual(integration.sync_cursors['unresolved']['Invoice'], ['INV1'])
+
+        company.entities['Account'].append(company._stamp({
+            'Id': '999', 'Name': 'Late receivables', 'AccountType': 'Accounts Receivable',
+            'Classification': 'Asset', 'Active': True,
+        }))
+        stats = self.sync(user, integration, company)
+        self.assertEqual(stats['transactions']['retried'], 1)
+        self.assertEqual(stats['transactions']['skipped'], 0)
+        self.assertTrue(Transaction.objects.filter(user=user, idempotency_key='qb:Invoice:INV1').exists())
+
+    def test_account_numbers_shared_across_companies(self):
+        companies = []
+        for username in ('first', 'second'):
+            user, integration = connect_quickbooks(username, realm_id=username)
+            company = SyntheticCompany(accounts=7, invoices=3, bills=3, seed=3)
+            for record in company.entities['Account']:
+                record['AcctNum'] = str(1000 + int(record['Id']))
+            self.sync(user, integration, company)
+            companies.append(user)
+
+        first, second = (Account.objects.filter(user=user) for user in companies)
+        self.assertEqual(first.count(), 7)
+        self.assertEqual(second.count(), 7)
+        self.assertTrue(first.filter(account_number='1001').exists())
+        self.assertFalse(second.filter(account_number='1001').exists())
+        self.assertEqual(Transaction.objects.filter(user=companies[1]).count(), 6)
+
+    def test_invoice_lines_balance(self):
+        user, integration = connect_quickbooks('tenant')
+        self.sync(user, integration, SyntheticCompany(accounts=7, invoices=5, bills=5, seed=4))
+        for transaction in Transaction.objects.filter(user=user).prefetch_related('lines'):
+            lines = list(transaction.lines.all())
+            self.assertEqual(
+                sum((line.debit_amount for line in lines), Decimal('0')),
+                sum((line.credit_amount for line in lines), Decimal('0'))
+            )
+
+def entry(cash, revenue, amount, reference='R1', **extra):
+    return dict({
+        'date': '2024-01-15', 'reference_number': reference, 'description': 'Sale',
+        'lines': [
+            {'account': cash.pk, 'debit_amount': amount},
+            {'account': revenue.pk, 'credit_amount': amount},
+        ],
+    }, **extra)
+
+class BulkIngestionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('bulk')
+        self.cash = Account.objects.create(
+            user=self.user, name='Cash', account_type='ASSET', account_number='B100'
+        )
+        self.revenue = Account.objects.create(
+            user=self.user, name='Sales', account_type='REVENUE', account_number='B400'
+        )
+
+    def test_entries_are_written_in_chunks_and_keys_deduplicate(self):
+        payload = [entry(self.cash, self.revenue, '10.00', f'R{i}', idempotency_key=f'k{i % 3}') for i in range(5)]
+        outcome = BulkJournalIngestor(self.user, chunk_size=2).ingest(payload)
+        self.assertEqual(outcome['summary']['created'], 3)
+        self.assertEqual(outcome['summary']['duplicates'], 2)
+        self.assertEqual(outcome['summary']['chunks'], 3)
+        self.assertEqual(AccountBalance.objects.get(account=self.cash).debit_total, Decimal('30.00'))
+
+    def test_amounts_that_do_not_fit_the_column_are_line_errors(self):
+        for amount in ('NaN', 'Infinity', '-Infinity', '123456789.00', '1.005', '1E+40', 'abc'):
+            outcome = BulkJournalIngestor(self.user).ingest([entry(self.cash, self.revenue, amount)])
+            result = outcome['results'][0]
+            self.assertEqual(result['status'], 'invalid', amount)
+            self.assertTrue(result['errors'][0].startswith('Line 0:'), amount)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_unbalanced_and_foreign_lines_are_rejected(self):
+        other = Account.objects.create(
+            user=User.objects.create_user('other'), name='Cash', account_type='ASSET', account_number='B999'
+        )
+        unbalanced = entry(self.cash, self.revenue, '10.00')
+        unbalanced['lines'][1]['credit_amount'] = '9.99'
+        outcome = BulkJournalIngestor(self.user).ingest([unbalanced, entry(other, self.revenue, '5.00')])
+        self.assertEqual(outcome['summary']['invalid'], 2)
+        self.assertIn('Total debits must equal total credits', outcome['results'][0]['errors'])
+        self.assertIn(f'Line 0: unknown account {other.pk}', outcome['results'][1]['errors'])
+
+    def test_bulk_endpoint_reports_invalid_amounts_without_failing(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/transactions/bulk/', [
+            entry(self.cash, self.revenue, 'NaN'), entry(self.cash, self.revenue, '12.50', 'R2')
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary']['invalid'], 1)
+        self.assertEqual(response.data['summary']['created'], 1)
+
+    def test_bulk_endpoint_rejects_a_batch_with_nothing_valid(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/transactions/bulk/', [entry(self.cash, self.revenue, 'Infinity')], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.data['results'][0]['errors'][0].startswith('Line 0:'))
+
+class LedgerTestCase(TestCase):
+    def setUp(self):
+        # Cached payloads are keyed by user id, which a rolled-back test may hand out again
+        cache.clear()
+        self.user = User.objects.create_user('ledger')
+        self.cash = Account.objects.create(
+            user=self.user, name='Cash', account_type='ASSET', account_number='L100'
+        )
+        self.revenue = Account.objects.create(
+            user=self.user, name='Sales', account_type='REVENUE', account_number='L400'
+        )
+
+    def transfer(self, debit, credit, amount, day=None):
+        amount = Decimal(amount)
+        write_entries(self.user, [{
+            'date': day or date.today(), 'reference_number': 'M', 'description': 'Entry', 'idempotency_key': None,
+            'lines': [(debit.pk, '', amount, Decimal('0')), (credit.pk, '', Decimal('0'), amount)],
+        }])
+
+    def post(self, day, amount, reference='S'):
+        amount = Decimal(amount)
+        return write_entries(self.user, [{
+            'date': day, 'reference_number': reference, 'description': 'Sale', 'status': 'POSTED',
+            'idempotency_key': None,
+            'lines': [(self.cash.pk, '', amount, Decimal('0')), (self.revenue.pk, '', Decimal('0'), amount)],
+        }])[0][0]
+
+class CheckpointTests(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post(date(2024, 1, 10), '100.00')
+        self.post(date(2024, 2, 10), '50.00')
+        self.post(date(2024, 4, 3), '25.00')
+
+    def test_reads_do_not_write_checkpoints(self):
+        self.assertEqual(totals_as_of(self.cash.pk, date(2024, 3, 31)), (Decimal('150.00'), Decimal('0')))
+        self.assertFalse(AccountBalanceCheckpoint.objects.exists())
+
+    def test_roll_forward_matches_the_ledger(self):
+        self.assertEqual(roll_forward_checkpoints(self.user, through=date(2024, 3, 31)), 4)
+        self.assertEqual(totals_as_of(self.cash.pk, date(2024, 2, 15)), (Decimal('150.00'), Decimal('0')))
+        self.assertEqual(totals_as_of(self.cash.pk, date(2024, 4, 30)), (Decimal('175.00'), Decimal('0')))
+        self.assertEqual(roll_forward_checkpoints(self.user, through=date(2024, 3, 31)), 0)
+
+    def test_back_dated_write_drops_later_checkpoints(self):
+        roll_forward_checkpoints(self.user, through=date(2024, 3, 31))
+        self.post(date(2024, 1, 20), '10.00')
+        self.assertFalse(AccountBalanceCheckpoint.objects.exists())
+        self.assertEqual(totals_as_of(self.cash.pk, date(2024, 3, 31)), (Decimal('160.00'), Decimal('0')))
+        roll_forward_checkpoints(self.user, through=date(2024, 3, 31))
+        self.assertEqual(totals_as_of(self.cash.pk, date(2024, 2, 29)), (Decimal('160.00'), Decimal('0')))
+
+    def test_trial_balance_columns_start_from_checkpoints(self):
+        roll_forward_checkpoints(self.user, through=date(2024, 3, 31))
+        dates = [date(2024, 1, 31), date(2024, 3, 15), None]
+        trial_balance = build_trial_balance(self.user, dates)
+        self.assertEqual(trial_balance.account_numbers, ['L100', 'L400'])
+        self.assertEqual([column[0] for column in trial_balance.debits], [
+            Decimal('100.00'), Decimal('150.00'), Decimal('175.00')
+        ])
+        self.assertEqual(trial_balance.totals(1), {'debit': Decimal('150.00'), 'credit': Decimal('150.00')})
+
+        AccountBalanceCheckpoint.objects.filter(account=self.cash, as_of=date(2024, 2, 29)).update(
+            debit_total=Decimal('1.00')
+        )
+        self.assertEqual(build_trial_balance(self.user, [date(2024, 3, 15)]).debits[0][0], Decimal('1.00'))
+
+    def test_trial_balance_with_a_start_date_reads_the_range(self):
+        trial_balance = build_trial_balance(self.user, [date(2024, 4, 30)], start_date=date(2024, 2, 1))
+        self.assertEqual(trial_balance.debits[0][0], Decimal('75.00'))
+
+class StatementEngineTests(LedgerTestCase):
+    today = date(2024, 5, 15)
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post(date(2024, 1, 10), '100.00')
+            self.post(date(2024, 3, 5), '40.00')
+
+    def test_closed_months_are_stored_and_reused(self):
+        engine = StatementEngine(self.user, today=self.today)
+        totals = engine.balance_sheet_totals(date(2024, 3, 31))
+        self.assertEqual(totals[self.cash.pk], (Decimal('140.00'), Decimal('0')))
+        stored = FinancialStatement.objects.get(statement_type='BALANCE_SHEET', period_end=date(2024, 3, 31))
+        self.assertFalse(stored.is_stale)
+
+        income = engine.income_statement_totals(date(2024, 1, 1), date(2024, 4, 30))
+        self.assertEqual(income[self.revenue.pk], (Decimal('0'), Decimal('140.00')))
+        self.assertEqual(FinancialStatement.objects.filter(statement_type='INCOME_STATEMENT').count(), 4)
+
+    def test_open_months_are_not_stored(self):
+        StatementEngine(self.user, today=self.today).balance_sheet_totals(date(2024, 5, 31))
+        self.assertFalse(FinancialStatement.objects.exists())
+
+    def test_nothing_is_stored_once_the_ledger_moves(self):
+        engine = StatementEngine(self.user, today=self.today)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post(date(2024, 2, 1), '5.00')
+        self.assertEqual(engine.balance_sheet_totals(date(2024, 3, 31))[self.cash.pk][0], Decimal('145.00'))
+        self.assertFalse(FinancialStatement.objects.exists())
+
+    def test_back_dated_writes_mark_stored_statements_stale(self):
+        StatementEngine(self.user, today=self.today).balance_sheet_totals(date(2024, 3, 31))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post(date(2024, 2, 1), '5.00')
+        self.assertTrue(FinancialStatement.objects.get(period_end=date(2024, 3, 31)).is_stale)
+
+        totals = StatementEngine(self.user, today=self.today).balance_sheet_totals(date(2024, 3, 31))
+        self.assertEqual(totals[self.cash.pk][0], Decimal('145.00'))
+        self.assertFalse(FinancialStatement.objects.get(period_end=date(2024, 3, 31)).is_stale)
+
+CAMT_ENTRY = (
+    '<Ntry><NtryRef>R{0}</NtryRef><Amt Ccy="EUR">{1}</Amt><CdtDbtInd>{2}</CdtDbtInd>'
+    '<BookgDt><Dt>2024-01-02</Dt></BookgDt>'
+    '<NtryDtls><TxDtls><RmtInf><Ustrd>Payment {0}</Ustrd></RmtInf></TxDtls></NtryDtls></Ntry>'
+)
+
+def camt(entries):
+    return io.BytesIO((
+        '<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02"><BkToCstmrStmt><Stmt>'
+        + ''.join(entries) + '</Stmt></BkToCstmrStmt></Document>'
+    ).encode())
+
+class StatementParserTests(TestCase):
+    def test_csv_quoted_fields_may_span_lines(self):
+        statement = io.BytesIO(
+            '\ufeffDate,Description,Amount,Reference\r\n'
+            '2024-01-02,"Rent\nJanuary, flat 2",-950.00,A1\r\n'
+            '\r\n'
+            '01/03/2024,Salary,"2,500.00",A2\r\n'
+            'not a date,Broken,1.00,A3\r\n'.encode('utf-8')
+        )
+        rows = list(iter_csv_rows(statement))
+        self.assertEqual(rows[0].description, 'Rent\nJanuary, flat 2')
+        self.assertEqual(rows[0].amount, Decimal('-950.00'))
+        self.assertEqual(rows[1].amount, Decimal('2500.00'))
+        self.assertEqual([row.position for row in rows[:2]], [1, 2])
+        self.assertIsInstance(rows[2], RejectedRow)
+        self.assertFalse(statement.closed)
+
+        resumed = list(iter_csv_rows(statement, start=1))
+        self.assertEqual([row.reference for row in resumed[:1]], ['A2'])
+
+    def test_camt_rows_and_resume(self):
+        entries = [CAMT_ENTRY.format(1, '10.00', 'CRDT'), CAMT_ENTRY.format(2, '4.50', 'DBIT')]
+        rows = list(iter_camt_rows(camt(entries)))
+        self.assertEqual([row.amount for row in rows], [Decimal('10.00'), Decimal('-4.50')])
+        self.assertEqual(rows[1].description, 'Payment 2')
+        self.assertEqual([row.reference for row in iter_camt_rows(camt(entries), start=1)], ['R2'])
+
+    def test_camt_does_not_keep_processed_entries(self):
+        statement = camt(CAMT_ENTRY.format(i, '1.00', 'CRDT') for i in range(5000))
+        tracemalloc.start()
+        try:
+            count = sum(1 for _ in iter_camt_rows(statement))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(count, 5000)
+        self.assertLess(peak, 512 * 1024)
+
+class StatementImporterTests(LedgerTestCase):
+    def test_reimporting_a_statement_is_idempotent(self):
+        statement = io.BytesIO(b'Date,Description,Amount\n2024-01-02,Coffee,-3.50\n2024-01-03,Refund,12.00\n')
+        importer = StatementImporter(self.user, self.cash, self.revenue, batch_size=1)
+        first = importer.run(statement, 'csv')
+        self.assertEqual((first.imported, first.resume_position), (2, 2))
+        second = StatementImporter(self.user, self.cash, self.revenue).run(statement, 'csv')
+        self.assertEqual((second.imported, second.duplicates), (0, 2))
+        self.assertEqual(AccountBalance.objects.get(account=self.cash).balance, Decimal('8.50'))
+
+class AnalyticsAPITests(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post(date.today(), '30.00')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_invalid_parameters_are_rejected(self):
+        for query in ('periods=0', 'periods=-3', 'rolling=abc', 'windows=30,0', 'freq=week'):
+            response = self.client.get(f'/api/analytics/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+        windows = ','.join(str(days) for days in range(1, 12))
+        self.assertEqual(self.client.get(f'/api/analytics/?windows={windows}').status_code, 400)
+
+    def test_oversized_parameters_are_clamped(self):
+        response = self.client.get('/api/analytics/?freq=month&periods=100000&rolling=100000')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['trends']['dates']), 120)
+
+        response = self.client.get('/api/analytics/?periods=7&windows=30,30,90')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['trends']['dates']), 7)
+
+class FlakyProvider(SyncProvider):
+    """Throttled on each tenant's first attempt, then writes one row"""
+    name = 'quickbooks'
+
+    def __init__(self, tenants):
+        self.tenants = tenants
+        self.calls = []
+
+    def discover(self, due_before):
+        return [SyncJob(self.name, tenant, tenant, None) for tenant in self.tenants]
+
+    def run(self, job, clients, bucket):
+        self.calls.append(job.tenant_id)
+        if self.calls.count(job.tenant_id) == 1:
+            raise ThrottledError('throttled', retry_after=0.01)
+        return 1
+
+class SyncSchedulerTests(TestCase):
+    def test_discover_claims_due_integrations_once(self):
+        due = [connect_quickbooks(f'due{i}', realm_id=str(i))[1] for i in range(3)]
+        recent = connect_quickbooks('recent', realm_id='9')[1]
+        recent.last_attempt = timezone.now()
+        recent.save()
+        inactive = connect_quickbooks('inactive', realm_id='10')[1]
+        inactive.is_active = False
+        inactive.save()
+
+        provider = QuickBooksProvider()
+        due_before = timezone.now() - timedelta(hours=1)
+        jobs = provider.discover(due_before)
+        self.assertEqual(sorted(job.tenant_id for job in jobs), sorted(i.pk for i in due))
+        self.assertEqual(provider.discover(due_before), [])
+        self.assertFalse(QuickBooksIntegration.objects.filter(pk__in=[i.pk for i in due], last_attempt=None).exists())
+
+    def test_throttled_jobs_back_off_and_retry(self):
+        provider = FlakyProvider([1, 2])
+        metrics = SyncScheduler(providers=[provider], workers=2, max_attempts=3).run_once()
+        stats = metrics['providers']['quickbooks']
+        self.assertEqual((stats['completed'], stats['throttled'], stats['rows']), (2, 2, 2))
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertEqual(sorted(provider.calls), [1, 1, 2, 2])
+
+class AccountBalanceTests(LedgerTestCase):
+    def totals(self, account):
+        balance = AccountBalance.objects.get(account=account)
+        return balance.debit_total, balance.credit_total, balance.line_count, balance.last_posted_date
+
+    def assertMatchesLedger(self):
+        self.assertEqual(verify_account_balances(self.user), [])
+
+    def test_line_saves_updates_and_deletes(self):
+        txn = Transaction.objects.create(
+            user=self.user, date=date(2024, 1, 5), reference_number='M1', description='Manual'
+        )
+        debit = TransactionLine.objects.create(transaction=txn, account=self.cash, debit_amount=Decimal('40'))
+        credit = TransactionLine.objects.create(transaction=txn, account=self.revenue, credit_amount=Decimal('40'))
+        self.assertEqual(self.totals(self.cash), (Decimal('40'), Decimal('0'), 1, date(2024, 1, 5)))
+
+        debit.debit_amount = Decimal('55')
+        debit.save()
+        credit.account = self.cash
+        credit.save()
+        self.assertEqual(self.totals(self.cash)[:3], (Decimal('55'), Decimal('40'), 2))
+        self.assertEqual(self.totals(self.revenue)[:3], (Decimal('0'), Decimal('0'), 0))
+        self.assertMatchesLedger()
+
+        debit.delete()
+        self.assertEqual(self.totals(self.cash)[:3], (Decimal('0'), Decimal('40'), 1))
+        self.assertMatchesLedger()
+
+    def test_bulk_writes_and_cascades(self):
+        first = self.post(date(2024, 1, 5), '10.00')
+        self.post(date(2024, 2, 5), '15.00')
+        self.assertEqual(self.totals(self.cash), (Decimal('25.00'), Decimal('0'), 2, date(2024, 2, 5)))
+
+        replace_entries(self.user, {first: {
+            'date': date(2024, 1, 6), 'reference_number': 'S', 'description': 'Sale',
+            'lines': [(self.cash.pk, '', Decimal('12.00'), Decimal('0')), (self.revenue.pk, '', Decimal('0'), Decimal('12.00'))],
+        }})
+        self.assertEqual(self.totals(self.cash)[:3], (Decimal('27.00'), Decimal('0'), 2))
+        self.assertMatchesLedger()
+
+        Transaction.objects.get(pk=first).delete()
+        self.assertEqual(self.totals(self.revenue)[:3], (Decimal('0'), Decimal('15.00'), 1))
+        self.assertMatchesLedger()
+
+    def test_rebuild_reproduces_maintained_rows(self):
+        self.post(date(2024, 1, 5), '10.00')
+        self.post(date(2024, 3, 1), '2.50')
+        maintained = {account: self.totals(account) for account in (self.cash, self.revenue)}
+        AccountBalance.objects.all().delete()
+        self.assertEqual(len(verify_account_balances(self.user)), 2)
+        rebuild_account_balances(self.user)
+        self.assertEqual({account: self.totals(account) for account in (self.cash, self.revenue)}, maintained)
+
+class TrialBalanceTests(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.expense = Account.objects.create(
+            user=self.user, name='Rent', account_type='EXPENSE', account_number='L600'
+        )
+        self.post(date(2024, 1, 5), '100.00')
+        self.post(date(2024, 2, 5), '60.00')
+        write_entries(self.user, [{
+            'date': date(2024, 2, 10), 'reference_number': 'P', 'description': 'Rent', 'idempotency_key': None,
+            'lines': [(self.expense.pk, '', Decimal('70.00'), Decimal('0')), (self.cash.pk, '', Decimal('0'), Decimal('70.00'))],
+        }])
+
+    def test_credit_normal_accounts_land_in_the_credit_column(self):
+        rows = {row['account_number']: row for row in build_trial_balance(self.user).rows()}
+        self.assertEqual((rows['L100']['debit'], rows['L100']['credit']), (Decimal('90.00'), Decimal('0')))
+        self.assertEqual((rows['L400']['debit'], rows['L400']['credit']), (Decimal('0'), Decimal('160.00')))
+        self.assertEqual(rows['L400']['balance'], Decimal('160.00'))
+        self.assertEqual(build_trial_balance(self.user).totals(), {'debit': Decimal('160.00'), 'credit': Decimal('160.00')})
+
+    def test_as_of_and_start_date_columns(self):
+        trial_balance = build_trial_balance(self.user, [date(2024, 1, 31), date(2024, 2, 29)])
+        self.assertEqual(trial_balance.balances(0), [Decimal('100.00'), Decimal('100.00'), Decimal('0')])
+        self.assertEqual(trial_balance.balances(1), [Decimal('90.00'), Decimal('160.00'), Decimal('70.00')])
+
+        ranged = build_trial_balance(self.user, [date(2024, 2, 29)], start_date=date(2024, 2, 1))
+        self.assertEqual(ranged.balances(), [Decimal('-10.00'), Decimal('60.00'), Decimal('70.00')])
+
+    def test_generate_trial_balance_attaches_accounts(self):
+        rows = generate_trial_balance(self.user, as_of_date=date(2024, 1, 31))
+        self.assertEqual([row['account'] for row in rows], [self.cash, self.revenue])
+
+    def test_endpoint_returns_one_column_per_date(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/trial-balance/?as_of=2024-01-31,2024-02-29')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([column['totals']['debit'] for column in response.data['columns']], [
+            Decimal('100.00'), Decimal('160.00')
+        ])
+        self.assertEqual(client.get('/api/trial-balance/?as_of=yesterday').status_code, 400)
+
+class BusinessMetricsTests(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cash.classification = 'CASH'
+        self.cash.save()
+        accounts = {
+            name: Account.objects.create(
+                user=self.user, name=name, account_type=account_type, classification=classification,
+                account_number=f'M{number}'
+            )
+            for number, (name, account_type, classification) in enumerate([
+                ('inventory', 'ASSET', 'INVENTORY'), ('payables', 'LIABILITY', 'CURRENT'),
+                ('equity', 'EQUITY', ''), ('cogs', 'EXPENSE', 'COGS'),
+            ])
+        }
+        self.accounts = accounts
+        for debit, credit, amount in [
+            (self.cash, accounts['equity'], '1000'), (accounts['inventory'], accounts['payables'], '400'),
+            (self.cash, self.revenue, '300'), (accounts['cogs'], accounts['inventory'], '100'),
+        ]:
+            self.transfer(debit, credit, amount)
+
+    def test_ratios_come_from_the_balance_vector(self):
+        metrics = BusinessMetrics(self.user).get_all_metrics(use_cache=False)
+        self.assertEqual(metrics['current_ratio'], Decimal('4'))
+        self.assertEqual(metrics['quick_ratio'], Decimal('3.25'))
+        self.assertEqual(round(metrics['gross_profit_margin'], 2), Decimal('66.67'))
+        self.assertEqual(metrics['debt_to_equity_ratio'], Decimal('0.4'))
+
+    def test_ratios_without_a_denominator_are_none(self):
+        other = User.objects.create_user('empty')
+        metrics = BusinessMetrics(other).get_all_metrics(use_cache=False)
+        self.assertIsNone(metrics['current_ratio'])
+        self.assertIsNone(metrics['gross_profit_margin'])
+
+    def test_cached_metrics_are_dropped_after_a_committed_write(self):
+        self.assertEqual(BusinessMetrics(self.user).get_all_metrics()['current_ratio'], Decimal('4'))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.transfer(self.cash, self.accounts['payables'], '400')
+        self.assertEqual(BusinessMetrics(self.user).get_all_metrics()['current_ratio'], Decimal('4'))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(BusinessMetrics(self.user).get_all_metrics()['current_ratio'], Decimal('2.5'))
+
+class LedgerSeriesTests(LedgerTestCase):
+    end = date(2024, 6, 30)
+
+    def setUp(self):
+        super().setUp()
+        self.cash.classification = 'CASH'
+        self.cash.save()
+        self.receivables = Account.objects.create(
+            user=self.user, name='Receivables', account_type='ASSET', classification='RECEIVABLE',
+            account_number='L120'
+        )
+        self.transfer(self.cash, self.revenue, '100', self.end - timedelta(days=60))
+        self.transfer(self.receivables, self.revenue, '200', self.end - timedelta(days=10))
+        self.transfer(self.cash, self.receivables, '150', self.end - timedelta(days=5))
+        self.transfer(self.cash, self.revenue, '999', self.end + timedelta(days=3))
+
+    def test_windows_follow_the_indirect_method(self):
+        series = LedgerSeries.load(self.user, end=self.end, periods=30)
+        window = series.window(30)
+        self.assertEqual(window['net_income'], Decimal('200.00'))
+        self.assertEqual(window['net_credit_sales'], Decimal('200.00'))
+        self.assertEqual(window['operating_cash_flow'], Decimal('150.00'))
+        self.assertEqual(window['cash_change'], Decimal('150.00'))
+        self.assertEqual(series.window(5)['net_income'], Decimal('0.00'))
+
+    def test_levels_start_from_the_recovered_opening_balance(self):
+        series = LedgerSeries.load(self.user, end=self.end, periods=30)
+        receivables = series.level('ASSET', ('RECEIVABLE',))
+        self.assertEqual((receivables[0], receivables[-7], receivables[-1]), (0, 20000, 5000))
+        cash = series.level('ASSET', ('CASH',))
+        self.assertEqual((cash[0], cash[-1]), (10000, 25000))
+
+    def test_monthly_buckets_and_trends(self):
+        series = LedgerSeries.load(self.user, end=self.end, periods=3, freq='month')
+        self.assertEqual(series.dates, [date(2024, 4, 1), date(2024, 5, 1), date(2024, 6, 1)])
+        self.assertEqual(series.trends()['series']['revenue'], [0.0, 100.0, 200.0])
+        self.assertEqual(series.trends(rolling=2)['series']['revenue'], [None, 50.0, 150.0])
+
+    def test_rolling_mean(self):
+        self.assertEqual(rolling_mean([1, 2, 3, 4], 2)[1:].tolist(), [1.5, 2.5, 3.5])
+        self.assertTrue(all(value != value for value in rolling_mean([1, 2], 3)))
+
+class VersionedResponseTests(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stats(self, name='metrics'):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser('admin'))
+        return client.get('/api/cache-stats/').data[name]
+
+    def test_payloads_are_cached_and_etags_answer_304(self):
+        first = self.client.get('/api/metrics/')
+        second = self.client.get('/api/metrics/')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        stats = self.stats()
+        self.assertEqual((stats['miss'], stats['hit'], stats['not_modified']), (1, 1, 1))
+
+    def test_committed_ledger_writes_change_the_version(self):
+        etag = self.client.get('/api/dashboard/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            txn = self.post(date.today(), '5.00')
+        changed = self.client.get('/api/dashboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.data['recent_transactions']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.filter(pk=txn).get().save()
+        self.assertNotEqual(self.client.get('/api/dashboard/')['ETag'], changed['ETag'])
+
+    def test_stats_are_admin_only(self):
+        self.assertEqual(self.client.get('/api/cache-stats/').status_code, 403)
+
+class TransactionListingTests(LedgerTestCase):
+    def setUp(self):
+        super().setUp()
+        for day in (1, 2, 2, 2, 3, 5, 5):
+            self.post(date(2024, 1, day), f'{day}.00', reference=f'T{day}')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.newest_first = list(Transaction.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+    def walk(self, query):
+        ids, url = [], f'/api/transactions/?{query}'
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_keyset_pages_visit_every_transaction_once(self):
+        self.assertEqual(self.walk('cursor=&page_size=3'), self.newest_first)
+        self.assertEqual(self.walk('cursor=&page_size=2&lean=1'), self.newest_first)
+
+    def test_lean_rows_match_the_serializer(self):
+        full = self.client.get('/api/transactions/?cursor=&page_size=10').data['results']
+        lean = self.client.get('/api/transactions/?cursor=&page_size=10&lean=1').data['results']
+        fields = ['id', 'date', 'reference_number', 'description', 'status', 'source']
+        self.assertEqual(
+            [({f: row[f] for f in fields}, [(l['account'], l['debit_amount'], l['credit_amount']) for l in row['lines']]) for row in lean],
+            [({f: row[f] for f in fields}, [(l['account'], l['debit_amount'], l['credit_amount']) for l in row['lines']]) for row in full]
+        )
+
+    def test_page_queries_do_not_grow_with_page_size(self):
+        for page_size in (2, 7):
+            with self.assertNumQueries(2):
+                self.client.get(f'/api/transactions/?cursor=&page_size={page_size}')
+            with self.assertNumQueries(2):
+                self.client.get(f'/api/transactions/?cursor=&page_size={page_size}&lean=1')
+
+    def test_page_numbers_remain_the_default(self):
+        response = self.client.get('/api/transactions/')
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(self.client.get('/api/transactions/?cursor=bm9wZQ').status_code, 404)
@@ -1,31 +1,184 @@
 from decimal import Decimal
-from .models import Account, Transaction, TransactionLine
+from django.db.models import Sum, F, Q
+from .models import Account, AccountBalance, Transaction, TransactionLine
+from .checkpoints import totals_as_of, user_totals_as_of
+
+NORMAL_DEBIT_TYPES = ('ASSET', 'EXPENSE')
+
+def normal_balance(account_type, debits, credits):
+    """Sign a debit/credit pair by the account type's normal balance"""
+    if account_type in NORMAL_DEBIT_TYPES:
+        return debits - credits
+    return credits - debits
 
 def calculate_account_balance(account, as_of_date=None):
     """Calculate the balance of an account as of a specific date"""
-    query = TransactionLine.objects.filter(account=account)
     if as_of_date:
-        query = query.filter(transaction__date__lte=as_of_date)
-    
-    debits = query.aggregate(total=models.Sum('debit_amount'))['total'] or Decimal('0')
-    credits = query.aggregate(total=models.Sum('credit_amount'))['total'] or Decimal('0')
-    
-    if account.account_type in ['ASSET', 'EXPENSE']:
-        return debits - credits
-    return credits - debits
+        debits, credits = totals_as_of(account.pk, as_of_date)
+    else:
+        totals = AccountBalance.objects.filter(account=account).values_list(
+            'debit_total', 'credit_total'
+        ).first()
+        debits, credits = totals or (Decimal('0'), Decimal('0'))
+    return normal_balance(account.account_type, debits, credits)
 
-def generate_trial_balance(user, as_of_date=None):
-    """Generate a trial balance report"""
-    accounts = Account.objects.filter(user=user, is_active=True)
-    trial_balance = []
-    
-    for account in accounts:
-        balance = calculate_account_balance(account, as_of_date)
-        if balance != 0:
-            trial_balance.append({
-                'account': account,
-                'debit': balance if balance > 0 else Decimal('0'),
-                'credit': abs(balance) if balance < 0 else Decimal('0'),
+class TrialBalance:
+    """Columnar trial balance: one row per account, one debit/credit column pair per as-of date"""
+
+    def __init__(self, as_of_dates, start_date=None):
+        self.as_of_dates = list(as_of_dates)
+        self.start_date = start_date
+        self.account_ids = []
+        self.account_numbers = []
+        self.account_names = []
+        self.account_types = []
+        self.debits = [[] for _ in self.as_of_dates]
+        self.credits = [[] for _ in self.as_of_dates]
+
+    def __len__(self):
+        return len(self.account_ids)
+
+    def append(self, account_id, number, name, account_type, debits, credits):
+        self.account_ids.append(account_id)
+        self.account_numbers.append(number)
+        self.account_names.append(name)
+        self.account_types.append(account_type)
+        for column, (debit, credit) in enumerate(zip(debits, credits)):
+            self.debits[column].append(debit)
+            self.credits[column].append(credit)
+
+    def balances(self, column=0):
+        """Normal-signed balance per account for one column"""
+        return [
+            normal_balance(account_type, debit, credit)
+            for account_type, debit, credit in zip(
+                self.account_types, self.debits[column], self.credits[column]
+            )
+        ]
+
+    def net_columns(self, column=0):
+        """Net debit and credit columns as printed on the report"""
+        nets = [debit - credit for debit, credit in zip(self.debits[column], self.credits[column])]
+        return (
+            [net if net > 0 else Decimal('0') for net in nets],
+            [-net if net < 0 else Decimal('0') for net in nets],
+        )
+
+    def totals(self, column=0):
+        debit_column, credit_column = self.net_columns(column)
+        return {'debit': sum(debit_column, Decimal('0')), 'credit': sum(credit_column, Decimal('0'))}
+
+    def rows(self, column=0):
+        debit_column, credit_column = self.net_columns(column)
+        return [
+            {
+                'account_id': account_id,
+                'account_number': number,
+                'account_name': name,
+                'account_type': account_type,
+                'debit': debit,
+                'credit': credit,
+                'balance': balance,
+            }
+            for account_id, number, name, account_type, debit, credit, balance in zip(
+                self.account_ids, self.account_numbers, self.account_names, self.account_types,
+                debit_column, credit_column, self.balances(column)
+            )
+        ]
+
+    def as_dict(self):
+        columns = []
+        for column, as_of_date in enumerate(self.as_of_dates):
+            debit_column, credit_column = self.net_columns(column)
+            columns.append({
+                'as_of_date': as_of_date,
+                'debit': debit_column,
+                'credit': credit_column,
+                'balance': self.balances(column),
+                'totals': self.totals(column),
             })
-    
-    return trial_balance 
\ No newline at end of file
+        return {
+            'start_date': self.start_date,
+            'account_id': self.account_ids,
+            'account_number': self.account_numbers,
+            'account_name': self.account_names,
+            'account_type': self.account_types,
+            'columns': columns,
+        }
+
+def build_trial_balance(user, as_of_dates=None, start_date=None, include_zero=False):
+    """Build a trial balance for one or more as-of dates.
+
+    Without a start date the columns come from materialized totals and
+    checkpoints; a start date needs one grouped query over its range.
+    """
+    as_of_dates = list(as_of_dates or [None])
+    result = TrialBalance(as_of_dates, start_date)
+
+    if start_date is None:
+        # Lifetime columns read the materialized totals and dated columns start
+        # from each account's nearest checkpoint, so neither scans the ledger
+        lifetime = {
+            account_id: (debits, credits)
+            for account_id, debits, credits in AccountBalance.objects.filter(
+                account__user=user
+            ).values_list('account_id', 'debit_total', 'credit_total')
+        } if None in as_of_dates else None
+        column_totals = [
+            lifetime if as_of_date is None else user_totals_as_of(user, as_of_date)
+            for as_of_date in as_of_dates
+        ]
+        rows = []
+        for account_id, number, name, account_type in Account.objects.filter(
+            user=user, is_active=True
+        ).values_list('id', 'account_number', 'name', 'account_type').order_by('account_number'):
+            if not any(account_id in totals for totals in column_totals):
+                continue
+            row = {
+                'account_id': account_id,
+                'account__account_number': number,
+                'account__name': name,
+                'account__account_type': account_type,
+            }
+            for column, totals in enumerate(column_totals):
+                row[f'd{column}'], row[f'c{column}'] = totals.get(account_id, (None, None))
+            rows.append(row)
+    else:
+        lines = TransactionLine.objects.filter(
+            account__user=user, account__is_active=True, transaction__date__gte=start_date
+        )
+        if None not in as_of_dates:
+            lines = lines.filter(transaction__date__lte=max(as_of_dates))
+
+        aggregates = {}
+        for column, as_of_date in enumerate(as_of_dates):
+            date_filter = Q(transaction__date__lte=as_of_date) if as_of_date else None
+            aggregates[f'd{column}'] = Sum('debit_amount', filter=date_filter)
+            aggregates[f'c{column}'] = Sum('credit_amount', filter=date_filter)
+
+        rows = lines.values(
+            'account_id', 'account__account_number', 'account__name', 'account__account_type'
+        ).annotate(**aggregates).order_by('account__account_number')
+
+    columns = range(len(as_of_dates))
+    for row in rows:
+        debits = [row[f'd{column}'] or Decimal('0') for column in columns]
+        credits = [row[f'c{column}'] or Decimal('0') for column in columns]
+        if not include_zero and all(d == c for d, c in zip(debits, credits)):
+            continue
+        result.append(
+            row['account_id'], row['account__account_number'], row['account__name'],
+            row['account__account_type'], debits, credits
+        )
+
+    return result
+
+def generate_trial_balance(user, as_of_date=None, start_date=None):
+    """Generate a trial balance report"""
+    trial_balance = build_trial_balance(user, [as_of_date], start_date)
+    accounts = Account.objects.in_bulk(trial_balance.account_ids)
+
+    rows = trial_balance.rows()
+    for row in rows:
+        row['account'] = accounts[row['account_id']]
+    return rows
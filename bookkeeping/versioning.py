@@ -0,0 +1,31 @@
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+def ledger_version_key(user_id):
+    return f'bookkeeping:ledger-version:{user_id}'
+
+def ledger_version(user_id):
+    """Current ledger version for a user, seeding the counter if it is missing"""
+    key = ledger_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a counter lost to eviction never repeats an old version
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+def _incr_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+def bump_ledger_version(user_id):
+    """Move the user to a new version once the write commits.
+
+    Bumping inside the transaction would let a request that still sees the
+    old rows cache its payload under the new version.
+    """
+    key = ledger_version_key(user_id)
+    transaction.on_commit(lambda: _incr_version(key))
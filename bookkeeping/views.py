@@ -1,12 +1,13 @@
 from django.views.generic import ListView, CreateView, UpdateView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Sum, F
 from django.shortcuts import render
 from django.urls import reverse_lazy
 from .models import *
 from .forms import TransactionForm, AccountForm
 from .utils import generate_trial_balance
+from .balances import balance_expression
 from .metrics import calculate_business_metrics
+from .statements import StatementEngine
 
 class DashboardView(LoginRequiredMixin, DetailView):
     template_name = 'bookkeeping/dashboard.html'
@@ -28,9 +29,7 @@ class DashboardView(LoginRequiredMixin, DetailView):
             user=user,
             is_active=True
         ).annotate(
-            balance=Sum(
-                F('transactionline__debit_amount') - F('transactionline__credit_amount')
-            )
+            balance=balance_expression()
         )
         
         return context
@@ -62,4 +61,25 @@ class FinancialReportView(LoginRequiredMixin, DetailView):
         context['trial_balance'] = generate_trial_balance(self.request.user)
         context['balance_sheet'] = self.generate_balance_sheet()
         context['income_statement'] = self.generate_income_statement()
-        return context 
\ No newline at end of file
+        context['cash_flow'] = self.generate_cash_flow()
+        return context
+
+    def get_engine(self):
+        if not hasattr(self, '_engine'):
+            self._engine = StatementEngine(self.request.user)
+        return self._engine
+
+    def generate_balance_sheet(self):
+        """Balance sheet as of today"""
+        engine = self.get_engine()
+        return engine.balance_sheet(engine.today)
+
+    def generate_income_statement(self):
+        """Year-to-date income statement"""
+        engine = self.get_engine()
+        return engine.income_statement(engine.today.replace(month=1, day=1), engine.today)
+
+    def generate_cash_flow(self):
+        """Year-to-date cash flow statement"""
+        engine = self.get_engine()
+        return engine.cash_flow(engine.today.replace(month=1, day=1), engine.today) 
\ No newline at end of file
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+class BudgetTrackerConfig(AppConfig):
+    name = 'budget_tracker'
+
+    def ready(self):
+        from . import signals  # noqa: F401
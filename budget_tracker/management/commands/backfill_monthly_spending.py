@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from budget_tracker.rollups import rebuild_monthly_spending
+
+class Command(BaseCommand):
+    help = 'Rebuild category-by-month spending rollups from Expense rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Limit to a single user id')
+
+    def handle(self, *args, **options):
+        user = User.objects.get(pk=options['user']) if options['user'] else None
+        count = rebuild_monthly_spending(user)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} monthly spending rows'))
@@ -21,4 +21,22 @@ class Expense(models.Model):
     is_essential = models.BooleanField(default=True)
     
     def __str__(self):
-        return f"{self.description}: ${self.amount}" 
\ No newline at end of file
+        return f"{self.description}: ${self.amount}" 
+
+class MonthlySpending(models.Model):
+    """Per-category monthly expense rollup, maintained by budget_tracker.signals"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='monthly_spending')
+    month = models.DateField()  # First day of the month
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    essential_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['category', 'month']
+        indexes = [
+            models.Index(fields=['user', 'month']),
+        ]
+    
+    def __str__(self):
+        return f"{self.category} {self.month:%Y-%m}: ${self.total}"
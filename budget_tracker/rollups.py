@@ -0,0 +1,106 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Q, Sum, Count, FilteredRelation
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .models import Category, Expense, MonthlySpending
+
+ZERO = Decimal('0')
+
+def month_start(day):
+    return day.replace(day=1)
+
+def collect_expense_deltas(rows, sign=1, deltas=None):
+    """Aggregate (user_id, category_id, date, amount, is_essential) rows into rollup deltas"""
+    deltas = {} if deltas is None else deltas
+    for user_id, category_id, day, amount, is_essential in rows:
+        key = (user_id, category_id, month_start(day))
+        total, essential_total, count = deltas.get(key, (ZERO, ZERO, 0))
+        amount = sign * (amount or ZERO)
+        deltas[key] = (total + amount, essential_total + (amount if is_essential else ZERO), count + sign)
+    return deltas
+
+def apply_spending_deltas(deltas):
+    """Add deltas onto MonthlySpending rows, creating missing ones for added expenses.
+
+    Removals only update existing rows: a removed expense always has one,
+    unless it went with its category or user, and recreating it then
+    would point at the row being deleted.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        MonthlySpending.objects.bulk_create(
+            [MonthlySpending(user_id=user_id, category_id=category_id, month=month)
+             for (user_id, category_id, month), (_, _, count) in deltas.items() if count > 0],
+            ignore_conflicts=True
+        )
+        for (user_id, category_id, month), (total, essential_total, count) in deltas.items():
+            MonthlySpending.objects.filter(category_id=category_id, month=month).update(
+                total=F('total') + total,
+                essential_total=F('essential_total') + essential_total,
+                count=F('count') + count
+            )
+
+def rebuild_monthly_spending(user=None):
+    """Recompute rollups from Expense rows; returns the number of rows written"""
+    expenses = Expense.objects.all()
+    rollups = MonthlySpending.objects.all()
+    if user is not None:
+        expenses = expenses.filter(user=user)
+        rollups = rollups.filter(user=user)
+
+    rows = expenses.annotate(month=TruncMonth('date')).values('user_id', 'category_id', 'month').annotate(
+        total=Sum('amount'),
+        essential_total=Sum('amount', filter=Q(is_essential=True)),
+        count=Count('id')
+    )
+    with transaction.atomic():
+        rollups.delete()
+        created = MonthlySpending.objects.bulk_create([
+            MonthlySpending(
+                user_id=row['user_id'],
+                category_id=row['category_id'],
+                month=row['month'],
+                total=row['total'] or ZERO,
+                essential_total=row['essential_total'] or ZERO,
+                count=row['count']
+            )
+            for row in rows
+        ], batch_size=1000)
+    return len(created)
+
+def budget_status(month=None, users=None):
+    """Spending against budget_limit for every category of the given users in one read.
+
+    Categories without expenses that month report zero spending.
+    """
+    month = month_start(month or timezone.now().date())
+    categories = Category.objects.all()
+    if users is not None:
+        categories = categories.filter(user__in=users)
+
+    rows = categories.annotate(
+        spending=FilteredRelation('monthly_spending', condition=Q(monthly_spending__month=month))
+    ).values(
+        'id', 'user_id', 'name', 'budget_limit',
+        'spending__total', 'spending__essential_total', 'spending__count'
+    )
+    status = []
+    for row in rows:
+        spent = row['spending__total'] or ZERO
+        status.append({
+            'category_id': row['id'],
+            'user_id': row['user_id'],
+            'name': row['name'],
+            'month': month,
+            'budget_limit': row['budget_limit'],
+            'spent': spent,
+            'essential': row['spending__essential_total'] or ZERO,
+            'count': row['spending__count'] or 0,
+            'remaining': row['budget_limit'] - spent,
+            'over_budget': spent > row['budget_limit'],
+        })
+    return status
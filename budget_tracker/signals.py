@@ -0,0 +1,54 @@
+import threading
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .models import Category, Expense
+from .rollups import collect_expense_deltas, apply_spending_deltas
+
+# (model, pk) of categories and users whose cascade delete is in progress
+_deleting = threading.local()
+
+def _parents_being_deleted():
+    if not hasattr(_deleting, 'keys'):
+        _deleting.keys = set()
+    return _deleting.keys
+
+@receiver(pre_save, sender=Expense)
+def remember_previous_expense(sender, instance, **kwargs):
+    """Keep the stored row so post_save can move it out of its old rollup"""
+    instance._rollup_previous = None
+    if instance.pk:
+        instance._rollup_previous = Expense.objects.filter(pk=instance.pk).values_list(
+            'user_id', 'category_id', 'date', 'amount', 'is_essential'
+        ).first()
+
+@receiver(post_save, sender=Expense)
+def update_rollup_on_save(sender, instance, **kwargs):
+    deltas = {}
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        collect_expense_deltas([previous], sign=-1, deltas=deltas)
+    collect_expense_deltas([
+        (instance.user_id, instance.category_id, instance.date, instance.amount, instance.is_essential)
+    ], deltas=deltas)
+    apply_spending_deltas(deltas)
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=User)
+def mark_parent_deleting(sender, instance, **kwargs):
+    """Rollups go with their category or user, so their expenses need no deltas"""
+    _parents_being_deleted().add((sender, instance.pk))
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=User)
+def unmark_parent_deleting(sender, instance, **kwargs):
+    _parents_being_deleted().discard((sender, instance.pk))
+
+@receiver(post_delete, sender=Expense)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    deleting = _parents_being_deleted()
+    if (Category, instance.category_id) in deleting or (User, instance.user_id) in deleting:
+        return
+    apply_spending_deltas(collect_expense_deltas([
+        (instance.user_id, instance.category_id, instance.date, instance.amount, instance.is_essential)
+    ], sign=-1))
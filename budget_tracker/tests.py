@@ -0,0 +1,87 @@
+from datetime import date
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from .models import Category, Expense, MonthlySpending
+from .rollups import budget_status, rebuild_monthly_spending
+
+def rollups(user):
+    return {
+        (row.category_id, row.month): (row.total, row.essential_total, row.count)
+        for row in MonthlySpending.objects.filter(user=user)
+    }
+
+class MonthlySpendingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('spender')
+        self.food = Category.objects.create(user=self.user, name='Food', budget_limit=Decimal('300'))
+        self.rent = Category.objects.create(user=self.user, name='Rent', budget_limit=Decimal('1000'))
+
+    def expense(self, amount, day=date(2024, 3, 5), category=None, is_essential=True):
+        return Expense.objects.create(
+            user=self.user, category=category or self.food, amount=Decimal(amount),
+            date=day, description='test', is_essential=is_essential
+        )
+
+    def assertMatchesRebuild(self):
+        maintained = {key: value for key, value in rollups(self.user).items() if value[2]}
+        rebuild_monthly_spending(self.user)
+        self.assertEqual(maintained, rollups(self.user))
+
+    def test_save_adds_to_the_month(self):
+        self.expense('10.00')
+        self.expense('5.50', is_essential=False)
+        self.assertEqual(
+            rollups(self.user)[(self.food.pk, date(2024, 3, 1))],
+            (Decimal('15.50'), Decimal('10.00'), 2)
+        )
+        self.assertMatchesRebuild()
+
+    def test_update_moves_between_months_and_categories(self):
+        expense = self.expense('40.00')
+        self.expense('2.00')
+        expense.date = date(2024, 4, 1)
+        expense.category = self.rent
+        expense.amount = Decimal('45.00')
+        expense.save()
+        self.assertEqual(rollups(self.user)[(self.food.pk, date(2024, 3, 1))][2], 1)
+        self.assertEqual(rollups(self.user)[(self.rent.pk, date(2024, 4, 1))][0], Decimal('45.00'))
+        self.assertMatchesRebuild()
+
+    def test_delete_subtracts(self):
+        first = self.expense('10.00')
+        self.expense('20.00')
+        first.delete()
+        self.assertEqual(rollups(self.user)[(self.food.pk, date(2024, 3, 1))], (Decimal('20.00'), Decimal('20.00'), 1))
+        self.assertMatchesRebuild()
+
+    def test_deleting_a_category_with_expenses_cascades(self):
+        self.expense('10.00')
+        self.expense('20.00', day=date(2024, 4, 2))
+        self.food.delete()
+        connection.check_constraints()
+        self.assertFalse(MonthlySpending.objects.filter(category_id=self.food.pk).exists())
+        self.assertFalse(Expense.objects.filter(category_id=self.food.pk).exists())
+
+    def test_deleting_a_user_with_expenses_cascades(self):
+        self.expense('10.00')
+        self.expense('20.00', category=self.rent)
+        self.user.delete()
+        connection.check_constraints()
+        self.assertFalse(MonthlySpending.objects.exists())
+
+    def test_expense_deletes_after_a_category_delete_still_apply(self):
+        self.expense('10.00', category=self.rent)
+        self.food.delete()
+        remaining = self.expense('7.00', category=self.rent)
+        remaining.delete()
+        self.assertEqual(rollups(self.user)[(self.rent.pk, date(2024, 3, 1))][0], Decimal('10.00'))
+
+    def test_budget_status_reports_every_category(self):
+        self.expense('350.00')
+        status = {row['name']: row for row in budget_status(date(2024, 3, 20), users=[self.user])}
+        self.assertTrue(status['Food']['over_budget'])
+        self.assertEqual(status['Food']['remaining'], Decimal('-50.00'))
+        self.assertEqual(status['Rent']['spent'], 0)
+        self.assertFalse(status['Rent']['over_budget'])
@@ -1,10 +1,14 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from ..services import DebtAdvisorService
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.views import APIView
+from ..services.advisor_service import DebtAdvisorService
 from ..models import Message, UserProgress
 from ..services.gamification_service import GamificationService
+from ..services.catalog import get_catalog
+from ..services.points_service import leaderboard
+from ..services.response_cache import response_cache_stats
 
 class ConversationViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
@@ -49,6 +53,12 @@ class ConversationViewSet(viewsets.ViewSet):
         progress = UserProgress.objects.get_or_create(user=user)[0]
         return progress.achievements 
 
+class ResponseCacheStatsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response(response_cache_stats())
+
 class GamificationViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     
@@ -63,12 +73,29 @@ class GamificationViewSet(viewsets.ViewSet):
                 'number': level.level_number,
                 'icon': level.icon,
                 'perks': level.perks
-            },
-            'points': service._calculate_total_points(),
+            } if level else None,
+            'points': service.get_total_points(),
+            'rank': service.get_rank(),
             'available_rewards': self._format_rewards(service.get_available_rewards()),
             'active_challenges': self._format_challenges(service.get_active_challenges())
         })
     
+    @action(detail=False, methods=['get'])
+    def leaderboard(self, request):
+        """Top users by points, plus the caller's own rank"""
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 100))
+        except ValueError:
+            return Response(
+                {'error': 'limit must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({
+            'leaders': leaderboard(limit),
+            'me': GamificationService(request.user).get_rank()
+        })
+    
     @action(detail=False, methods=['post'])
     def redeem_reward(self, request):
         """Redeem a reward"""
@@ -115,4 +142,31 @@ class GamificationViewSet(viewsets.ViewSet):
         service = GamificationService(request.user)
         service.update_challenge_progress(pk, progress_data)
         
-        return Response({'message': 'Progress updated successfully'})
\ No newline at end of file
+        return Response({'message': 'Progress updated successfully'})
+    
+    def _format_rewards(self, rewards):
+        return [
+            {
+                'id': reward.id,
+                'name': reward.name,
+                'description': reward.description,
+                'points_required': reward.points_required,
+                'type': reward.reward_type
+            }
+            for reward in rewards
+        ]
+    
+    def _format_challenges(self, challenges):
+        catalog = get_catalog()
+        return [
+            {
+                'id': user_challenge.id,
+                'title': catalog.challenges[user_challenge.challenge_id].title,
+                'type': catalog.challenges[user_challenge.challenge_id].challenge_type,
+                'points_reward': catalog.challenges[user_challenge.challenge_id].points_reward,
+                'end_date': user_challenge.end_date,
+                'progress': user_challenge.progress
+            }
+            for user_challenge in challenges
+            if user_challenge.challenge_id in catalog.challenges
+        ]
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+class DebtAdvisorConfig(AppConfig):
+    name = 'debt_advisor'
+
+    def ready(self):
+        from . import signals  # noqa: F401
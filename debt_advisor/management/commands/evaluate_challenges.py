@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from debt_advisor.services.challenge_service import ChallengeEvaluator
+
+class Command(BaseCommand):
+    help = 'Recompute progress of active challenges, completing or failing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Limit to these user ids')
+        parser.add_argument('--batch-size', type=int, default=500, help='Challenges evaluated together')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stats = ChallengeEvaluator().run(options['user'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats.get('COMPLETED', 0)} completed, {stats.get('FAILED', 0)} failed, "
+            f"{stats.get('ACTIVE', 0)} still active in {time.monotonic() - started:.1f}s"
+        ))
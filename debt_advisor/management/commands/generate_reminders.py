@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from debt_advisor.services.reminder_service import ReminderGenerator
+
+class Command(BaseCommand):
+    help = 'Create, update and retire generated payment and check-in reminders for all users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users per diff')
+
+    def handle(self, *args, **options):
+        totals = ReminderGenerator().generate_all(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Adopted {totals['adopted']} legacy, created {totals['created']}, updated {totals['updated']}, deactivated {totals['deactivated']} reminders"
+        ))
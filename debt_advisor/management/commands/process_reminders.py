@@ -1,14 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
-from debt_advisor.services.reminder_service import ReminderService
+from django.db import close_old_connections
+from debt_advisor.services.batch_service import plan_chunks, run_chunk, job_progress
+from debt_advisor.services.reminder_service import DueReminderScanner
+
+def _in_worker(function, *args):
+    try:
+        return function(*args)
+    finally:
+        close_old_connections()
 
 class Command(BaseCommand):
     help = 'Process and send due reminders'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.DAILY_CHECKS['workers'])
+        parser.add_argument('--batch-size', type=int, help='Reminders claimed per batch')
+        parser.add_argument('--daily-checks', action='store_true',
+                            help='Also run the chunked per-user daily checks (achievements)')
+        parser.add_argument('--chunk-size', type=int, help='Users per chunk (first run of the day only)')
+
     def handle(self, *args, **options):
-        users = User.objects.filter(is_active=True)
-        for user in users:
-            reminder_service = ReminderService(user)
-            reminder_service.send_due_reminders()
-        
-        self.stdout.write(self.style.SUCCESS('Successfully processed reminders')) 
\ No newline at end of file
+        workers = options['workers']
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Scanners skip each other's locked batches, so they share the backlog
+            scans = [
+                executor.submit(_in_worker, DueReminderScanner(options['batch_size']).run)
+                for _ in range(workers)
+            ]
+            stats = [future.result() for future in scans]
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {sum(s['sent'] for s in stats)} reminders in {sum(s['batches'] for s in stats)} batches, "
+            f"{sum(s['failed'] for s in stats)} failed"
+        ))
+
+        if options['daily_checks']:
+            self._run_daily_checks(workers, options['chunk_size'])
+
+    def _run_daily_checks(self, workers, chunk_size):
+        chunk_ids = plan_chunks('daily_checks', chunk_size=chunk_size)
+        self.stdout.write(f'{len(chunk_ids)} chunks to process')
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_in_worker, run_chunk, chunk_id) for chunk_id in chunk_ids]
+            for finished, future in enumerate(as_completed(futures), 1):
+                summary = future.result()
+                if summary is None:
+                    self.stdout.write(f'[{finished}/{len(futures)}] skipped, claimed by another worker')
+                    continue
+                self.stdout.write(
+                    f"[{finished}/{len(futures)}] users {summary['users'][0]}-{summary['users'][1]}: "
+                    f"{summary['status']}, {summary['processed']} users, "
+                    f"{summary['failures']} failures in {summary['elapsed']}s"
+                )
+
+        progress = job_progress('daily_checks')
+        style = self.style.SUCCESS if not progress['failed'] else self.style.WARNING
+        self.stdout.write(style(
+            f"{progress['done']}/{progress['chunks']} chunks done, {progress['processed']} users, "
+            f"{progress['user_failures']} user failures"
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from debt_advisor.services.points_service import rebuild_points
+
+class Command(BaseCommand):
+    help = 'Backfill the points ledger from earned achievements and completed challenges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Limit to these user ids')
+
+    def handle(self, *args, **options):
+        stats = rebuild_points(options['user'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {stats['events']} points events; {stats['balances']} balances recomputed"
+        ))
@@ -94,6 +94,32 @@ class Reminder(models.Model):
     ])
     is_active = models.BooleanField(default=True)
     last_sent = models.DateTimeField(null=True, blank=True)
+    # Generated reminders are keyed by (user, debt_account, kind)
+    kind = models.CharField(max_length=20, choices=[
+        ('PAYMENT', 'Payment Due'),
+        ('CHECK_IN', 'Check-in'),
+        ('CUSTOM', 'Custom'),
+    ], default='CUSTOM')
+    debt_account = models.ForeignKey(DebtAccount, on_delete=models.CASCADE, null=True, blank=True)
+    source_date = models.DateField(null=True, blank=True)  # Due date the schedule was derived from
+    
+    class Meta:
+        indexes = [
+            # DueReminderScanner walks active reminders in scheduled_time order
+            models.Index(fields=['is_active', 'scheduled_time']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'debt_account', 'kind'],
+                condition=models.Q(kind='PAYMENT'),
+                name='unique_payment_reminder'
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'kind'],
+                condition=models.Q(kind='CHECK_IN'),
+                name='unique_check_in_reminder'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} for {self.user.username}" 
@@ -166,4 +192,81 @@ class UserChallenge(models.Model):
     ])
     
     def __str__(self):
-        return f"{self.user.username}'s {self.challenge.title}"
\ No newline at end of file
+        return f"{self.user.username}'s {self.challenge.title}"
+
+class UserBatchChunk(models.Model):
+    """One user-id range of a daily batch job; the cursor makes it resumable"""
+    job = models.CharField(max_length=50)
+    day = models.DateField()
+    first_user_id = models.IntegerField()
+    last_user_id = models.IntegerField()
+    cursor = models.IntegerField(default=0)  # Last user id finished
+    status = models.CharField(max_length=20, choices=[
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ], default='PENDING')
+    processed = models.IntegerField(default=0)
+    failures = models.JSONField(default=list)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    elapsed = models.FloatField(default=0)
+    claim_token = models.UUIDField(null=True, blank=True)  # Set per claim; writes check it
+    
+    class Meta:
+        unique_together = ['job', 'day', 'first_user_id']
+    
+    def __str__(self):
+        return f"{self.job} {self.day} users {self.first_user_id}-{self.last_user_id}: {self.status}"
+
+class AchievementFacts(models.Model):
+    """Last fact snapshot the achievement rules saw for a user"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='achievement_facts')
+    facts = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Achievement facts for {self.user.username}"
+
+class PointsEvent(models.Model):
+    """Append-only record of points earned; balances are derived from it"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='points_events')
+    points = models.IntegerField()
+    source = models.CharField(max_length=20, choices=[
+        ('ACHIEVEMENT', 'Achievement'),
+        ('CHALLENGE', 'Challenge'),
+        ('ADJUSTMENT', 'Adjustment'),
+    ])
+    source_id = models.IntegerField()  # Achievement or UserChallenge id
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        # The same achievement or challenge never pays twice
+        unique_together = ['user', 'source', 'source_id']
+    
+    def __str__(self):
+        return f"{self.points} points to {self.user.username} for {self.source} {self.source_id}"
+
+class PointsBalance(models.Model):
+    """Running total of a user's PointsEvents"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='points_balance')
+    total = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            # Leaderboards read the top of this index
+            models.Index(fields=['-total', 'user'], name='debt_advisor_points_rank'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.total} points"
+
+class PointsRank(models.Model):
+    """How many users hold each positive points total; ranks are sums over it"""
+    points = models.IntegerField(unique=True)
+    users = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.users} users at {self.points} points"
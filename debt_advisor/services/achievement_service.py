@@ -1,90 +1,194 @@
-from datetime import datetime, timedelta
-from decimal import Decimal
-from django.db.models import Sum, F
-from ..models import Achievement, UserAchievement, UserProgress
-from debt_manager.models import DebtAccount, DebtPaymentPlan
-from budget_tracker.models import Expense, Category
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from ..models import AchievementFacts, Message, PointsEvent, UserAchievement
+from debt_manager.models import DebtAccount
+from budget_tracker.rollups import budget_status
+from goals.models import FinancialGoal
+from .catalog import get_catalog
+from .points_service import record_points
+
+SAVINGS_GOAL_CATEGORIES = ('EMERGENCY_FUND', 'SAVINGS')
+ENGAGEMENT_DAYS = 30
+
+def _money(value):
+    return round(float(value or 0), 2)
+
+class Rule:
+    """An achievement earned once `test(facts)` holds; `inputs` are the facts it reads"""
+
+    def __init__(self, code, inputs, test):
+        self.code = code
+        self.inputs = tuple(inputs)
+        self.test = test
+
+    def applies(self, facts):
+        return all(name in facts for name in self.inputs) and self.test(facts)
+
+RULES = [
+    Rule('FIRST_PAYMENT', ['debt_reduced'], lambda f: f['debt_reduced'] > 0),
+    Rule('REDUCE_1000', ['debt_reduced'], lambda f: f['debt_reduced'] >= 1000),
+    Rule('REDUCE_5000', ['debt_reduced'], lambda f: f['debt_reduced'] >= 5000),
+    Rule('DEBT_FREE', ['total_debt', 'peak_debt'], lambda f: f['total_debt'] == 0 and f['peak_debt'] > 0),
+    Rule('EMERGENCY_FUND_1000', ['savings'], lambda f: f['savings'] >= 1000),
+    Rule('EMERGENCY_FUND_5000', ['savings'], lambda f: f['savings'] >= 5000),
+    Rule('FIRST_BUDGET', ['budget_categories'], lambda f: f['budget_categories'] > 0),
+    Rule('UNDER_BUDGET_MONTH', ['under_budget_last_month'], lambda f: f['under_budget_last_month']),
+    Rule('FIRST_CHECK_IN', ['messages'], lambda f: f['messages'] > 0),
+    Rule('ENGAGED_MONTH', ['active_days'], lambda f: f['active_days'] >= 10),
+]
+
+def load_debt_facts(user_ids, previous, now):
+    """Debt reduced is measured from the highest total seen, since balances are overwritten in place.
+
+    The peak starts from the balances the debts were added with, so
+    paydown made before the first evaluation is credited too.
+    """
+    totals = {
+        user_id: (total, opening)
+        for user_id, total, opening in DebtAccount.objects.filter(user_id__in=user_ids).values('user_id').annotate(
+            total=Sum('balance'),
+            opening=Sum(Coalesce('original_balance', 'balance'))
+        ).values_list('user_id', 'total', 'opening')
+    }
+    facts = {}
+    for user_id in user_ids:
+        total, opening = (_money(value) for value in totals.get(user_id, (0, 0)))
+        peak = max(previous.get(user_id, {}).get('peak_debt', 0), opening, total)
+        facts[user_id] = {'total_debt': total, 'peak_debt': peak, 'debt_reduced': round(peak - total, 2)}
+    return facts
+
+def load_savings_facts(user_ids, previous, now):
+    totals = dict(FinancialGoal.objects.filter(
+        user_id__in=user_ids, category__in=SAVINGS_GOAL_CATEGORIES
+    ).values('user_id').annotate(total=Sum('current_amount')).values_list('user_id', 'total'))
+    return {user_id: {'savings': _money(totals.get(user_id))} for user_id in user_ids}
+
+def load_budget_facts(user_ids, previous, now):
+    """Category count and last month's adherence from one budget_status read"""
+    last_month = now.date().replace(day=1) - timedelta(days=1)
+    categories, over = {}, {}
+    for row in budget_status(last_month, users=user_ids):
+        categories[row['user_id']] = categories.get(row['user_id'], 0) + 1
+        over[row['user_id']] = over.get(row['user_id'], False) or row['over_budget']
+    return {
+        user_id: {
+            'budget_categories': categories.get(user_id, 0),
+            'under_budget_last_month': user_id in over and not over[user_id],
+        }
+        for user_id in user_ids
+    }
+
+def load_engagement_facts(user_ids, previous, now):
+    since = now - timedelta(days=ENGAGEMENT_DAYS)
+    rows = {
+        row['session__user_id']: row
+        for row in Message.objects.filter(session__user_id__in=user_ids, is_user=True).values(
+            'session__user_id'
+        ).annotate(
+            messages=Count('id'),
+            active_days=Count(TruncDate('timestamp'), filter=Q(timestamp__gte=since), distinct=True)
+        )
+    }
+    return {
+        user_id: {
+            'messages': rows[user_id]['messages'] if user_id in rows else 0,
+            'active_days': rows[user_id]['active_days'] if user_id in rows else 0,
+        }
+        for user_id in user_ids
+    }
+
+# Each loader runs one grouped query for a whole batch of users
+FACT_LOADERS = {
+    'debt': load_debt_facts,
+    'savings': load_savings_facts,
+    'budget': load_budget_facts,
+    'engagement': load_engagement_facts,
+}
+
+class AchievementEngine:
+    """Evaluate RULES for many users against one fact snapshot per user.
+
+    A batch costs one query per fact loader, one for earned achievements
+    and one bulk_create for the new awards, whose points go to the ledger.
+    Snapshots are stored, so an event can reload only the facts it touches
+    and re-check only the rules reading a fact that changed.
+    """
+
+    def __init__(self, rules=None, now=None):
+        self.rules = rules or RULES
+        self.now = now or timezone.now()
+
+    def evaluate(self, user_ids, groups=None):
+        """Award newly earned achievements; returns {user_id: [Achievement]}.
+
+        groups limits the run to those FACT_LOADERS and the rules whose
+        inputs changed; without it every rule is checked.
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        snapshots = {snapshot.user_id: snapshot for snapshot in AchievementFacts.objects.filter(user_id__in=user_ids)}
+        previous = {user_id: snapshot.facts for user_id, snapshot in snapshots.items()}
+        fresh = {user_id: {} for user_id in user_ids}
+        for group in groups or FACT_LOADERS:
+            for user_id, facts in FACT_LOADERS[group](user_ids, previous, self.now).items():
+                fresh[user_id].update(facts)
+
+        catalog = get_catalog().achievements
+        earned = set(UserAchievement.objects.filter(user_id__in=user_ids).values_list('user_id', 'achievement_id'))
+
+        awards, merged = {}, {}
+        for user_id in user_ids:
+            old = previous.get(user_id, {})
+            facts = merged[user_id] = {**old, **fresh[user_id]}
+            changed = {name for name, value in fresh[user_id].items() if old.get(name) != value}
+            for rule in self.rules:
+                achievement = catalog.get(rule.code)
+                if achievement is None or (user_id, achievement.pk) in earned:
+                    continue
+                if groups is not None and changed.isdisjoint(rule.inputs):
+                    continue
+                if rule.applies(facts):
+                    awards.setdefault(user_id, []).append(achievement)
+
+        with transaction.atomic():
+            self._save_snapshots(snapshots, merged)
+            UserAchievement.objects.bulk_create([
+                UserAchievement(user_id=user_id, achievement=achievement)
+                for user_id, achievements in awards.items()
+                for achievement in achievements
+            ], ignore_conflicts=True)
+            record_points([
+                PointsEvent(user_id=user_id, points=achievement.points, source='ACHIEVEMENT', source_id=achievement.pk)
+                for user_id, achievements in awards.items()
+                for achievement in achievements
+            ])
+        return awards
+
+    def _save_snapshots(self, snapshots, merged):
+        changed, new = [], []
+        for user_id, facts in merged.items():
+            snapshot = snapshots.get(user_id)
+            if snapshot is None:
+                new.append(AchievementFacts(user_id=user_id, facts=facts))
+            elif snapshot.facts != facts:
+                snapshot.facts = facts
+                snapshot.updated_at = self.now
+                changed.append(snapshot)
+        AchievementFacts.objects.bulk_create(new, ignore_conflicts=True)
+        AchievementFacts.objects.bulk_update(changed, ['facts', 'updated_at'])
 
 class AchievementService:
     def __init__(self, user):
         self.user = user
-        self.progress = UserProgress.objects.get_or_create(user=user)[0]
 
     def check_achievements(self):
-        """Check all possible achievements"""
-        achievements = []
-        
-        # Debt Reduction Achievements
-        achievements.extend(self._check_debt_reduction())
-        
-        # Saving Achievements
-        achievements.extend(self._check_savings())
-        
-        # Budgeting Achievements
-        achievements.extend(self._check_budgeting())
-        
-        # Engagement Achievements
-        achievements.extend(self._check_engagement())
-        
-        return achievements
-
-    def _check_debt_reduction(self):
-        """Check debt-related achievements"""
-        achievements = []
-        total_debt = DebtAccount.objects.filter(user=self.user).aggregate(
-            total=Sum('balance'))['total'] or Decimal('0')
-        
-        # First Debt Payment
-        if self._has_made_payment():
-            achievements.append(self._award_achievement('FIRST_PAYMENT'))
-        
-        # Debt Reduction Milestones
-        debt_reduction = self._calculate_debt_reduction()
-        if debt_reduction >= 1000:
-            achievements.append(self._award_achievement('REDUCE_1000'))
-        if debt_reduction >= 5000:
-            achievements.append(self._award_achievement('REDUCE_5000'))
-        
-        # Debt-Free Achievement
-        if total_debt == 0 and self._had_previous_debt():
-            achievements.append(self._award_achievement('DEBT_FREE'))
-        
-        return [a for a in achievements if a]
-
-    def _check_savings(self):
-        """Check savings-related achievements"""
-        achievements = []
-        savings = self._calculate_savings()
-        
-        # Emergency Fund Achievements
-        if savings >= 1000:
-            achievements.append(self._award_achievement('EMERGENCY_FUND_1000'))
-        if savings >= 5000:
-            achievements.append(self._award_achievement('EMERGENCY_FUND_5000'))
-        
-        return [a for a in achievements if a]
-
-    def _check_budgeting(self):
-        """Check budgeting-related achievements"""
-        achievements = []
-        
-        # Budget Creation
-        if Category.objects.filter(user=self.user).exists():
-            achievements.append(self._award_achievement('FIRST_BUDGET'))
-        
-        # Under Budget Achievement
-        if self._stayed_under_budget():
-            achievements.append(self._award_achievement('UNDER_BUDGET_MONTH'))
-        
-        return [a for a in achievements if a]
-
-    def _award_achievement(self, achievement_code):
-        """Award an achievement if not already earned"""
-        achievement = Achievement.objects.get(name=achievement_code)
-        user_achievement, created = UserAchievement.objects.get_or_create(
-            user=self.user,
-            achievement=achievement
-        )
-        if created:
-            return achievement
-        return None 
\ No newline at end of file
+        """Achievements the user has newly earned"""
+        return AchievementEngine().evaluate([self.user.pk]).get(self.user.pk, [])
+
+    def on_event(self, *groups):
+        """Re-check only rules reading the given fact groups, e.g. on_event('debt')"""
+        return AchievementEngine().evaluate([self.user.pk], groups=groups).get(self.user.pk, [])
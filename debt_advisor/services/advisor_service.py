@@ -1,17 +1,18 @@
-import openai
-from django.conf import settings
 from datetime import datetime, timedelta
-from .models import ConversationSession, Message, FinancialAdvice, UserProgress
+from decimal import Decimal
+from django.db.models import Sum, Count
+from ..models import ConversationSession, Message, FinancialAdvice, UserProgress
 from debt_manager.models import DebtAccount, DebtPaymentPlan
 from budget_tracker.models import Expense
-from debt_advisor.services.achievement_service import AchievementService
-from debt_advisor.services.reminder_service import ReminderService
+from .achievement_service import AchievementService
+from .reminder_service import ReminderService
+from .response_cache import context_profile, get_provider, get_response_cache
 
 class DebtAdvisorService:
-    def __init__(self, user):
+    def __init__(self, user, provider=None):
         self.user = user
         self.session = self._get_or_create_session()
-        openai.api_key = settings.OPENAI_API_KEY
+        self.provider = provider or get_provider()
 
     def _get_or_create_session(self):
         active_session = ConversationSession.objects.filter(
@@ -29,41 +30,47 @@ class DebtAdvisorService:
 
     def _get_initial_context(self):
         """Gather user's financial context"""
-        debts = DebtAccount.objects.filter(user=self.user)
-        total_debt = sum(debt.balance for debt in debts)
-        recent_expenses = Expense.objects.filter(
-            user=self.user,
-            date__gte=datetime.now() - timedelta(days=30)
+        debts = DebtAccount.objects.filter(user=self.user).aggregate(
+            total=Sum('balance'), count=Count('id')
         )
+        recent_spending = Expense.objects.filter(
+            user=self.user,
+            date__gte=datetime.now().date() - timedelta(days=30)
+        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
         
+        # Session context is a JSONField, so amounts go in as floats
         return {
-            'total_debt': float(total_debt),
-            'num_debts': debts.count(),
-            'recent_spending': sum(exp.amount for exp in recent_expenses),
+            'total_debt': float(debts['total'] or 0),
+            'num_debts': debts['count'],
+            'recent_spending': float(recent_spending),
             'last_interaction': datetime.now().isoformat(),
         }
 
     def get_response(self, user_message):
-        """Generate response using OpenAI API"""
+        """Generate response, reusing a cached reply to the same question from a similar profile"""
         messages = [
             {"role": "system", "content": self._get_system_prompt()},
             {"role": "user", "content": user_message}
         ]
         
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=150
+        response_text, _ = get_response_cache().get_or_generate(
+            user_message,
+            self.session.context,
+            self.provider.model,
+            lambda: self.provider.complete(messages)
         )
         
-        return self._process_response(response.choices[0].message['content'])
+        return self._process_response(response_text)
 
     def _get_system_prompt(self):
-        """Create system prompt based on user's financial situation"""
-        context = self.session.context
+        """Create system prompt based on user's financial situation.
+
+        Only the banded profile goes in, so a cached reply never quotes
+        another user's exact figures.
+        """
+        profile = context_profile(self.session.context)
         return f"""You are a supportive and knowledgeable financial advisor. 
-        The user has {context['num_debts']} debts totaling ${context['total_debt']}.
+        The user has {profile['num_debts']} debts totaling ${profile['total_debt']}.
         Be encouraging but realistic. Focus on practical advice and emotional support.
         Avoid technical jargon unless specifically asked."""
 
@@ -0,0 +1,151 @@
+import logging
+import time
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from ..models import UserBatchChunk
+from .achievement_service import AchievementEngine
+from .challenge_service import ChallengeEvaluator
+
+logger = logging.getLogger(__name__)
+
+def check_achievements(user_ids):
+    AchievementEngine().evaluate(user_ids)
+
+def evaluate_challenges(user_ids):
+    ChallengeEvaluator().run(user_ids)
+
+# Steps of each daily job, each called with a batch of user ids; due
+# reminders are sent by DueReminderScanner
+JOBS = {
+    'daily_checks': [check_achievements, evaluate_challenges],
+}
+
+def plan_chunks(job, day=None, chunk_size=None):
+    """Split active user ids into ranges for the day, once.
+
+    Later calls the same day reuse the stored ranges even if chunk_size
+    changed, so a rerun never processes a user twice. Returns the ids of
+    chunks that still have work.
+    """
+    day = day or timezone.now().date()
+    chunk_size = chunk_size or settings.DAILY_CHECKS['chunk_size']
+    if not UserBatchChunk.objects.filter(job=job, day=day).exists():
+        ids = list(User.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+        UserBatchChunk.objects.bulk_create([
+            UserBatchChunk(
+                job=job,
+                day=day,
+                first_user_id=ids[offset],
+                last_user_id=ids[min(offset + chunk_size, len(ids)) - 1]
+            )
+            for offset in range(0, len(ids), chunk_size)
+        ], ignore_conflicts=True)
+    return list(UserBatchChunk.objects.filter(job=job, day=day).exclude(status='DONE').order_by(
+        'first_user_id'
+    ).values_list('id', flat=True))
+
+def run_chunk(chunk_id):
+    """Process one chunk from its cursor; returns its summary or None if another worker owns it.
+
+    Each claim stores a new token and every later write is conditional on
+    it, so a worker whose stale claim was taken over stops at its next
+    checkpoint. Batches that raise stay in failures, are retried first on
+    the next claim and leave the chunk FAILED until they pass.
+    """
+    now = timezone.now()
+    stale = now - timedelta(minutes=settings.DAILY_CHECKS['stale_after_minutes'])
+    token = uuid.uuid4()
+    claimed = UserBatchChunk.objects.filter(pk=chunk_id).filter(
+        Q(status__in=['PENDING', 'FAILED']) | Q(status='RUNNING', started_at__lt=stale)
+    ).update(status='RUNNING', started_at=now, claim_token=token)
+    if not claimed:
+        return None
+
+    chunk = UserBatchChunk.objects.get(pk=chunk_id)
+    owned = UserBatchChunk.objects.filter(pk=chunk_id, claim_token=token)
+    steps = JOBS[chunk.job]
+    started = time.monotonic()
+    users = User.objects.filter(is_active=True).order_by('id').values_list('id', flat=True)
+    failures = {tuple(failure['user_ids']): failure for failure in chunk.failures}
+    batches = [
+        (key, list(users.filter(id__gte=key[0], id__lte=key[1])), True)
+        for key in failures
+    ]
+    user_ids = list(users.filter(id__gt=max(chunk.cursor, chunk.first_user_id - 1), id__lte=chunk.last_user_id))
+    batch_size = settings.DAILY_CHECKS['batch_size']
+    for offset in range(0, len(user_ids), batch_size):
+        batch = user_ids[offset:offset + batch_size]
+        batches.append(((batch[0], batch[-1]), batch, False))
+
+    try:
+        for key, batch, retry in batches:
+            previous = failures.pop(key, {}) if retry else {}
+            if batch:
+                try:
+                    for step in steps:
+                        step(batch)
+                except Exception as e:
+                    logger.exception('%s failed for users %s-%s', chunk.job, batch[0], batch[-1])
+                    failures[(batch[0], batch[-1])] = {
+                        'user_ids': [batch[0], batch[-1]],
+                        'users': len(batch),
+                        'error': str(e)[:200],
+                        'attempts': previous.get('attempts', 1) + 1 if retry else 1,
+                    }
+            if not retry:
+                chunk.cursor = batch[-1]
+                chunk.processed += len(batch)
+            chunk.failures = list(failures.values())
+            # Checkpoint so a crash resumes after the last finished batch
+            if not owned.update(cursor=chunk.cursor, processed=chunk.processed, failures=chunk.failures):
+                logger.warning('Chunk %s of %s was reclaimed by another worker', chunk.pk, chunk.job)
+                return None
+        chunk.status = 'FAILED' if failures else 'DONE'
+    except Exception:
+        logger.exception('Chunk %s of %s stopped at user %s', chunk.pk, chunk.job, chunk.cursor)
+        chunk.status = 'FAILED'
+    chunk.elapsed += time.monotonic() - started
+    chunk.finished_at = timezone.now()
+    if not owned.update(status=chunk.status, elapsed=chunk.elapsed, finished_at=chunk.finished_at):
+        logger.warning('Chunk %s of %s was reclaimed by another worker', chunk.pk, chunk.job)
+        return None
+    return chunk_summary(chunk)
+
+def chunk_summary(chunk):
+    return {
+        'chunk': chunk.pk,
+        'users': [chunk.first_user_id, chunk.last_user_id],
+        'status': chunk.status,
+        'processed': chunk.processed,
+        'failures': len(chunk.failures),
+        'elapsed': round(chunk.elapsed, 3),
+    }
+
+def job_progress(job, day=None):
+    """Totals across a day's chunks for progress reporting"""
+    day = day or timezone.now().date()
+    chunks = UserBatchChunk.objects.filter(job=job, day=day)
+    totals = chunks.aggregate(
+        chunks=Count('id'),
+        done=Count('id', filter=Q(status='DONE')),
+        failed=Count('id', filter=Q(status='FAILED')),
+        processed=Sum('processed'),
+    )
+    failures = [failure for failures in chunks.values_list('failures', flat=True) for failure in failures]
+    user_failures = sum(failure.get('users', 1) for failure in failures)
+    slowest = chunks.filter(status='DONE').order_by('-elapsed').first()
+    return {
+        'job': job,
+        'day': day.isoformat(),
+        'chunks': totals['chunks'],
+        'done': totals['done'],
+        'failed': totals['failed'],
+        'processed': totals['processed'] or 0,
+        'user_failures': user_failures,
+        'failures': failures[:20],
+        'slowest_chunk': chunk_summary(slowest) if slowest else None,
+    }
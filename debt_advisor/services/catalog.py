@@ -0,0 +1,90 @@
+import time
+from bisect import bisect_right
+from django.conf import settings
+from django.core.cache import cache
+from ..models import Achievement, Challenge, Level, Reward
+
+CATALOG_VERSION_KEY = 'debt_advisor:catalog-version'
+
+_catalog = None
+_checked_at = 0.0
+
+def catalog_version():
+    """Shared catalog version, seeding the counter if it is missing"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a counter lost to eviction never repeats an old version
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+def bump_catalog_version():
+    """Make every process reload the catalog on its next check"""
+    global _catalog
+    _catalog = None
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(CATALOG_VERSION_KEY, version, None)
+        return version
+
+def _key(pk):
+    try:
+        return int(pk)
+    except (TypeError, ValueError):
+        return None
+
+class Catalog:
+    """Read-only snapshot of levels, rewards, achievements and challenges"""
+
+    def __init__(self, version, levels, rewards, achievements, challenges):
+        self.version = version
+        self.levels = sorted(levels, key=lambda level: (level.points_required, level.level_number))
+        self._level_points = [level.points_required for level in self.levels]
+        self.rewards = {reward.pk: reward for reward in rewards}
+        self._active_rewards = sorted(
+            (reward for reward in rewards if reward.is_active),
+            key=lambda reward: (reward.points_required, reward.pk)
+        )
+        self._reward_points = [reward.points_required for reward in self._active_rewards]
+        self.achievements = {achievement.name: achievement for achievement in achievements}
+        self.challenges = {challenge.pk: challenge for challenge in challenges}
+
+    @classmethod
+    def load(cls, version):
+        return cls(
+            version,
+            list(Level.objects.all()),
+            list(Reward.objects.all()),
+            list(Achievement.objects.all()),
+            list(Challenge.objects.all()),
+        )
+
+    def level_for(self, points):
+        """Highest level whose points_required is within points"""
+        position = bisect_right(self._level_points, points)
+        return self.levels[position - 1] if position else None
+
+    def rewards_within(self, points):
+        """Active rewards affordable with points, cheapest first"""
+        return self._active_rewards[:bisect_right(self._reward_points, points)]
+
+    def reward(self, pk):
+        return self.rewards.get(_key(pk))
+
+    def challenge(self, pk):
+        return self.challenges.get(_key(pk))
+
+def get_catalog():
+    """Process-wide catalog; the shared version is checked at most every few seconds"""
+    global _catalog, _checked_at
+    now = time.monotonic()
+    catalog = _catalog
+    if catalog is not None and now - _checked_at < settings.GAMIFICATION_CATALOG_CHECK_SECONDS:
+        return catalog
+    version = catalog_version()
+    if catalog is None or catalog.version != version:
+        catalog = _catalog = Catalog.load(version)
+    _checked_at = now
+    return catalog
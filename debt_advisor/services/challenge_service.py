@@ -0,0 +1,206 @@
+import calendar
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from ..models import Message, PointsEvent, UserChallenge
+from budget_tracker.models import Category, Expense
+from debt_manager.models import DebtAccount
+from goals.models import FinancialGoal
+from .achievement_service import SAVINGS_GOAL_CATEGORIES
+from .catalog import get_catalog
+from .points_service import record_points
+
+# (progress key, requirement key) a challenge completes on
+COMPLETION = {
+    'SAVINGS': ('saved_amount', 'target_amount'),
+    'DEBT_PAYMENT': ('extra_payment', 'target_amount'),
+    'STREAK': ('streak', 'days'),
+    'EDUCATION': ('completed_lessons', 'lessons'),
+}
+
+# Progress fields the evaluator owns; clients can't overwrite them
+DERIVED_PROGRESS = {
+    'baseline_savings', 'saved_amount', 'baseline_debt', 'baseline_debts', 'minimums_due', 'extra_payment',
+    'spent', 'limit', 'streak',
+}
+
+def _money(value):
+    return round(float(value or 0), 2)
+
+def _totals(queryset, field):
+    return dict(queryset.values('user_id').annotate(total=Sum(field)).values_list('user_id', 'total'))
+
+def _longest_run(days, start, end):
+    """Longest run of consecutive days from `days` within [start, end]"""
+    best = run = 0
+    previous = None
+    for day in sorted(d for d in days if start <= d <= end):
+        run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        best = max(best, run)
+        previous = day
+    return best
+
+def _due_dates_between(due_day, start, end):
+    """How many monthly due dates on day `due_day` fall in (start, end]"""
+    count = 0
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        day = date(year, month, min(due_day, calendar.monthrange(year, month)[1]))
+        count += start < day <= end
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return count
+
+class ChallengeEvaluator:
+    """Derive progress for ACTIVE UserChallenges from the user's own data and settle them.
+
+    Each challenge type costs one or two grouped queries for the whole
+    batch. SAVINGS and DEBT_PAYMENT measure the change from a baseline
+    taken at the first evaluation (on join); BUDGET compares spending in
+    the challenge window with a limit, if one can be derived; STREAK is
+    the longest run of days with a user message. EDUCATION has no data source, so its progress
+    stays client-reported.
+    """
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+        self.today = timezone.localdate(self.now)
+
+    def run(self, user_ids=None, batch_size=500):
+        """Evaluate every active challenge in pk order; returns counts by outcome"""
+        challenges = UserChallenge.objects.filter(status='ACTIVE')
+        if user_ids is not None:
+            challenges = challenges.filter(user_id__in=user_ids)
+        stats = Counter()
+        last = 0
+        while True:
+            batch = list(challenges.filter(pk__gt=last).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            stats.update(self.evaluate(batch))
+            last = batch[-1].pk
+        return dict(stats)
+
+    def evaluate(self, user_challenges):
+        """Refresh progress, complete or fail in bulk and pay out completions"""
+        catalog = get_catalog()
+        by_type = defaultdict(list)
+        for user_challenge in user_challenges:
+            challenge = catalog.challenge(user_challenge.challenge_id) or user_challenge.challenge
+            by_type[challenge.challenge_type].append((user_challenge, challenge))
+
+        stats = Counter()
+        evaluated, events = [], []
+        for challenge_type, items in by_type.items():
+            loader = getattr(self, f'_progress_{challenge_type.lower()}', None)
+            if loader:
+                loader(items)
+            for user_challenge, challenge in items:
+                user_challenge.status = self._status(user_challenge, challenge)
+                stats[user_challenge.status] += 1
+                evaluated.append(user_challenge)
+                if user_challenge.status == 'COMPLETED':
+                    events.append(PointsEvent(
+                        user_id=user_challenge.user_id,
+                        points=challenge.points_reward,
+                        source='CHALLENGE',
+                        source_id=user_challenge.pk
+                    ))
+
+        UserChallenge.objects.bulk_update(evaluated, ['progress', 'status'])
+        record_points(events)
+        return stats
+
+    def _status(self, user_challenge, challenge):
+        progress = user_challenge.progress
+        ended = self.now >= user_challenge.end_date
+        if challenge.challenge_type == 'BUDGET':
+            if progress['limit'] is None:
+                # No max_spending and no category limits to prorate: never completable
+                return 'FAILED' if ended else 'ACTIVE'
+            if progress['spent'] > progress['limit']:
+                return 'FAILED'
+            return 'COMPLETED' if ended else 'ACTIVE'
+        progress_key, requirement_key = COMPLETION[challenge.challenge_type]
+        default = 1 if challenge.challenge_type in ('STREAK', 'EDUCATION') else 0
+        if progress.get(progress_key, 0) >= challenge.requirements.get(requirement_key, default):
+            return 'COMPLETED'
+        return 'FAILED' if ended else 'ACTIVE'
+
+    def _progress_savings(self, items):
+        totals = _totals(FinancialGoal.objects.filter(
+            user_id__in={uc.user_id for uc, _ in items}, category__in=SAVINGS_GOAL_CATEGORIES
+        ), 'current_amount')
+        for user_challenge, _ in items:
+            current = _money(totals.get(user_challenge.user_id))
+            baseline = user_challenge.progress.setdefault('baseline_savings', current)
+            user_challenge.progress['saved_amount'] = round(current - baseline, 2)
+
+    def _progress_debt_payment(self, items):
+        """Paydown beyond the scheduled minimums on the debts held when the challenge started.
+
+        Each debt's reduction from its baseline balance is summed and the
+        minimum payments that fell due in the window are subtracted, so
+        only extra payments count. Debts added later are ignored.
+        """
+        debts = defaultdict(dict)
+        for pk, user_id, balance, minimum, due_date in DebtAccount.objects.filter(
+            user_id__in={uc.user_id for uc, _ in items}
+        ).values_list('id', 'user_id', 'balance', 'minimum_payment', 'due_date'):
+            debts[user_id][str(pk)] = (_money(balance), _money(minimum), due_date.day)
+
+        for user_challenge, _ in items:
+            progress = user_challenge.progress
+            current = debts[user_challenge.user_id]
+            progress.pop('baseline_debt', None)  # Pre per-debt total
+            baseline = progress.setdefault('baseline_debts', {pk: debt[0] for pk, debt in current.items()})
+            start = timezone.localdate(user_challenge.start_date)
+            end = min(timezone.localdate(user_challenge.end_date), self.today)
+            reduced = minimums = 0
+            for pk, balance in baseline.items():
+                if pk not in current:
+                    continue
+                now_balance, minimum, due_day = current[pk]
+                reduced += max(balance - now_balance, 0)
+                minimums += min(minimum * _due_dates_between(due_day, start, end), balance)
+            progress['minimums_due'] = round(minimums, 2)
+            progress['extra_payment'] = round(max(reduced - minimums, 0), 2)
+
+    def _progress_budget(self, items):
+        """Spending over the challenge window against requirements['max_spending'].
+
+        Without an explicit limit, the user's monthly category limits are
+        prorated over the challenge duration; with neither, limit is None.
+        """
+        user_ids = {uc.user_id for uc, _ in items}
+        since = min(timezone.localdate(uc.start_date) for uc, _ in items)
+        daily = defaultdict(dict)
+        for user_id, day, total in Expense.objects.filter(
+            user_id__in=user_ids, date__gte=since, date__lte=self.today
+        ).values('user_id', 'date').annotate(total=Sum('amount')).values_list('user_id', 'date', 'total'):
+            daily[user_id][day] = total
+        monthly_limits = _totals(Category.objects.filter(user_id__in=user_ids), 'budget_limit')
+
+        for user_challenge, challenge in items:
+            start = timezone.localdate(user_challenge.start_date)
+            end = min(timezone.localdate(user_challenge.end_date), self.today)
+            spent = sum(total for day, total in daily[user_challenge.user_id].items() if start <= day <= end)
+            limit = challenge.requirements.get('max_spending')
+            if limit is None and monthly_limits.get(user_challenge.user_id):
+                limit = _money(monthly_limits[user_challenge.user_id]) * challenge.duration_days / 30
+            user_challenge.progress['spent'] = _money(spent)
+            user_challenge.progress['limit'] = _money(limit) if limit is not None else None
+
+    def _progress_streak(self, items):
+        since = min(uc.start_date for uc, _ in items)
+        active_days = defaultdict(set)
+        for user_id, day in Message.objects.filter(
+            session__user_id__in={uc.user_id for uc, _ in items}, is_user=True, timestamp__gte=since
+        ).annotate(day=TruncDate('timestamp')).values_list('session__user_id', 'day').distinct():
+            active_days[user_id].add(day)
+
+        for user_challenge, _ in items:
+            start = timezone.localdate(user_challenge.start_date)
+            end = min(timezone.localdate(user_challenge.end_date), self.today)
+            user_challenge.progress['streak'] = _longest_run(active_days[user_challenge.user_id], start, end)
@@ -1,38 +1,50 @@
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.db.models import Sum
 from ..models import (
-    UserProgress, Level, Challenge, UserChallenge,
-    Reward, UserReward, Achievement, UserAchievement
+    Challenge, UserChallenge,
+    Reward, UserReward
 )
+from .catalog import get_catalog
+from .challenge_service import DERIVED_PROGRESS, ChallengeEvaluator
+from .points_service import total_points, user_rank
 
 class GamificationService:
     def __init__(self, user):
         self.user = user
-        self.progress = UserProgress.objects.get_or_create(user=user)[0]
+        self._points = None
+        self.catalog = get_catalog()
+
+    def get_total_points(self):
+        """User's points balance, read once per service instance"""
+        if self._points is None:
+            self._points = total_points(self.user)
+        return self._points
+
+    def get_rank(self):
+        """User's rank and percentile across all users"""
+        return user_rank(self.user, self.get_total_points())
 
     def get_user_level(self):
         """Get user's current level based on total points"""
-        total_points = self._calculate_total_points()
-        return Level.objects.filter(
-            points_required__lte=total_points
-        ).order_by('-points_required').first()
+        return self.catalog.level_for(self.get_total_points())
 
     def get_available_rewards(self):
         """Get rewards that user can redeem"""
-        total_points = self._calculate_total_points()
-        return Reward.objects.filter(
-            points_required__lte=total_points,
+        redeemed = set(UserReward.objects.filter(
+            user=self.user,
             is_active=True
-        ).exclude(
-            userreward__user=self.user,
-            userreward__is_active=True
-        )
+        ).values_list('reward_id', flat=True))
+        return [
+            reward for reward in self.catalog.rewards_within(self.get_total_points())
+            if reward.pk not in redeemed
+        ]
 
     def redeem_reward(self, reward_id):
         """Redeem a reward if user has enough points"""
-        reward = Reward.objects.get(id=reward_id)
-        total_points = self._calculate_total_points()
+        reward = self.catalog.reward(reward_id)
+        if reward is None:
+            raise Reward.DoesNotExist(f"Reward {reward_id} does not exist")
+        total_points = self.get_total_points()
         
         if total_points >= reward.points_required:
             expires_at = timezone.now() + timedelta(days=reward.duration_days)
@@ -53,63 +65,32 @@ class GamificationService:
 
     def join_challenge(self, challenge_id):
         """Join a new challenge"""
-        challenge = Challenge.objects.get(id=challenge_id)
+        challenge = self.catalog.challenge(challenge_id)
+        if challenge is None:
+            raise Challenge.DoesNotExist(f"Challenge {challenge_id} does not exist")
         end_date = timezone.now() + timedelta(days=challenge.duration_days)
         
-        UserChallenge.objects.create(
+        user_challenge = UserChallenge.objects.create(
             user=self.user,
             challenge=challenge,
             end_date=end_date,
             status='ACTIVE'
         )
+        # Takes the savings/debt baselines progress is measured from
+        ChallengeEvaluator().evaluate([user_challenge])
 
     def update_challenge_progress(self, user_challenge_id, progress_data):
-        """Update progress for a challenge"""
+        """Record client-reported progress; derived fields are recomputed by the evaluator"""
         user_challenge = UserChallenge.objects.get(
             id=user_challenge_id,
             user=self.user
         )
         
-        user_challenge.progress.update(progress_data)
-        user_challenge.save()
-        
-        if self._check_challenge_completion(user_challenge):
-            self._complete_challenge(user_challenge)
-
-    def _calculate_total_points(self):
-        """Calculate total points from achievements and challenges"""
-        achievement_points = UserAchievement.objects.filter(
-            user=self.user
-        ).aggregate(
-            total=Sum('achievement__points')
-        )['total'] or 0
-        
-        challenge_points = UserChallenge.objects.filter(
-            user=self.user,
-            status='COMPLETED'
-        ).aggregate(
-            total=Sum('challenge__points_reward')
-        )['total'] or 0
-        
-        return achievement_points + challenge_points
-
-    def _check_challenge_completion(self, user_challenge):
-        """Check if challenge requirements are met"""
-        requirements = user_challenge.challenge.requirements
-        progress = user_challenge.progress
-        
-        if user_challenge.challenge.challenge_type == 'SAVINGS':
-            return progress.get('saved_amount', 0) >= requirements.get('target_amount', 0)
-        elif user_challenge.challenge.challenge_type == 'DEBT_PAYMENT':
-            return progress.get('extra_payment', 0) >= requirements.get('target_amount', 0)
-        # Add other challenge type checks
-        return False
-
-    def _complete_challenge(self, user_challenge):
-        """Mark challenge as completed and award points"""
-        user_challenge.status = 'COMPLETED'
-        user_challenge.save()
-        
-        # Update user progress
-        self.progress.points += user_challenge.challenge.points_reward
-        self.progress.save() 
\ No newline at end of file
+        user_challenge.progress.update({
+            key: value for key, value in progress_data.items() if key not in DERIVED_PROGRESS
+        })
+        if user_challenge.status == 'ACTIVE':
+            ChallengeEvaluator().evaluate([user_challenge])
+            self._points = None
+        else:
+            user_challenge.save(update_fields=['progress'])
@@ -0,0 +1,149 @@
+from collections import Counter
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from ..models import PointsBalance, PointsEvent, PointsRank, UserAchievement, UserChallenge
+
+POPULATION_KEY = 'debt_advisor:active-users'
+
+def record_points(events):
+    """Append unsaved PointsEvents and apply them to balances and the rank table.
+
+    Events already in the ledger for the same (user, source, source_id) are
+    dropped, so callers can retry freely. Balance rows are locked first,
+    which serializes concurrent awards to the same user. Returns the events
+    that were applied.
+    """
+    events = list({(e.user_id, e.source, e.source_id): e for e in events}.values())
+    if not events:
+        return []
+    user_ids = {event.user_id for event in events}
+
+    with transaction.atomic():
+        PointsBalance.objects.bulk_create([PointsBalance(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        balances = {
+            balance.user_id: balance
+            for balance in PointsBalance.objects.select_for_update().filter(user_id__in=user_ids)
+        }
+        existing = set(PointsEvent.objects.filter(
+            user_id__in=user_ids,
+            source__in={event.source for event in events},
+            source_id__in={event.source_id for event in events}
+        ).values_list('user_id', 'source', 'source_id'))
+        new = [event for event in events if (event.user_id, event.source, event.source_id) not in existing]
+        if not new:
+            return []
+        PointsEvent.objects.bulk_create(new)
+
+        deltas = Counter()
+        for event in new:
+            deltas[event.user_id] += event.points
+        moves = Counter()
+        now = timezone.now()
+        for user_id, delta in deltas.items():
+            balance = balances[user_id]
+            moves[balance.total] -= 1
+            balance.total += delta
+            balance.updated_at = now
+            moves[balance.total] += 1
+        PointsBalance.objects.bulk_update([balances[user_id] for user_id in deltas], ['total', 'updated_at'])
+        _apply_rank_moves(moves)
+    return new
+
+def _apply_rank_moves(moves):
+    """Shift per-total user counts; zero totals are left out of the table"""
+    moves = {points: count for points, count in moves.items() if count and points > 0}
+    if not moves:
+        return
+    PointsRank.objects.bulk_create([PointsRank(points=points) for points in moves], ignore_conflicts=True)
+    for points, count in moves.items():
+        PointsRank.objects.filter(points=points).update(users=F('users') + count)
+    PointsRank.objects.filter(points__in=list(moves), users__lte=0).delete()
+
+def total_points(user):
+    """Single-row read of the maintained balance"""
+    return PointsBalance.objects.filter(user=user).values_list('total', flat=True).first() or 0
+
+def leaderboard(limit=10):
+    """Top users by points, read off the balance index; ties share a rank"""
+    rows = []
+    for position, balance in enumerate(
+        PointsBalance.objects.filter(total__gt=0).select_related('user').order_by('-total', 'user_id')[:limit]
+    ):
+        tied = rows and rows[-1]['points'] == balance.total
+        rows.append({
+            'user_id': balance.user_id,
+            'username': balance.user.username,
+            'points': balance.total,
+            'rank': rows[-1]['rank'] if tied else position + 1,
+        })
+    return rows
+
+def active_user_count():
+    """Active users, shared across workers for a few minutes; percentiles tolerate the lag"""
+    population = cache.get(POPULATION_KEY)
+    if population is None:
+        population = User.objects.filter(is_active=True).count()
+        cache.set(POPULATION_KEY, population, settings.GAMIFICATION_POPULATION_CACHE_SECONDS)
+    return population
+
+def user_rank(user, points=None):
+    """Competition rank and percentile among all active users.
+
+    Only the PointsRank rows at or above the user's total are summed, so the
+    cost follows the number of distinct totals, not the number of users;
+    the population comes from active_user_count().
+    """
+    points = total_points(user) if points is None else points
+    counts = PointsRank.objects.filter(points__gte=points).aggregate(
+        at_or_above=Sum('users'),
+        above=Sum('users', filter=Q(points__gt=points))
+    )
+    above = counts['above'] or 0
+    population = active_user_count()
+    # Users without points are not in the table
+    tied = (counts['at_or_above'] or 0) - above if points > 0 else population - above
+    tied = max(min(tied, population - above), 0)
+    below = max(population - above - tied, 0)
+    return {
+        'points': points,
+        'rank': above + 1,
+        'users': population,
+        'percentile': round(100 * (below + tied / 2) / population, 1) if population else None,
+    }
+
+def rebuild_points(user_ids=None):
+    """Backfill events from earned achievements and completed challenges, then recompute balances and ranks"""
+    achievements = UserAchievement.objects.all()
+    challenges = UserChallenge.objects.filter(status='COMPLETED')
+    if user_ids is not None:
+        achievements = achievements.filter(user_id__in=user_ids)
+        challenges = challenges.filter(user_id__in=user_ids)
+    events = [
+        PointsEvent(user_id=user_id, points=points, source='ACHIEVEMENT', source_id=achievement_id)
+        for user_id, achievement_id, points in achievements.values_list('user_id', 'achievement_id', 'achievement__points')
+    ] + [
+        PointsEvent(user_id=user_id, points=points, source='CHALLENGE', source_id=pk)
+        for pk, user_id, points in challenges.values_list('pk', 'user_id', 'challenge__points_reward')
+    ]
+
+    with transaction.atomic():
+        PointsEvent.objects.bulk_create(events, ignore_conflicts=True, batch_size=1000)
+        totals = PointsEvent.objects.all()
+        if user_ids is not None:
+            totals = totals.filter(user_id__in=user_ids)
+        totals = totals.values('user_id').annotate(total=Sum('points'))
+        PointsBalance.objects.bulk_create(
+            [PointsBalance(user_id=row['user_id'], total=row['total']) for row in totals],
+            update_conflicts=True, unique_fields=['user'], update_fields=['total'], batch_size=1000
+        )
+        # The rank table is global, so it is always rebuilt from every balance
+        PointsRank.objects.all().delete()
+        PointsRank.objects.bulk_create([
+            PointsRank(points=row['total'], users=row['users'])
+            for row in PointsBalance.objects.filter(total__gt=0).values('total').annotate(users=Count('user'))
+        ], batch_size=1000)
+    return {'events': len(events), 'balances': len(totals)}
@@ -1,8 +1,23 @@
-from datetime import datetime, timedelta
+import logging
+from datetime import datetime, time, timedelta
 from django.utils import timezone
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
-from ..models import Reminder, DebtAccount
+from django.db import transaction
+from django.db.models import Q
+from django.contrib.auth.models import User
+from ..models import Reminder, DebtAccount, ConversationSession, Message
+
+logger = logging.getLogger(__name__)
+
+REPEAT_INTERVALS = {
+    'DAILY': timedelta(days=1),
+    'WEEKLY': timedelta(weeks=1),
+    'MONTHLY': timedelta(days=30),
+}
+
+PAYMENT_TITLE_PREFIX = 'Payment Due: '
+CHECK_IN_TITLE = 'Weekly Financial Check-in'
 
 class ReminderService:
     def __init__(self, user):
@@ -10,70 +25,263 @@ class ReminderService:
 
     def create_payment_reminders(self):
         """Create reminders for upcoming debt payments"""
-        debts = DebtAccount.objects.filter(user=self.user)
-        
-        for debt in debts:
-            # Create reminder 3 days before due date
-            reminder_date = debt.due_date - timedelta(days=3)
-            Reminder.objects.get_or_create(
-                user=self.user,
-                title=f"Payment Due: {debt.name}",
-                message=f"Your payment of ${debt.minimum_payment} for {debt.name} is due in 3 days.",
-                scheduled_time=reminder_date,
-                repeat_interval='MONTHLY'
-            )
+        return ReminderGenerator().generate([self.user.pk], kinds=['PAYMENT'])
 
     def create_check_in_reminder(self):
         """Create weekly check-in reminder"""
-        next_check_in = timezone.now() + timedelta(days=7)
-        Reminder.objects.get_or_create(
-            user=self.user,
-            title="Weekly Financial Check-in",
-            message="Time for your weekly financial review! Let's check your progress.",
-            scheduled_time=next_check_in,
-            repeat_interval='WEEKLY'
-        )
+        return ReminderGenerator().generate([self.user.pk], kinds=['CHECK_IN'])
 
     def send_due_reminders(self):
         """Send all due reminders"""
-        now = timezone.now()
-        due_reminders = Reminder.objects.filter(
-            user=self.user,
-            scheduled_time__lte=now,
-            is_active=True
+        return DueReminderScanner(user=self.user).run()
+
+class DueReminderScanner:
+    """Send due reminders across all users in scheduled_time order.
+
+    Batches are claimed with SELECT ... FOR UPDATE SKIP LOCKED and
+    rescheduled with one bulk_update in the same short transaction, so
+    several workers can scan at once without sending anything twice.
+    Email goes out after the claim commits, never while rows are locked;
+    reminders whose send fails get their old schedule back. Cost follows
+    the number of due reminders, not the number of users.
+    """
+
+    def __init__(self, batch_size=None, user=None):
+        self.batch_size = batch_size or settings.DAILY_CHECKS['reminder_batch_size']
+        self.user = user
+        self.failed_ids = set()
+
+    def run(self, now=None):
+        now = now or timezone.now()
+        stats = {'sent': 0, 'failed': 0, 'batches': 0}
+        while True:
+            sent, failed = self.process_batch(now)
+            if not sent and not failed:
+                return stats
+            stats['sent'] += sent
+            stats['failed'] += failed
+            stats['batches'] += 1
+
+    def process_batch(self, now):
+        with transaction.atomic():
+            due = Reminder.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                is_active=True,
+                scheduled_time__lte=now
+            ).exclude(id__in=self.failed_ids)
+            if self.user is not None:
+                due = due.filter(user=self.user)
+            batch = list(due.select_related('user').order_by('scheduled_time')[:self.batch_size])
+            if not batch:
+                return 0, 0
+
+            previous = {
+                reminder.pk: (reminder.scheduled_time, reminder.last_sent, reminder.is_active)
+                for reminder in batch
+            }
+            for reminder in batch:
+                self._reschedule(reminder, now)
+            Reminder.objects.bulk_update(batch, ['scheduled_time', 'last_sent', 'is_active'])
+
+        sent = self._deliver(batch)
+        failed = [reminder for reminder in batch if reminder.pk in self.failed_ids]
+        for reminder in failed:
+            reminder.scheduled_time, reminder.last_sent, reminder.is_active = previous[reminder.pk]
+        # Failed reminders stay due for the next run but are not retried in this one
+        Reminder.objects.bulk_update(failed, ['scheduled_time', 'last_sent', 'is_active'])
+        return len(sent), len(failed)
+
+    def _deliver(self, batch):
+        """Email each reminder over one connection and post in-app messages in bulk"""
+        connection = get_connection()
+        sent = []
+        for reminder in batch:
+            try:
+                connection.send_messages([EmailMessage(
+                    subject=reminder.title,
+                    body=reminder.message,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[reminder.user.email],
+                )])
+                sent.append(reminder)
+            except Exception:
+                logger.exception('Could not send reminder %s', reminder.pk)
+                self.failed_ids.add(reminder.pk)
+        connection.close()
+
+        sessions = self._active_sessions({reminder.user_id for reminder in sent})
+        Message.objects.bulk_create([
+            Message(
+                session_id=sessions[reminder.user_id],
+                content=reminder.message,
+                is_user=False,
+                message_type='REMINDER'
+            )
+            for reminder in sent
+        ])
+        return sent
+
+    def _active_sessions(self, user_ids):
+        """Open conversation session per user, creating the missing ones"""
+        sessions = dict(ConversationSession.objects.filter(
+            user_id__in=user_ids, end_time__isnull=True
+        ).order_by('start_time').values_list('user_id', 'id'))  # Newest wins
+        missing = [ConversationSession(user_id=user_id) for user_id in user_ids if user_id not in sessions]
+        for session in ConversationSession.objects.bulk_create(missing):
+            sessions[session.user_id] = session.pk
+        return sessions
+
+    def _reschedule(self, reminder, now):
+        """Advance past now so an overdue repeating reminder goes out once; one-offs retire"""
+        reminder.last_sent = now
+        interval = REPEAT_INTERVALS.get(reminder.repeat_interval)
+        if interval is None:
+            reminder.is_active = False
+            return
+        while reminder.scheduled_time <= now:
+            reminder.scheduled_time += interval
+
+class ReminderGenerator:
+    """Bring generated reminders for many users in line with their debts.
+
+    The desired set is computed from DebtAccount rows and diffed against
+    existing reminders on (user, debt_account, kind), then applied with
+    bulk_create, bulk_update and one bulk deactivate. A chunk costs the
+    same handful of queries whatever its size. Payment schedules are only
+    reset when the due date itself moves, so the scanner's rescheduling
+    survives regeneration; an existing check-in is never touched.
+
+    Reminders written before reminders were keyed are adopted first, so
+    the diff updates them instead of adding duplicates.
+    """
+    kinds = ('PAYMENT', 'CHECK_IN')
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+
+    def generate(self, user_ids, kinds=None):
+        kinds = kinds or self.kinds
+        adopted = self.adopt_legacy(user_ids)
+        desired = {}
+        if 'PAYMENT' in kinds:
+            for debt in DebtAccount.objects.filter(user_id__in=user_ids, balance__gt=0).only(
+                'id', 'user_id', 'name', 'due_date', 'minimum_payment'
+            ):
+                desired[(debt.user_id, debt.id, 'PAYMENT')] = self._payment_reminder(debt)
+        if 'CHECK_IN' in kinds:
+            for user_id in user_ids:
+                desired[(user_id, None, 'CHECK_IN')] = self._check_in_reminder(user_id)
+
+        existing = {
+            (reminder.user_id, reminder.debt_account_id, reminder.kind): reminder
+            for reminder in Reminder.objects.filter(user_id__in=user_ids, kind__in=kinds)
+        }
+
+        new, changed = [], []
+        for key, reminder in desired.items():
+            current = existing.get(key)
+            if current is None:
+                new.append(reminder)
+            elif reminder.kind == 'PAYMENT' and self._apply(current, reminder):
+                changed.append(current)
+        stale = [
+            reminder.pk for key, reminder in existing.items()
+            if key not in desired and reminder.is_active
+        ]
+
+        Reminder.objects.bulk_create(new, ignore_conflicts=True)
+        Reminder.objects.bulk_update(
+            changed, ['title', 'message', 'scheduled_time', 'source_date', 'is_active'], batch_size=500
         )
-        
-        for reminder in due_reminders:
-            self._send_reminder(reminder)
-            self._update_reminder_schedule(reminder)
-
-    def _send_reminder(self, reminder):
-        """Send reminder via email and in-app notification"""
-        # Send email
-        send_mail(
-            subject=reminder.title,
-            message=reminder.message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[self.user.email],
+        Reminder.objects.filter(pk__in=stale).update(is_active=False)
+        return {'adopted': adopted, 'created': len(new), 'updated': len(changed), 'deactivated': len(stale)}
+
+    def adopt_legacy(self, user_ids):
+        """Key the unkeyed CUSTOM reminders the old get_or_create path left behind.
+
+        Each is matched by title to its check-in or to the user's debt of
+        that name. The newest per key is adopted, with its schedule reset on
+        the next diff; older copies and reminders for debts that no longer
+        exist are retired. Returns the number adopted.
+        """
+        legacy = list(Reminder.objects.filter(user_id__in=user_ids, kind='CUSTOM', is_active=True).filter(
+            Q(title__startswith=PAYMENT_TITLE_PREFIX, repeat_interval='MONTHLY') |
+            Q(title=CHECK_IN_TITLE, repeat_interval='WEEKLY')
+        ).order_by('-scheduled_time', '-pk'))
+        if not legacy:
+            return 0
+        debts = {
+            (user_id, name): pk for pk, user_id, name in DebtAccount.objects.filter(
+                user_id__in={reminder.user_id for reminder in legacy}
+            ).values_list('id', 'user_id', 'name')
+        }
+        taken = set(Reminder.objects.filter(user_id__in=user_ids, kind__in=self.kinds).values_list(
+            'user_id', 'debt_account_id', 'kind'
+        ))
+
+        adopted, retired = [], []
+        for reminder in legacy:
+            if reminder.title == CHECK_IN_TITLE:
+                key = (reminder.user_id, None, 'CHECK_IN')
+            else:
+                debt_id = debts.get((reminder.user_id, reminder.title[len(PAYMENT_TITLE_PREFIX):]))
+                key = (reminder.user_id, debt_id, 'PAYMENT') if debt_id else None
+            if key is None or key in taken:
+                retired.append(reminder.pk)
+                continue
+            taken.add(key)
+            reminder.debt_account_id, reminder.kind = key[1], key[2]
+            adopted.append(reminder)
+
+        Reminder.objects.bulk_update(adopted, ['debt_account', 'kind'], batch_size=500)
+        Reminder.objects.filter(pk__in=retired).update(is_active=False)
+        return len(adopted)
+
+    def generate_all(self, chunk_size=1000):
+        """Regenerate for every active user, chunk by chunk"""
+        totals = {'adopted': 0, 'created': 0, 'updated': 0, 'deactivated': 0}
+        user_ids = list(User.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+        for offset in range(0, len(user_ids), chunk_size):
+            for name, count in self.generate(user_ids[offset:offset + chunk_size]).items():
+                totals[name] += count
+        return totals
+
+    def _payment_reminder(self, debt):
+        # 3 days before the due date
+        reminder_date = debt.due_date - timedelta(days=3)
+        return Reminder(
+            user_id=debt.user_id,
+            debt_account_id=debt.id,
+            kind='PAYMENT',
+            title=f"{PAYMENT_TITLE_PREFIX}{debt.name}",
+            message=f"Your payment of ${debt.minimum_payment} for {debt.name} is due in 3 days.",
+            scheduled_time=timezone.make_aware(datetime.combine(reminder_date, time.min)),
+            source_date=debt.due_date,
+            repeat_interval='MONTHLY'
         )
-        
-        # Create in-app notification
-        Message.objects.create(
-            session=self._get_active_session(),
-            content=reminder.message,
-            is_user=False,
-            message_type='REMINDER'
+
+    def _check_in_reminder(self, user_id):
+        return Reminder(
+            user_id=user_id,
+            kind='CHECK_IN',
+            title=CHECK_IN_TITLE,
+            message="Time for your weekly financial review! Let's check your progress.",
+            scheduled_time=self.now + timedelta(days=7),
+            repeat_interval='WEEKLY'
         )
-        
-        reminder.last_sent = timezone.now()
-        reminder.save()
-
-    def _update_reminder_schedule(self, reminder):
-        """Update reminder schedule based on repeat interval"""
-        if reminder.repeat_interval == 'DAILY':
-            reminder.scheduled_time += timedelta(days=1)
-        elif reminder.repeat_interval == 'WEEKLY':
-            reminder.scheduled_time += timedelta(weeks=1)
-        elif reminder.repeat_interval == 'MONTHLY':
-            reminder.scheduled_time += timedelta(days=30)
-        reminder.save() 
\ No newline at end of file
+
+    def _apply(self, current, desired):
+        """Copy what changed onto the stored payment reminder; True if anything did"""
+        changed = False
+        for field in ('title', 'message'):
+            if getattr(current, field) != getattr(desired, field):
+                setattr(current, field, getattr(desired, field))
+                changed = True
+        if current.source_date != desired.source_date:
+            current.scheduled_time = desired.scheduled_time
+            current.source_date = desired.source_date
+            changed = True
+        if not current.is_active:
+            # Deactivated when the debt was paid off; it carries a balance again
+            current.is_active = True
+            changed = True
+        return changed
@@ -0,0 +1,191 @@
+import hashlib
+import openai
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache, caches
+
+STATS_PREFIX = 'debt_advisor:response-cache-stats'
+STAT_NAMES = ('hit', 'miss', 'miss_ms')
+
+# Upper edges of the total debt bands; the last band is open-ended
+DEBT_BANDS = (0, 1000, 5000, 10000, 25000, 50000, 100000)
+SPENDING_BANDS = (0, 500, 1000, 2500, 5000, 10000)
+
+def normalize_message(text):
+    """Case-, punctuation- and whitespace-insensitive form of a user message"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = text.replace("'", '').replace('\u2019', '')
+    text = re.sub(r'(?<=\d),(?=\d)', '', text)  # 1,200 -> 1200
+    text = re.sub(r'(?<!\d)\.|\.(?!\d)', ' ', text)  # Keep decimal points only
+    text = re.sub(r'[^\w\s$%.]', ' ', text)
+    return ' '.join(text.split())
+
+def band(value, edges):
+    """Label of the band `value` falls in, e.g. '1000-5000' or '100000+'"""
+    value = float(value or 0)
+    lower = 0
+    for edge in edges:
+        if value <= edge:
+            return f'{lower}-{edge}' if edge else '0'
+        lower = edge
+    return f'{edges[-1]}+'
+
+def context_profile(context):
+    """The coarse view of a session context that prompts and cache keys use"""
+    num_debts = context.get('num_debts') or 0
+    return {
+        'num_debts': str(num_debts) if num_debts < 5 else '5+',
+        'total_debt': band(context.get('total_debt'), DEBT_BANDS),
+        'recent_spending': band(context.get('recent_spending'), SPENDING_BANDS),
+    }
+
+def context_fingerprint(context):
+    profile = context_profile(context)
+    return '|'.join(f'{name}={profile[name]}' for name in sorted(profile))
+
+def _stat_key(name):
+    return f'{STATS_PREFIX}:{name}'
+
+def _count(name, amount=1):
+    key = _stat_key(name)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, None)
+
+def response_cache_stats():
+    """Hit/miss counters across all workers"""
+    counts = cache.get_many([_stat_key(name) for name in STAT_NAMES])
+    hits, misses = counts.get(_stat_key('hit'), 0), counts.get(_stat_key('miss'), 0)
+    return {
+        'hit': hits,
+        'miss': misses,
+        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+        'avg_miss_ms': round(counts.get(_stat_key('miss_ms'), 0) / misses, 1) if misses else None,
+    }
+
+class LocalResponseStore:
+    """Per-process LRU with a TTL on every entry"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class DjangoResponseStore:
+    """Shared store on a Django cache alias; eviction is the backend's (LRU for locmem and Redis)"""
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout):
+        self.cache.set(key, value, timeout)
+
+class OpenAIProvider:
+    def __init__(self, model='gpt-4', temperature=0.7, max_tokens=150):
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    def complete(self, messages):
+        openai.api_key = settings.OPENAI_API_KEY
+        response = openai.ChatCompletion.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens
+        )
+        return response.choices[0].message['content']
+
+class StubProvider:
+    """Deterministic offline provider for tests and load runs; latency simulates the API call"""
+    model = 'stub'
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def complete(self, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        digest = hashlib.sha1(repr(messages).encode()).hexdigest()[:8]
+        return f"[stub {digest}] Let's look at your plan: {messages[-1]['content'][:80]}"
+
+class ResponseCache:
+    """Advisor replies keyed by normalized message, context profile and model"""
+
+    def __init__(self, store, timeout):
+        self.store = store
+        self.timeout = timeout
+
+    def key(self, message, context, model):
+        raw = f'{model}\n{context_fingerprint(context)}\n{normalize_message(message)}'
+        return f'debt_advisor:response:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+    def get_or_generate(self, message, context, model, generate):
+        """Cached reply for the message, or `generate()` stored under its key; returns (text, hit)"""
+        key = self.key(message, context, model)
+        text = self.store.get(key)
+        if text is not None:
+            _count('hit')
+            return text, True
+        started = time.monotonic()
+        text = generate()
+        _count('miss')
+        _count('miss_ms', int((time.monotonic() - started) * 1000))
+        self.store.set(key, text, self.timeout)
+        return text, False
+
+_provider = None
+_response_cache = None
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        config = settings.DEBT_ADVISOR_RESPONSES
+        if config['provider'] == 'stub':
+            _provider = StubProvider(config['stub_latency'])
+        else:
+            _provider = OpenAIProvider(config['model'], config['temperature'], config['max_tokens'])
+    return _provider
+
+def get_response_cache():
+    """Process-wide cache built from settings.DEBT_ADVISOR_RESPONSES"""
+    global _response_cache
+    if _response_cache is None:
+        config = settings.DEBT_ADVISOR_RESPONSES
+        if config['store'] == 'django':
+            store = DjangoResponseStore(config['cache_alias'])
+        else:
+            store = LocalResponseStore(config['max_entries'])
+        _response_cache = ResponseCache(store, config['timeout'])
+    return _response_cache
@@ -0,0 +1,62 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from debt_manager.models import DebtAccount
+from budget_tracker.models import Category, Expense
+from budget_tracker.rollups import month_start
+from goals.models import FinancialGoal
+from .models import Achievement, Challenge, Level, Message, Reward
+from .services.catalog import bump_catalog_version
+from .tasks import reevaluate_achievements
+
+def _reevaluate(user_id, group):
+    """Queue a re-check once the write commits, so saves never wait on the rules"""
+    transaction.on_commit(lambda: reevaluate_achievements.delay(user_id, [group]))
+
+@receiver(pre_save, sender=DebtAccount)
+def remember_original_balance(sender, instance, **kwargs):
+    """Debt reduced counts from the balance a debt was added with"""
+    if instance._state.adding and instance.original_balance is None:
+        instance.original_balance = instance.balance
+
+@receiver(post_save, sender=DebtAccount)
+@receiver(post_delete, sender=DebtAccount)
+def debt_changed(sender, instance, **kwargs):
+    _reevaluate(instance.user_id, 'debt')
+
+@receiver(post_save, sender=FinancialGoal)
+@receiver(post_delete, sender=FinancialGoal)
+def savings_changed(sender, instance, **kwargs):
+    _reevaluate(instance.user_id, 'savings')
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def budget_changed(sender, instance, **kwargs):
+    _reevaluate(instance.user_id, 'budget')
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def last_month_expense_changed(sender, instance, **kwargs):
+    """Adherence is judged on last month, so current spending waits for the daily run"""
+    last_month = month_start(month_start(timezone.now().date()) - timedelta(days=1))
+    if month_start(instance.date) == last_month:
+        _reevaluate(instance.user_id, 'budget')
+
+@receiver(post_save, sender=Message)
+def message_sent(sender, instance, created, **kwargs):
+    if created and instance.is_user:
+        _reevaluate(instance.session.user_id, 'engagement')
+
+@receiver(post_save, sender=Level)
+@receiver(post_save, sender=Reward)
+@receiver(post_save, sender=Achievement)
+@receiver(post_save, sender=Challenge)
+@receiver(post_delete, sender=Level)
+@receiver(post_delete, sender=Reward)
+@receiver(post_delete, sender=Achievement)
+@receiver(post_delete, sender=Challenge)
+def catalog_changed(sender, **kwargs):
+    # Bump after commit so no process reloads the catalog before the change is visible
+    transaction.on_commit(bump_catalog_version)
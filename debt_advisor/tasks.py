@@ -1,16 +1,46 @@
-from celery import shared_task
-from django.contrib.auth.models import User
-from .services.reminder_service import ReminderService
-from .services.achievement_service import AchievementService
+import logging
+from celery import chord, group, shared_task
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .services.achievement_service import AchievementEngine
+from .services.batch_service import plan_chunks, run_chunk, job_progress
+from .services.reminder_service import DueReminderScanner
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def send_due_reminders():
+    """Global scan; run on several workers at once to drain a large backlog"""
+    return DueReminderScanner().run()
+
+@shared_task
+def reevaluate_achievements(user_id, groups):
+    """Re-check the rules reading `groups` after one user's data changed"""
+    awards = AchievementEngine().evaluate([user_id], groups=groups)
+    return [achievement.pk for achievement in awards.get(user_id, [])]
+
+@shared_task
+def process_daily_checks(chunk_size=None):
+    """Fan the day's user-id chunks out as a chord; safe to re-run after a crash"""
+    send_due_reminders.delay()
+    day = timezone.now().date()
+    chunk_ids = plan_chunks('daily_checks', day, chunk_size)
+    if not chunk_ids:
+        return job_progress('daily_checks', day)
+    chord(group(process_daily_check_chunk.s(chunk_id) for chunk_id in chunk_ids))(
+        summarize_daily_checks.s('daily_checks', day.isoformat())
+    )
+    return {'dispatched': len(chunk_ids)}
+
+@shared_task
+def process_daily_check_chunk(chunk_id):
+    return run_chunk(chunk_id)
 
 @shared_task
-def process_daily_checks():
-    users = User.objects.filter(is_active=True)
-    for user in users:
-        # Process reminders
-        reminder_service = ReminderService(user)
-        reminder_service.send_due_reminders()
-        
-        # Check achievements
-        achievement_service = AchievementService(user)
-        achievement_service.check_achievements() 
\ No newline at end of file
+def summarize_daily_checks(chunk_results, job, day):
+    progress = job_progress(job, parse_date(day))
+    logger.info(
+        '%s %s: %s/%s chunks done, %s users, %s user failures',
+        job, day, progress['done'], progress['chunks'], progress['processed'], progress['user_failures']
+    )
+    return progress
@@ -0,0 +1,566 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from budget_tracker.models import Category, Expense
+from debt_manager.models import DebtAccount
+from goals.models import FinancialGoal
+from .api.views import GamificationViewSet, ResponseCacheStatsAPIView
+from .models import (
+    Achievement, AchievementFacts, Challenge, ConversationSession, Level, Message, PointsBalance, PointsEvent,
+    PointsRank, Reminder, Reward, UserBatchChunk, UserChallenge
+)
+from .services import batch_service, catalog, response_cache
+from .services.advisor_service import DebtAdvisorService
+from .services.achievement_service import RULES, AchievementEngine, AchievementService
+from .services.batch_service import job_progress, plan_chunks, run_chunk
+from .services.catalog import catalog_version, get_catalog
+from .services.challenge_service import ChallengeEvaluator
+from .services.points_service import POPULATION_KEY, leaderboard, rebuild_points, record_points, user_rank
+from .services.reminder_service import DueReminderScanner, ReminderGenerator
+from .services.response_cache import (
+    LocalResponseStore, ResponseCache, StubProvider, band, context_fingerprint, normalize_message, response_cache_stats
+)
+
+def moment(*args):
+    return timezone.make_aware(datetime(*args))
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        catalog._catalog = None
+        Level.objects.create(name='Starter', level_number=1, points_required=0, icon='seedling')
+        Level.objects.create(name='Saver', level_number=2, points_required=100, icon='piggy-bank')
+
+    def test_version_bumps_only_after_commit(self):
+        before = catalog_version()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Reward.objects.create(
+                name='Badge', description='A badge', points_required=50, reward_type='BADGE'
+            )
+        self.assertEqual(catalog_version(), before)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(catalog_version(), before)
+
+    def test_catalog_reloads_after_a_committed_change(self):
+        self.assertEqual(get_catalog().level_for(150).name, 'Saver')
+        with self.captureOnCommitCallbacks(execute=True):
+            Level.objects.create(name='Planner', level_number=3, points_required=120, icon='map')
+        catalog._checked_at = 0.0
+        current = get_catalog()
+        self.assertEqual(current.level_for(150).name, 'Planner')
+        self.assertEqual(current.level_for(99).name, 'Starter')
+
+class ChallengeEvaluatorTests(TestCase):
+    def setUp(self):
+        catalog._catalog = None
+        self.user = User.objects.create_user('challenger')
+
+    def join(self, challenge_type, requirements, start=moment(2024, 3, 1, 9), end=moment(2024, 3, 31, 9)):
+        challenge = Challenge.objects.create(
+            title=challenge_type, description='', points_reward=25, duration_days=30,
+            challenge_type=challenge_type, requirements=requirements
+        )
+        joined = UserChallenge.objects.create(user=self.user, challenge=challenge, end_date=end, status='ACTIVE')
+        UserChallenge.objects.filter(pk=joined.pk).update(start_date=start)
+        return joined
+
+    def evaluate(self, now):
+        stats = ChallengeEvaluator(now=now).run()
+        return stats, {uc.challenge.challenge_type: uc for uc in UserChallenge.objects.select_related('challenge')}
+
+    def test_budget_without_a_limit_fails_once_ended(self):
+        self.join('BUDGET', {})
+        _, challenges = self.evaluate(moment(2024, 3, 10))
+        self.assertEqual(challenges['BUDGET'].status, 'ACTIVE')
+        self.assertIsNone(challenges['BUDGET'].progress['limit'])
+        stats, challenges = self.evaluate(moment(2024, 4, 1))
+        self.assertEqual(challenges['BUDGET'].status, 'FAILED')
+        self.assertEqual(stats, {'FAILED': 1})
+
+    def test_budget_limits_complete_or_fail(self):
+        food = Category.objects.create(user=self.user, name='Food', budget_limit=Decimal('300'))
+        self.join('BUDGET', {'max_spending': 100})
+        Expense.objects.create(
+            user=self.user, category=food, amount=Decimal('60'), date=date(2024, 3, 5), description='Groceries'
+        )
+        _, challenges = self.evaluate(moment(2024, 4, 1))
+        self.assertEqual(challenges['BUDGET'].status, 'COMPLETED')
+        self.assertEqual(challenges['BUDGET'].progress['spent'], 60.0)
+        self.assertEqual(PointsBalance.objects.get(user=self.user).total, 25)
+
+        UserChallenge.objects.all().delete()
+        self.join('BUDGET', {})
+        Expense.objects.create(
+            user=self.user, category=food, amount=Decimal('400'), date=date(2024, 3, 6), description='Party'
+        )
+        _, challenges = self.evaluate(moment(2024, 3, 10))
+        self.assertEqual(challenges['BUDGET'].progress['limit'], 300.0)
+        self.assertEqual(challenges['BUDGET'].status, 'FAILED')
+
+    def test_debt_payment_counts_only_payments_beyond_minimums(self):
+        debt = DebtAccount.objects.create(
+            user=self.user, name='Card', balance=Decimal('1000'), interest_rate=Decimal('20'),
+            minimum_payment=Decimal('50'), due_date=date(2024, 3, 15), debt_type='CREDIT_CARD'
+        )
+        self.join('DEBT_PAYMENT', {'target_amount': 200})
+        self.evaluate(moment(2024, 3, 1, 10))
+
+        debt.balance = Decimal('800')
+        debt.save()
+        DebtAccount.objects.create(
+            user=self.user, name='Later loan', balance=Decimal('500'), interest_rate=Decimal('5'),
+            minimum_payment=Decimal('20'), due_date=date(2024, 3, 20), debt_type='PERSONAL_LOAN'
+        )
+        _, challenges = self.evaluate(moment(2024, 3, 20))
+        progress = challenges['DEBT_PAYMENT'].progress
+        self.assertEqual(progress['minimums_due'], 50.0)
+        self.assertEqual(progress['extra_payment'], 150.0)
+        self.assertEqual(challenges['DEBT_PAYMENT'].status, 'ACTIVE')
+
+        debt.balance = Decimal('740')
+        debt.save()
+        _, challenges = self.evaluate(moment(2024, 3, 21))
+        self.assertEqual(challenges['DEBT_PAYMENT'].status, 'COMPLETED')
+
+    def test_completions_pay_out_once(self):
+        joined = self.join('EDUCATION', {'lessons': 1})
+        UserChallenge.objects.filter(pk=joined.pk).update(progress={'completed_lessons': 1})
+        self.evaluate(moment(2024, 3, 2))
+        UserChallenge.objects.filter(pk=joined.pk).update(status='ACTIVE')
+        self.evaluate(moment(2024, 3, 3))
+        self.assertEqual(PointsEvent.objects.filter(source='CHALLENGE', source_id=joined.pk).count(), 1)
+        self.assertEqual(PointsBalance.objects.get(user=self.user).total, 25)
+
+def award(user, points, source_id):
+    return PointsEvent(user=user, points=points, source='ADJUSTMENT', source_id=source_id)
+
+class PointsTests(TestCase):
+    def setUp(self):
+        cache.delete(POPULATION_KEY)
+        self.users = [User.objects.create_user(f'player{i}') for i in range(4)]
+
+    def ranks(self):
+        return dict(PointsRank.objects.values_list('points', 'users'))
+
+    def test_balances_and_rank_table_follow_events(self):
+        first, second, third, _ = self.users
+        record_points([award(first, 30, 1), award(second, 30, 1), award(third, 10, 1)])
+        record_points([award(first, 5, 2), award(first, 5, 2)])
+        self.assertEqual(PointsBalance.objects.get(user=first).total, 35)
+        self.assertEqual(self.ranks(), {35: 1, 30: 1, 10: 1})
+        self.assertEqual(record_points([award(first, 5, 2)]), [])
+
+        rank = user_rank(second)
+        self.assertEqual((rank['rank'], rank['users'], rank['percentile']), (2, 4, 62.5))
+        self.assertEqual(user_rank(self.users[3])['rank'], 4)
+
+    def test_rebuild_matches_the_maintained_tables(self):
+        record_points([award(user, 10 * (i + 1), 1) for i, user in enumerate(self.users[:3])])
+        record_points([award(self.users[0], 20, 2)])
+        maintained = (self.ranks(), dict(PointsBalance.objects.values_list('user_id', 'total')))
+        PointsRank.objects.all().delete()
+        PointsBalance.objects.all().delete()
+        rebuild_points()
+        self.assertEqual((self.ranks(), dict(PointsBalance.objects.values_list('user_id', 'total'))), maintained)
+
+    def test_leaderboard_shares_ranks_on_ties(self):
+        record_points([award(self.users[0], 50, 1), award(self.users[1], 50, 1), award(self.users[2], 20, 1)])
+        self.assertEqual([row['rank'] for row in leaderboard(10)], [1, 1, 3])
+
+    def test_leaderboard_limit_is_clamped(self):
+        record_points([award(user, 10 + i, 1) for i, user in enumerate(self.users)])
+        view = GamificationViewSet.as_view({'get': 'leaderboard'})
+
+        def get(limit):
+            request = APIRequestFactory().get('/leaderboard/', {'limit': limit})
+            force_authenticate(request, self.users[0])
+            return view(request)
+
+        self.assertEqual(len(get('0').data['leaders']), 1)
+        self.assertEqual(len(get('-5').data['leaders']), 1)
+        self.assertEqual(len(get('1000').data['leaders']), 4)
+        self.assertEqual(get('lots').status_code, 400)
+
+@override_settings(DAILY_CHECKS={'chunk_size': 3, 'batch_size': 2, 'stale_after_minutes': 30})
+class UserBatchChunkTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f'user{i}') for i in range(7)]
+        User.objects.create_user('inactive', is_active=False)
+        self.seen = []
+        self.failing = set()
+        jobs = mock.patch.dict(batch_service.JOBS, {'test': [self.step]})
+        jobs.start()
+        self.addCleanup(jobs.stop)
+
+    def step(self, user_ids):
+        if self.failing & set(user_ids):
+            raise ValueError('boom')
+        self.seen.extend(user_ids)
+
+    def test_plan_splits_active_users_once_per_day(self):
+        chunk_ids = plan_chunks('test', date(2024, 3, 1))
+        ranges = list(UserBatchChunk.objects.order_by('first_user_id').values_list('first_user_id', 'last_user_id'))
+        ids = [user.pk for user in self.users]
+        self.assertEqual(ranges, [(ids[0], ids[2]), (ids[3], ids[5]), (ids[6], ids[6])])
+        self.assertEqual(plan_chunks('test', date(2024, 3, 1), chunk_size=100), chunk_ids)
+        self.assertEqual(UserBatchChunk.objects.count(), 3)
+
+    def test_every_user_is_processed_once(self):
+        for chunk_id in plan_chunks('test', date(2024, 3, 1)):
+            self.assertEqual(run_chunk(chunk_id)['status'], 'DONE')
+        for chunk_id in UserBatchChunk.objects.values_list('id', flat=True):
+            self.assertIsNone(run_chunk(chunk_id))
+        self.assertEqual(self.seen, [user.pk for user in self.users])
+        self.assertEqual(plan_chunks('test', date(2024, 3, 1)), [])
+        progress = job_progress('test', date(2024, 3, 1))
+        self.assertEqual((progress['chunks'], progress['done'], progress['processed']), (3, 3, 7))
+
+    def test_failed_batches_are_retried_on_the_next_claim(self):
+        chunk_id = plan_chunks('test', date(2024, 3, 1))[0]
+        self.failing = {self.users[0].pk}
+        with self.assertLogs(batch_service.logger, 'ERROR'):
+            summary = run_chunk(chunk_id)
+        self.assertEqual((summary['status'], summary['processed'], summary['failures']), ('FAILED', 3, 1))
+        self.assertEqual(self.seen, [self.users[2].pk])
+        self.assertEqual(job_progress('test', date(2024, 3, 1))['user_failures'], 2)
+
+        self.failing = set()
+        summary = run_chunk(chunk_id)
+        self.assertEqual((summary['status'], summary['processed'], summary['failures']), ('DONE', 3, 0))
+        self.assertEqual(self.seen, [self.users[2].pk, self.users[0].pk, self.users[1].pk])
+
+    def test_only_stale_running_chunks_are_reclaimed(self):
+        chunk_id = plan_chunks('test', date(2024, 3, 1))[0]
+        UserBatchChunk.objects.filter(pk=chunk_id).update(status='RUNNING', started_at=timezone.now())
+        self.assertIsNone(run_chunk(chunk_id))
+        UserBatchChunk.objects.filter(pk=chunk_id).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(run_chunk(chunk_id)['status'], 'DONE')
+
+    def test_a_reclaimed_worker_stops_writing(self):
+        chunk_id = plan_chunks('test', date(2024, 3, 1))[0]
+
+        def takeover(user_ids):
+            UserBatchChunk.objects.filter(pk=chunk_id).update(claim_token=None)
+
+        with mock.patch.dict(batch_service.JOBS, {'test': [takeover]}), self.assertLogs(batch_service.logger):
+            self.assertIsNone(run_chunk(chunk_id))
+        chunk = UserBatchChunk.objects.get(pk=chunk_id)
+        self.assertEqual((chunk.status, chunk.processed, chunk.cursor), ('RUNNING', 0, 0))
+
+class DueReminderScannerTests(TestCase):
+    def setUp(self):
+        self.now = moment(2024, 3, 20, 12)
+        self.user = User.objects.create_user('reminded', email='reminded@example.com')
+
+    def reminder(self, scheduled_time, repeat_interval='WEEKLY', user=None, title='Check in'):
+        return Reminder.objects.create(
+            user=user or self.user, title=title, message=f'{title} now', scheduled_time=scheduled_time,
+            repeat_interval=repeat_interval
+        )
+
+    def test_overdue_repeating_reminder_goes_out_once(self):
+        reminder = self.reminder(moment(2024, 2, 27, 9))
+        self.assertEqual(DueReminderScanner().run(self.now), {'sent': 1, 'failed': 0, 'batches': 1})
+        self.assertEqual(DueReminderScanner().run(self.now)['sent'], 0)
+        reminder.refresh_from_db()
+        self.assertEqual(reminder.scheduled_time, moment(2024, 3, 26, 9))
+        self.assertEqual(reminder.last_sent, self.now)
+        self.assertEqual([message.to for message in mail.outbox], [['reminded@example.com']])
+
+    def test_one_off_reminders_retire(self):
+        reminder = self.reminder(moment(2024, 3, 19), repeat_interval='CUSTOM')
+        DueReminderScanner().run(self.now)
+        reminder.refresh_from_db()
+        self.assertFalse(reminder.is_active)
+        self.assertEqual(reminder.scheduled_time, moment(2024, 3, 19))
+
+    def test_batches_post_messages_into_open_sessions(self):
+        other = User.objects.create_user('other', email='other@example.com')
+        session = ConversationSession.objects.create(user=self.user)
+        for day in (1, 2, 3):
+            self.reminder(moment(2024, 3, day), title=f'Reminder {day}')
+        self.reminder(moment(2024, 3, 4), user=other)
+        self.reminder(moment(2024, 3, 25))
+
+        self.assertEqual(DueReminderScanner(batch_size=3).run(self.now), {'sent': 4, 'failed': 0, 'batches': 2})
+        self.assertEqual(Message.objects.filter(session=session, message_type='REMINDER').count(), 3)
+        self.assertEqual(ConversationSession.objects.filter(user=other).count(), 1)
+        self.assertEqual(
+            [message.subject for message in mail.outbox], ['Reminder 1', 'Reminder 2', 'Reminder 3', 'Check in']
+        )
+
+    def test_failed_sends_keep_their_schedule(self):
+        bounced = User.objects.create_user('bounced', email='bounce@example.com')
+        failing = self.reminder(moment(2024, 3, 1), user=bounced)
+        self.reminder(moment(2024, 3, 2))
+        send_messages = EmailBackend.send_messages
+
+        def bounce(backend, messages):
+            if messages[0].to == ['bounce@example.com']:
+                raise OSError('mailbox unavailable')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', bounce), self.assertLogs('debt_advisor', 'ERROR'):
+            self.assertEqual(DueReminderScanner().run(self.now), {'sent': 1, 'failed': 1, 'batches': 1})
+        failing.refresh_from_db()
+        self.assertEqual((failing.scheduled_time, failing.last_sent), (moment(2024, 3, 1), None))
+        self.assertFalse(Message.objects.filter(session__user=bounced).exists())
+        self.assertEqual(DueReminderScanner().run(self.now)['sent'], 1)
+
+    def test_user_scan_sends_only_their_reminders(self):
+        other = User.objects.create_user('other', email='other@example.com')
+        self.reminder(moment(2024, 3, 1))
+        untouched = self.reminder(moment(2024, 3, 1), user=other)
+        self.assertEqual(DueReminderScanner(user=self.user).run(self.now)['sent'], 1)
+        untouched.refresh_from_db()
+        self.assertIsNone(untouched.last_sent)
+
+class ReminderGeneratorTests(TestCase):
+    def setUp(self):
+        self.now = moment(2024, 3, 1, 8)
+        self.user = User.objects.create_user('planner')
+        self.card = self.debt(self.user, 'Card', date(2024, 3, 15))
+
+    def debt(self, user, name, due_date, balance='500'):
+        return DebtAccount.objects.create(
+            user=user, name=name, balance=Decimal(balance), interest_rate=Decimal('19.9'),
+            minimum_payment=Decimal('25'), due_date=due_date, debt_type='CREDIT_CARD'
+        )
+
+    def generate(self, *users):
+        return ReminderGenerator(now=self.now).generate([user.pk for user in users or [self.user]])
+
+    def payment(self, debt):
+        return Reminder.objects.get(debt_account=debt, kind='PAYMENT')
+
+    def test_regenerating_is_a_no_op(self):
+        self.assertEqual(self.generate(), {'adopted': 0, 'created': 2, 'updated': 0, 'deactivated': 0})
+        self.assertEqual(self.payment(self.card).scheduled_time, moment(2024, 3, 12))
+        self.assertEqual(self.generate(), {'adopted': 0, 'created': 0, 'updated': 0, 'deactivated': 0})
+        self.assertEqual(Reminder.objects.count(), 2)
+
+    def test_sent_schedules_survive_until_the_due_date_moves(self):
+        self.generate()
+        DueReminderScanner().run(moment(2024, 3, 12, 1))
+        self.assertEqual(self.payment(self.card).scheduled_time, moment(2024, 4, 11))
+
+        self.card.minimum_payment = Decimal('30')
+        self.card.save()
+        self.assertEqual(self.generate()['updated'], 1)
+        reminder = self.payment(self.card)
+        self.assertEqual(reminder.scheduled_time, moment(2024, 4, 11))
+        self.assertIn('$30.00', reminder.message)
+
+        self.card.due_date = date(2024, 4, 20)
+        self.card.save()
+        self.generate()
+        self.assertEqual(self.payment(self.card).scheduled_time, moment(2024, 4, 17))
+
+    def test_paid_off_debts_deactivate_and_come_back(self):
+        self.generate()
+        self.card.balance = Decimal('0')
+        self.card.save()
+        self.assertEqual(self.generate()['deactivated'], 1)
+        self.assertFalse(self.payment(self.card).is_active)
+        self.card.balance = Decimal('80')
+        self.card.save()
+        self.assertEqual(self.generate()['updated'], 1)
+        self.assertTrue(self.payment(self.card).is_active)
+
+    def test_check_in_is_never_rescheduled(self):
+        self.generate()
+        self.now = moment(2024, 3, 5)
+        self.generate()
+        self.assertEqual(Reminder.objects.get(kind='CHECK_IN').scheduled_time, moment(2024, 3, 8, 8))
+
+    def test_legacy_reminders_are_adopted(self):
+        def legacy(title, repeat_interval, scheduled_time):
+            return Reminder.objects.create(
+                user=self.user, title=title, message='old', scheduled_time=scheduled_time,
+                repeat_interval=repeat_interval
+            )
+
+        newest = legacy('Payment Due: Card', 'MONTHLY', moment(2024, 2, 12))
+        older = legacy('Payment Due: Card', 'MONTHLY', moment(2024, 1, 12))
+        orphan = legacy('Payment Due: Closed loan', 'MONTHLY', moment(2024, 2, 1))
+        check_in = legacy('Weekly Financial Check-in', 'WEEKLY', moment(2024, 3, 3))
+
+        self.assertEqual(self.generate(), {'adopted': 2, 'created': 0, 'updated': 1, 'deactivated': 0})
+        self.assertEqual(self.payment(self.card).pk, newest.pk)
+        self.assertEqual(self.payment(self.card).scheduled_time, moment(2024, 3, 12))
+        self.assertEqual(Reminder.objects.get(kind='CHECK_IN').pk, check_in.pk)
+        retired = Reminder.objects.filter(is_active=False).values_list('pk', flat=True)
+        self.assertEqual(set(retired), {older.pk, orphan.pk})
+
+    def test_query_count_does_not_grow_with_users(self):
+        def queries(count, prefix):
+            users = [User.objects.create_user(f'{prefix}{i}') for i in range(count)]
+            for user in users:
+                self.debt(user, 'Card', date(2024, 3, 15))
+                self.debt(user, 'Loan', date(2024, 3, 28))
+            with CaptureQueriesContext(connection) as context:
+                self.generate(*users)
+            return len(context.captured_queries)
+
+        self.assertEqual(queries(1, 'small'), queries(20, 'large'))
+
+class AchievementEngineTests(TestCase):
+    def setUp(self):
+        catalog._catalog = None
+        for rule in RULES:
+            Achievement.objects.create(name=rule.code, description='', icon='star', points=10, category='MILESTONE')
+        self.now = moment(2024, 3, 20, 12)
+        self.user = User.objects.create_user('achiever')
+
+    def debt(self, balance, user=None, **kwargs):
+        return DebtAccount.objects.create(
+            user=user or self.user, name='Card', balance=Decimal(balance), interest_rate=Decimal('19.9'),
+            minimum_payment=Decimal('25'), due_date=date(2024, 3, 15), debt_type='CREDIT_CARD', **kwargs
+        )
+
+    def evaluate(self, user_ids=None, groups=None):
+        awards = AchievementEngine(now=self.now).evaluate(user_ids or [self.user.pk], groups=groups)
+        return {user_id: sorted(a.name for a in achievements) for user_id, achievements in awards.items()}
+
+    def facts(self, user=None):
+        return AchievementFacts.objects.get(user=user or self.user).facts
+
+    def test_paydown_before_the_first_evaluation_counts(self):
+        debt = self.debt('2000')
+        debt.balance = Decimal('800')
+        debt.save()
+        self.assertEqual(self.evaluate(), {self.user.pk: ['FIRST_PAYMENT', 'REDUCE_1000']})
+        self.assertEqual(self.facts()['peak_debt'], 2000.0)
+        self.assertEqual(PointsBalance.objects.get(user=self.user).total, 20)
+        self.assertEqual(self.evaluate(), {})
+
+    def test_reduction_is_measured_from_the_peak(self):
+        debt = self.debt('6000', original_balance=Decimal('3000'))
+        self.evaluate()
+        self.assertEqual(self.facts()['peak_debt'], 6000.0)
+        debt.delete()
+        self.assertEqual(self.evaluate(), {self.user.pk: ['DEBT_FREE', 'FIRST_PAYMENT', 'REDUCE_1000', 'REDUCE_5000']})
+        self.assertEqual(self.facts()['debt_reduced'], 6000.0)
+
+    def test_events_check_only_rules_whose_facts_changed(self):
+        debt = self.debt('2000')
+        debt.balance = Decimal('500')
+        debt.save()
+        FinancialGoal.objects.create(
+            user=self.user, title='Rainy day', target_amount=Decimal('3000'), current_amount=Decimal('1500'),
+            deadline=date(2025, 1, 1), priority=1, category='EMERGENCY_FUND'
+        )
+        self.assertEqual(self.evaluate(groups=['savings']), {self.user.pk: ['EMERGENCY_FUND_1000']})
+        self.assertEqual(self.facts(), {'savings': 1500.0})
+        self.assertEqual(self.evaluate(groups=['savings']), {})
+        awards = AchievementService(self.user).on_event('debt')
+        self.assertEqual(sorted(a.name for a in awards), ['FIRST_PAYMENT', 'REDUCE_1000'])
+        self.assertEqual(set(self.facts()), {'savings', 'total_debt', 'peak_debt', 'debt_reduced'})
+
+    def test_budget_and_engagement_facts(self):
+        food = Category.objects.create(user=self.user, name='Food', budget_limit=Decimal('300'))
+        Expense.objects.create(
+            user=self.user, category=food, amount=Decimal('120'), date=date(2024, 2, 10), description='groceries',
+            is_essential=True
+        )
+        session = ConversationSession.objects.create(user=self.user)
+        Message.objects.create(session=session, content='hi')
+        self.assertEqual(
+            self.evaluate(groups=['budget', 'engagement']),
+            {self.user.pk: ['FIRST_BUDGET', 'FIRST_CHECK_IN', 'UNDER_BUDGET_MONTH']}
+        )
+        self.assertEqual(self.facts()['active_days'], 1)
+
+    def test_batch_query_count_does_not_grow_with_users(self):
+        def queries(count, prefix):
+            users = [User.objects.create_user(f'{prefix}{i}') for i in range(count)]
+            for user in users:
+                self.debt('500', user=user, original_balance=Decimal('900'))
+            get_catalog()
+            with CaptureQueriesContext(connection) as context:
+                awards = self.evaluate([user.pk for user in users])
+            self.assertEqual(len(awards), count)
+            return len(context.captured_queries)
+
+        self.assertEqual(queries(1, 'small'), queries(20, 'large'))
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.responses = ResponseCache(LocalResponseStore(), 60)
+        response_cache._response_cache = self.responses
+        self.addCleanup(setattr, response_cache, '_response_cache', None)
+
+    def test_normalized_messages_match(self):
+        self.assertEqual(normalize_message('How do I pay off $1,200?'), normalize_message('how do i pay off  $1200'))
+        self.assertEqual(normalize_message("Don’t I owe 3.5% APR?"), "dont i owe 3.5% apr")
+        self.assertNotEqual(normalize_message('pay 35'), normalize_message('pay 3.5'))
+
+    def test_context_is_banded(self):
+        self.assertEqual([band(v, response_cache.DEBT_BANDS) for v in (0, 1000, 1500, 250000)],
+                         ['0', '0-1000', '1000-5000', '100000+'])
+        self.assertEqual(
+            context_fingerprint({'num_debts': 2, 'total_debt': 6200.0, 'recent_spending': 900.0}),
+            context_fingerprint({'num_debts': 2, 'total_debt': 9800.0, 'recent_spending': 510.0})
+        )
+        self.assertNotEqual(
+            context_fingerprint({'num_debts': 2, 'total_debt': 6200.0}),
+            context_fingerprint({'num_debts': 2, 'total_debt': 12000.0})
+        )
+        self.assertEqual(context_fingerprint({'num_debts': 7}), context_fingerprint({'num_debts': 12}))
+
+    def test_equivalent_questions_generate_once(self):
+        calls = []
+        context = {'num_debts': 1, 'total_debt': 3000.0}
+
+        def generate():
+            calls.append(1)
+            return 'Pay the card first.'
+
+        self.assertEqual(self.responses.get_or_generate('Which debt first?', context, 'stub', generate),
+                         ('Pay the card first.', False))
+        self.assertEqual(self.responses.get_or_generate('which DEBT first', context, 'stub', generate),
+                         ('Pay the card first.', True))
+        self.responses.get_or_generate('which debt first', context, 'gpt-4', generate)
+        self.assertEqual(len(calls), 2)
+        stats = response_cache_stats()
+        self.assertEqual((stats['hit'], stats['miss'], stats['hit_rate']), (1, 2, 0.333))
+
+    def test_local_store_evicts_least_recent_and_expired(self):
+        store = LocalResponseStore(max_entries=2)
+        store.set('a', 1, 60)
+        store.set('b', 2, 60)
+        store.get('a')
+        store.set('c', 3, 60)
+        self.assertEqual((store.get('a'), store.get('b'), store.get('c')), (1, None, 3))
+        store.set('d', 4, -1)
+        self.assertIsNone(store.get('d'))
+
+    def test_similar_profiles_share_a_reply_without_exact_figures(self):
+        replies = []
+        for name, balance in (('first', '6200.00'), ('second', '9800.00')):
+            user = User.objects.create_user(name)
+            DebtAccount.objects.create(
+                user=user, name='Card', balance=Decimal(balance), interest_rate=Decimal('19.9'),
+                minimum_payment=Decimal('25'), due_date=date(2024, 3, 15), debt_type='CREDIT_CARD'
+            )
+            service = DebtAdvisorService(user, provider=StubProvider())
+            self.assertNotIn(balance, service._get_system_prompt())
+            replies.append(service.get_response('Should I consolidate?'))
+        self.assertEqual(replies[0], replies[1])
+        self.assertEqual(Message.objects.filter(is_user=False, content=replies[0]).count(), 2)
+
+        admin = User.objects.create_user('admin', is_staff=True)
+        request = APIRequestFactory().get('/api/response-cache-stats/')
+        force_authenticate(request, user=admin)
+        response = ResponseCacheStatsAPIView.as_view()(request)
+        self.assertEqual((response.data['hit'], response.data['miss']), (1, 1))
@@ -8,4 +8,5 @@ router.register(r'gamification', views.GamificationViewSet, basename='gamificati
 
 urlpatterns = [
     path('api/', include(router.urls)),
+    path('api/response-cache-stats/', views.ResponseCacheStatsAPIView.as_view(), name='response-cache-stats'),
 ] 
\ No newline at end of file
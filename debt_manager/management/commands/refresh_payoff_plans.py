@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from debt_manager.payoff import refresh_payment_plans
+
+class Command(BaseCommand):
+    help = 'Recompute estimated payoff dates for every debt payment plan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Limit to these user ids')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users simulated together')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stats = refresh_payment_plans(options['user'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {stats['plans']} plans for {stats['users']} users in "
+            f"{time.monotonic() - started:.1f}s ({stats['unpayable']} not payable within the horizon)"
+        ))
@@ -0,0 +1,46 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from debt_manager.scenarios import ScenarioEngine
+
+class Command(BaseCommand):
+    help = 'Run Monte Carlo payoff what-ifs for users with debts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Limit to these user ids')
+        parser.add_argument('--paths', type=int, default=20000)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--time-budget', type=float, default=0, help='Seconds per user; 0 for no limit')
+        parser.add_argument('--income-change', type=float, default=0.0, help='e.g. -0.2 for 20%% less income')
+        parser.add_argument('--expense-change', type=float, default=0.0)
+        parser.add_argument('--rate-change', type=float, default=0.0, help='APR percentage points')
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(debtaccount__balance__gt=0).distinct()
+        if options['user']:
+            users = users.filter(pk__in=options['user'])
+
+        # One pool for the whole run instead of one per user
+        executor = ProcessPoolExecutor(max_workers=options['workers']) if options['workers'] > 1 else None
+        try:
+            for user in users:
+                engine = ScenarioEngine(
+                    user,
+                    paths=options['paths'],
+                    time_budget=options['time_budget'],
+                    workers=options['workers'],
+                    seed=options['seed'],
+                    executor=executor
+                )
+                result = engine.run(
+                    income_change=options['income_change'],
+                    expense_change=options['expense_change'],
+                    rate_change=options['rate_change']
+                )
+                self.stdout.write(json.dumps({'user': user.pk, **result}, cls=DjangoJSONEncoder))
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
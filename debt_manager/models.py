@@ -6,6 +6,7 @@ class DebtAccount(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
     balance = models.DecimalField(max_digits=10, decimal_places=2)
+    original_balance = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # Balance when added
     interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
     minimum_payment = models.DecimalField(max_digits=10, decimal_places=2)
     due_date = models.DateField()
@@ -0,0 +1,201 @@
+from collections import defaultdict
+from decimal import Decimal
+import numpy as np
+from django.utils import timezone
+from .models import DebtAccount, DebtPaymentPlan
+
+MAX_MONTHS = 600
+PAID = 0.005  # Balances under half a cent count as paid off
+
+def add_months(day, months):
+    """First day of the month `months` after `day`"""
+    month = day.month - 1 + months
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
+
+def round_money(value):
+    return Decimal(str(round(float(value), 2))).quantize(Decimal('0.01'))
+
+def priority_order(balances, rates, strategy):
+    """Index order paying extra to the smallest balance (snowball) or highest rate (avalanche) first"""
+    if strategy == 'SNOWBALL':
+        return np.lexsort((-rates, balances))
+    return np.lexsort((balances, -rates))
+
+def simulate(balances, rates, minimums, budgets, max_months=MAX_MONTHS, record_schedule=False, rollover=True):
+    """Amortize a batch of debt sets month by month.
+
+    balances, rates (APR percent) and minimums have shape (sets, debts)
+    with each row already in payment-priority order; zero rows pad short
+    sets. budgets has shape (sets,). Each month every open debt accrues
+    interest and gets its minimum, and whatever is left of the budget,
+    including minimums freed by paid-off debts, goes down the priority
+    order. With rollover=False each debt only ever gets its own minimum
+    and budgets are ignored. Returns the payoff month per debt (-1 if not
+    within max_months), interest per debt and optionally (payments,
+    balances) per month.
+    """
+    balance = np.array(balances, dtype=float)
+    monthly_rate = np.asarray(rates, dtype=float) / 1200
+    minimums = np.asarray(minimums, dtype=float)
+    budgets = np.maximum(np.asarray(budgets, dtype=float), minimums.sum(axis=1))[:, None]
+
+    payoff = np.where(balance > PAID, -1, 0)
+    interest = np.zeros_like(balance)
+    schedule = []
+
+    for month in range(1, max_months + 1):
+        open_debts = balance > PAID
+        if not open_debts.any():
+            break
+        accrued = np.where(open_debts, balance * monthly_rate, 0.0)
+        balance += accrued
+        interest += accrued
+
+        required = np.minimum(minimums, balance)
+        remaining = balance - required
+        spare = np.maximum(budgets - required.sum(axis=1, keepdims=True), 0.0) if rollover else 0.0
+        # Extra covers each debt in order once everything ahead of it is cleared
+        ahead = np.cumsum(remaining, axis=1) - remaining
+        payment = required + np.clip(spare - ahead, 0.0, remaining)
+        balance -= payment
+
+        payoff[open_debts & (balance <= PAID)] = month
+        if record_schedule:
+            schedule.append((payment, balance.copy()))
+
+    return payoff, interest, schedule
+
+class PayoffSimulator:
+    """Payoff timeline for one user's debts under a strategy and monthly budget.
+
+    The budget defaults to the user's plan target payments, the strategy to
+    the plans' strategy.
+    """
+
+    def __init__(self, user, monthly_budget=None, strategy=None, today=None, debts=None):
+        self.user = user
+        self.today = today or timezone.now().date()
+        self.debts = list(debts if debts is not None else DebtAccount.objects.filter(user=user, balance__gt=0))
+        plans = list(DebtPaymentPlan.objects.filter(user=user))
+        self.strategy = strategy or (plans[0].strategy if plans else 'AVALANCHE')
+        if monthly_budget is None:
+            monthly_budget = sum((plan.target_payment for plan in plans), Decimal('0'))
+        self.monthly_budget = Decimal(monthly_budget)
+
+    def run(self, record_schedule=True):
+        if not self.debts:
+            return {'strategy': self.strategy, 'monthly_budget': self.monthly_budget, 'months': 0,
+                    'debt_free_date': self.today, 'total_interest': Decimal('0.00'), 'debts': [], 'schedule': []}
+
+        balances = np.array([float(debt.balance) for debt in self.debts])
+        rates = np.array([float(debt.interest_rate) for debt in self.debts])
+        minimums = np.array([float(debt.minimum_payment) for debt in self.debts])
+        order = priority_order(balances, rates, self.strategy)
+        debts = [self.debts[i] for i in order]
+
+        payoff, interest, schedule = simulate(
+            balances[order][None], rates[order][None], minimums[order][None],
+            [float(self.monthly_budget)], record_schedule=record_schedule
+        )
+        payoff, interest = payoff[0], interest[0]
+        start = self.today.replace(day=1)
+        months = int(payoff.max()) if (payoff >= 0).all() else None
+
+        return {
+            'strategy': self.strategy,
+            'monthly_budget': self.monthly_budget,
+            'months': months,
+            'debt_free_date': add_months(start, months) if months is not None else None,
+            'total_interest': round_money(interest.sum()),
+            'debts': [
+                {
+                    'id': debt.id,
+                    'name': debt.name,
+                    'months': int(payoff[i]) if payoff[i] >= 0 else None,
+                    'payoff_date': add_months(start, int(payoff[i])) if payoff[i] >= 0 else None,
+                    'interest': round_money(interest[i]),
+                }
+                for i, debt in enumerate(debts)
+            ],
+            'schedule': [
+                {
+                    'month': add_months(start, n + 1),
+                    'payments': [round_money(value) for value in payments[0]],
+                    'balances': [round_money(max(value, 0)) for value in balances_after[0]],
+                }
+                for n, (payments, balances_after) in enumerate(schedule)
+            ],
+        }
+
+    def save(self):
+        """Write estimated payoff dates onto the user's payment plans"""
+        result = self.run(record_schedule=False)
+        payoff_dates = {debt['id']: debt['payoff_date'] for debt in result['debts']}
+        plans = [
+            plan for plan in DebtPaymentPlan.objects.filter(user=self.user)
+            if payoff_dates.get(plan.debt_account_id)
+        ]
+        for plan in plans:
+            plan.estimated_payoff_date = payoff_dates[plan.debt_account_id]
+        DebtPaymentPlan.objects.bulk_update(plans, ['estimated_payoff_date'])
+        return result
+
+def refresh_payment_plans(user_ids=None, chunk_size=1000, today=None):
+    """Recompute estimated_payoff_date for every plan, many users per simulation.
+
+    Users are padded into (users, max_debts) matrices chunk by chunk, so the
+    monthly loop runs once per chunk rather than once per user.
+    """
+    today = today or timezone.now().date()
+    start = today.replace(day=1)
+    plans = DebtPaymentPlan.objects.all()
+    if user_ids is not None:
+        plans = plans.filter(user_id__in=user_ids)
+
+    plans_by_user = defaultdict(list)
+    for plan in plans.only('id', 'user_id', 'debt_account_id', 'target_payment', 'strategy'):
+        plans_by_user[plan.user_id].append(plan)
+    debts_by_user = defaultdict(list)
+    for row in DebtAccount.objects.filter(user_id__in=list(plans_by_user), balance__gt=0).values_list(
+        'user_id', 'id', 'balance', 'interest_rate', 'minimum_payment'
+    ):
+        debts_by_user[row[0]].append(row[1:])
+
+    stats = {'users': 0, 'plans': 0, 'unpayable': 0}
+    users = [user_id for user_id in plans_by_user if debts_by_user[user_id]]
+    for offset in range(0, len(users), chunk_size):
+        chunk = users[offset:offset + chunk_size]
+        width = max(len(debts_by_user[user_id]) for user_id in chunk)
+        shape = (len(chunk), width)
+        balances, rates, minimums = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        ids = np.zeros(shape, dtype=np.int64)
+        budgets = np.zeros(len(chunk))
+
+        for row, user_id in enumerate(chunk):
+            debts = np.array([[pk, balance, rate, minimum] for pk, balance, rate, minimum in debts_by_user[user_id]], dtype=float)
+            order = priority_order(debts[:, 1], debts[:, 2], plans_by_user[user_id][0].strategy)
+            count = len(order)
+            ids[row, :count] = debts[order, 0]
+            balances[row, :count] = debts[order, 1]
+            rates[row, :count] = debts[order, 2]
+            minimums[row, :count] = debts[order, 3]
+            budgets[row] = float(sum(plan.target_payment for plan in plans_by_user[user_id]))
+
+        payoff, _, _ = simulate(balances, rates, minimums, budgets)
+
+        updated = []
+        for row, user_id in enumerate(chunk):
+            months = {int(pk): int(month) for pk, month in zip(ids[row], payoff[row]) if pk}
+            for plan in plans_by_user[user_id]:
+                if plan.debt_account_id not in months:
+                    continue  # Already paid off
+                month = months[plan.debt_account_id]
+                if month < 0:
+                    stats['unpayable'] += 1
+                    continue
+                plan.estimated_payoff_date = add_months(start, month)
+                updated.append(plan)
+        DebtPaymentPlan.objects.bulk_update(updated, ['estimated_payoff_date'], batch_size=1000)
+        stats['users'] += len(chunk)
+        stats['plans'] += len(updated)
+    return stats
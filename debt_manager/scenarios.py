@@ -0,0 +1,216 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from budget_tracker.models import Expense
+from .models import DebtAccount, DebtPaymentPlan, Income
+from .payoff import MAX_MONTHS, PAID, add_months, priority_order
+
+MONTHLY_FACTORS = {
+    'WEEKLY': 52 / 12,
+    'BIWEEKLY': 26 / 12,
+    'MONTHLY': 1,
+    'ANNUAL': 1 / 12,
+}
+VARIABLE_RATE_TYPES = ('CREDIT_CARD', 'PERSONAL_LOAN', 'OTHER')
+PERCENTILES = (10, 50, 90)
+
+def simulate_paths(inputs, paths, months, seed):
+    """Payoff of one debt set along `paths` sampled income/expense/rate paths.
+
+    Pure NumPy so it can run in a worker process. Each path draws one rate
+    shift for variable-rate debts, then every month draws income around the
+    base and an expense month from history; the payment budget is what is
+    left (capped at the plan budget). Without income data (income None)
+    the budget is the plan budget every month. Short months pay minimums
+    pro rata and are counted as misses.
+    """
+    rng = np.random.default_rng(seed)
+    balance = np.tile(inputs['balances'], (paths, 1))
+    shift = rng.normal(inputs['rate_change'], inputs['rate_volatility'], (paths, 1))
+    monthly_rate = np.maximum(inputs['rates'] + inputs['variable'] * shift, 0.0) / 1200
+    minimums = inputs['minimums']
+    sigma = inputs['income_volatility']
+
+    payoff = np.where(balance > PAID, -1, 0)
+    missed_months = np.zeros(paths, dtype=np.int32)
+
+    for month in range(1, months + 1):
+        open_debts = balance > PAID
+        if not open_debts.any():
+            break
+        if inputs['income'] is None:
+            budget = np.full(paths, inputs['plan_budget'])
+        else:
+            income = inputs['income'] * rng.lognormal(-sigma ** 2 / 2, sigma, paths)
+            expenses = rng.choice(inputs['expenses'], paths)
+            budget = np.maximum(income - expenses, 0.0)
+            if inputs['plan_budget']:
+                budget = np.minimum(budget, inputs['plan_budget'])
+
+        balance += np.where(open_debts, balance * monthly_rate, 0.0)
+        required = np.minimum(minimums, balance)
+        due = required.sum(axis=1)
+        short = budget < due - PAID
+        missed_months += short
+        scale = np.where(short, budget / np.where(due > 0, due, 1.0), 1.0)[:, None]
+
+        remaining = balance - required
+        spare = np.maximum(budget - due, 0.0)[:, None]
+        ahead = np.cumsum(remaining, axis=1) - remaining
+        balance -= required * scale + np.clip(spare - ahead, 0.0, remaining)
+        payoff[open_debts & (balance <= PAID)] = month
+
+    return payoff, missed_months
+
+class ScenarioEngine:
+    """Monte Carlo what-if payoff for one user.
+
+    `paths` trades precision for time: interactive calls use the defaults
+    and a time budget, batch jobs raise paths and workers. Paths run in
+    chunks; with workers > 1 chunks are spread over a process pool, which
+    batch callers create once and pass in as `executor`. When the time
+    budget runs out, the answer is built from the chunks that finished and
+    flagged approximate.
+    """
+
+    def __init__(self, user, paths=None, time_budget=None, workers=None, chunk_size=None, seed=None, today=None,
+                 executor=None):
+        config = settings.DEBT_SCENARIOS
+        self.user = user
+        self.paths = paths or config['paths']
+        self.time_budget = time_budget if time_budget is not None else config['time_budget']
+        self.workers = workers or config['workers']
+        self.chunk_size = chunk_size or config['chunk_size']
+        self.seed = seed
+        self.today = today or timezone.now().date()
+        self.executor = executor
+
+    def get_inputs(self, income_change=0.0, expense_change=0.0, rate_change=0.0):
+        """Base arrays from the user's debts, incomes, plans and expense history.
+
+        Expense history is the last 12 complete months. With no Income rows
+        income is None and the simulation pays the plan budget (or just the
+        minimums without a plan) instead of drawing income and expenses.
+        """
+        config = settings.DEBT_SCENARIOS
+        debts = list(DebtAccount.objects.filter(user=self.user, balance__gt=0))
+        plans = list(DebtPaymentPlan.objects.filter(user=self.user))
+        strategy = plans[0].strategy if plans else 'AVALANCHE'
+
+        balances = np.array([float(debt.balance) for debt in debts])
+        rates = np.array([float(debt.interest_rate) for debt in debts])
+        order = priority_order(balances, rates, strategy)
+        debts = [debts[i] for i in order]
+
+        incomes = list(Income.objects.filter(user=self.user).values_list('amount', 'frequency'))
+        income = sum(float(amount) * MONTHLY_FACTORS.get(frequency, 1) for amount, frequency in incomes)
+        minimums = np.array([float(debt.minimum_payment) for debt in debts])
+        plan_budget = sum(float(plan.target_payment) for plan in plans)
+        month_start = self.today.replace(day=1)
+        history = [
+            float(row['total'])
+            for row in Expense.objects.filter(
+                user=self.user, date__gte=add_months(month_start, -12), date__lt=month_start
+            ).annotate(
+                month=TruncMonth('date')
+            ).values('month').annotate(total=Sum('amount'))
+        ] or [0.0]
+
+        return {
+            'debts': debts,
+            'strategy': strategy,
+            'balances': balances[order],
+            'rates': rates[order],
+            'minimums': minimums,
+            'variable': np.array([1.0 if debt.debt_type in VARIABLE_RATE_TYPES else 0.0 for debt in debts]),
+            'income': income * (1 + income_change) if incomes else None,
+            'expenses': np.array(history) * (1 + expense_change),
+            'plan_budget': plan_budget if plan_budget or incomes else float(minimums.sum()),
+            'income_volatility': config['income_volatility'],
+            'rate_volatility': config['rate_volatility'],
+            'rate_change': rate_change,
+        }
+
+    def run(self, income_change=0.0, expense_change=0.0, rate_change=0.0, months=MAX_MONTHS):
+        """Percentile payoff dates and miss probabilities for a what-if.
+
+        income_change and expense_change are fractions (-0.2 = 20% less),
+        rate_change is in APR percentage points.
+        """
+        started = time.monotonic()
+        inputs = self.get_inputs(income_change, expense_change, rate_change)
+        debts = inputs.pop('debts')
+        strategy = inputs.pop('strategy')
+        income_data = inputs['income'] is not None
+        if not debts:
+            return {'strategy': strategy, 'paths': 0, 'approximate': False, 'income_data': income_data, 'debt_free': {},
+                    'probability_debt_free': 1.0, 'probability_missed_minimum': 0.0,
+                    'expected_missed_months': 0.0, 'debts': [], 'elapsed': 0.0}
+
+        chunks = [min(self.chunk_size, self.paths - offset) for offset in range(0, self.paths, self.chunk_size)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(chunks))
+        results = self._run_chunks(inputs, chunks, seeds, months, started)
+
+        payoff = np.concatenate([r[0] for r in results])
+        missed = np.concatenate([r[1] for r in results])
+        debt_free = np.where((payoff >= 0).all(axis=1), payoff.max(axis=1), np.inf)
+        start = self.today.replace(day=1)
+
+        return {
+            'strategy': strategy,
+            'paths': len(payoff),
+            'approximate': len(payoff) < self.paths,
+            'income_data': income_data,
+            'debt_free': self._percentile_dates(debt_free, start),
+            'probability_debt_free': round(float(np.isfinite(debt_free).mean()), 4),
+            'probability_missed_minimum': round(float((missed > 0).mean()), 4),
+            'expected_missed_months': round(float(missed.mean()), 2),
+            'debts': [
+                {
+                    'id': debt.id,
+                    'name': debt.name,
+                    'payoff': self._percentile_dates(np.where(payoff[:, i] >= 0, payoff[:, i], np.inf), start),
+                }
+                for i, debt in enumerate(debts)
+            ],
+            'elapsed': round(time.monotonic() - started, 3),
+        }
+
+    def _run_chunks(self, inputs, chunks, seeds, months, started):
+        deadline = started + self.time_budget if self.time_budget else None
+        results = []
+        if self.workers <= 1 or len(chunks) == 1:
+            for size, seed in zip(chunks, seeds):
+                results.append(simulate_paths(inputs, size, months, seed))
+                if deadline and time.monotonic() > deadline:
+                    break
+            return results
+
+        executor = self.executor or ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            futures = [executor.submit(simulate_paths, inputs, size, months, seed) for size, seed in zip(chunks, seeds)]
+            timeout = max(deadline - time.monotonic(), 0) if deadline else None
+            done, _ = wait(futures, timeout=timeout)
+            results = [future.result() for future in futures if future in done]
+        finally:
+            # Don't wait on chunks that missed the deadline
+            if executor is self.executor:
+                for future in futures:
+                    future.cancel()
+            else:
+                executor.shutdown(wait=False, cancel_futures=True)
+        if not results:
+            # Always answer with at least one chunk
+            results.append(simulate_paths(inputs, chunks[0], months, seeds[0]))
+        return results
+
+    def _percentile_dates(self, months, start):
+        values = np.percentile(months, PERCENTILES, method='higher')
+        return {
+            f'p{p}': add_months(start, int(value)) if np.isfinite(value) else None
+            for p, value in zip(PERCENTILES, values)
+        }
@@ -0,0 +1,236 @@
+from datetime import date
+from decimal import Decimal
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from budget_tracker.models import Category, Expense
+from .allocation import ExtraPaymentAllocator
+from .models import DebtAccount, DebtPaymentPlan, Income
+from .payoff import PayoffSimulator, priority_order, refresh_payment_plans, simulate
+from .scenarios import ScenarioEngine
+
+def reference_payoff(balances, rates, minimums, budget, max_months=600):
+    """Scalar month-by-month amortization with minimums rolled over in list order"""
+    balances = list(balances)
+    payoff = [0 if balance <= 0.005 else -1 for balance in balances]
+    interest = [0.0] * len(balances)
+    for month in range(1, max_months + 1):
+        if all(balance <= 0.005 for balance in balances):
+            break
+        for i, balance in enumerate(balances):
+            if balance > 0.005:
+                accrued = balance * rates[i] / 1200
+                balances[i] += accrued
+                interest[i] += accrued
+        payments = [min(minimum, balance) for minimum, balance in zip(minimums, balances)]
+        spare = max(budget - sum(payments), 0.0)
+        for i, balance in enumerate(balances):
+            extra = min(spare, balance - payments[i])
+            payments[i] += extra
+            spare -= extra
+        for i, payment in enumerate(payments):
+            was_open = balances[i] > 0.005
+            balances[i] -= payment
+            if was_open and balances[i] <= 0.005:
+                payoff[i] = month
+    return payoff, interest
+
+class PayoffTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('borrower')
+
+    def debt(self, name, balance, rate, minimum, user=None, debt_type='CREDIT_CARD'):
+        return DebtAccount.objects.create(
+            user=user or self.user, name=name, balance=Decimal(balance), interest_rate=Decimal(rate),
+            minimum_payment=Decimal(minimum), due_date=date(2024, 1, 15), debt_type=debt_type
+        )
+
+    def plan(self, debt, target, strategy='AVALANCHE'):
+        return DebtPaymentPlan.objects.create(
+            user=debt.user, debt_account=debt, target_payment=Decimal(target), strategy=strategy,
+            estimated_payoff_date=date(2030, 1, 1)
+        )
+
+class PayoffSimulatorTests(PayoffTestCase):
+    def test_simulate_matches_a_scalar_amortization(self):
+        balances = np.array([2500.0, 800.0, 4000.0])
+        rates = np.array([22.9, 7.5, 12.0])
+        minimums = np.array([60.0, 25.0, 80.0])
+        for strategy in ('AVALANCHE', 'SNOWBALL'):
+            order = priority_order(balances, rates, strategy)
+            payoff, interest, _ = simulate(balances[order][None], rates[order][None], minimums[order][None], [400.0])
+            expected_payoff, expected_interest = reference_payoff(
+                balances[order], rates[order], minimums[order], 400.0
+            )
+            self.assertEqual(payoff[0].tolist(), expected_payoff, strategy)
+            np.testing.assert_allclose(interest[0], expected_interest, rtol=1e-9)
+
+    def test_batched_rows_are_independent(self):
+        single = simulate([[1000.0, 0.0]], [[18.0, 0.0]], [[40.0, 0.0]], [100.0])
+        batch = simulate([[1000.0, 0.0], [300.0, 900.0]], [[18.0, 0.0], [5.0, 20.0]],
+                         [[40.0, 0.0], [20.0, 30.0]], [100.0, 200.0])
+        self.assertEqual(batch[0][0].tolist(), single[0][0].tolist())
+        np.testing.assert_allclose(batch[1][0], single[1][0])
+
+    def test_interest_free_debt_pays_off_on_schedule(self):
+        debt = self.debt('Furniture', '1200', '0', '100')
+        result = PayoffSimulator(self.user, monthly_budget=100, today=date(2024, 3, 10)).run()
+        self.assertEqual(result['months'], 12)
+        self.assertEqual(result['debt_free_date'], date(2025, 3, 1))
+        self.assertEqual(result['total_interest'], Decimal('0.00'))
+        self.assertEqual(result['schedule'][0]['balances'], [Decimal('1100.00')])
+        self.assertEqual(result['debts'][0]['id'], debt.pk)
+
+    def test_snowball_clears_the_smallest_balance_first(self):
+        self.debt('Card', '3000', '24', '75')
+        small = self.debt('Store card', '400', '10', '25')
+        result = PayoffSimulator(self.user, monthly_budget=400, strategy='SNOWBALL').run()
+        self.assertEqual(result['debts'][0]['id'], small.pk)
+        self.assertLess(result['debts'][0]['months'], result['debts'][1]['months'])
+
+    def test_unpayable_debts_have_no_payoff_date(self):
+        self.debt('Payday loan', '5000', '60', '100')
+        result = PayoffSimulator(self.user, monthly_budget=100).run(record_schedule=False)
+        self.assertIsNone(result['months'])
+        self.assertIsNone(result['debts'][0]['payoff_date'])
+
+    def test_batched_refresh_matches_per_user_simulation(self):
+        other = User.objects.create_user('other')
+        plans = [
+            self.plan(self.debt('Card', '2500', '22.9', '60'), '300'),
+            self.plan(self.debt('Loan', '6000', '6.5', '120'), '150'),
+            self.plan(self.debt('Card', '900', '19', '30', user=other), '90', strategy='SNOWBALL'),
+            self.plan(self.debt('Car', '7000', '4', '200', user=other), '250', strategy='SNOWBALL'),
+        ]
+        stats = refresh_payment_plans(chunk_size=1, today=date(2024, 3, 10))
+        self.assertEqual(stats, {'users': 2, 'plans': 4, 'unpayable': 0})
+        refreshed = {plan.pk: plan.estimated_payoff_date for plan in DebtPaymentPlan.objects.all()}
+
+        for user in (self.user, other):
+            result = PayoffSimulator(user, today=date(2024, 3, 10)).run(record_schedule=False)
+            for debt in result['debts']:
+                plan = next(plan for plan in plans if plan.debt_account_id == debt['id'])
+                self.assertEqual(refreshed[plan.pk], debt['payoff_date'])
+
+class ScenarioEngineTests(PayoffTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = date(2024, 3, 10)
+
+    def expenses(self, *totals):
+        category = Category.objects.create(user=self.user, name='Living', budget_limit=Decimal('2000'))
+        for month, total in enumerate(totals, start=1):
+            Expense.objects.create(
+                user=self.user, category=category, amount=Decimal(total), date=date(2023, month, 15),
+                description='test', is_essential=True
+            )
+
+    def engine(self, **kwargs):
+        kwargs.setdefault('paths', 200)
+        kwargs.setdefault('chunk_size', 100)
+        kwargs.setdefault('seed', 7)
+        return ScenarioEngine(self.user, today=self.today, workers=1, time_budget=0, **kwargs)
+
+    def test_no_debts(self):
+        result = self.engine().run()
+        self.assertEqual(result['paths'], 0)
+        self.assertEqual(result['probability_debt_free'], 1.0)
+        self.assertEqual(result['debts'], [])
+
+    def test_without_income_fixed_rate_debts_follow_the_plan(self):
+        self.plan(self.debt('Student', '8000', '5', '90', debt_type='STUDENT_LOAN'), '200')
+        self.plan(self.debt('Home', '3000', '3', '50', debt_type='MORTGAGE'), '100')
+        result = self.engine().run()
+        expected = PayoffSimulator(self.user, today=self.today).run(record_schedule=False)
+
+        self.assertFalse(result['income_data'])
+        self.assertEqual(set(result['debt_free'].values()), {expected['debt_free_date']})
+        self.assertEqual(result['probability_debt_free'], 1.0)
+        self.assertEqual(result['probability_missed_minimum'], 0.0)
+        self.assertEqual(
+            {debt['id']: debt['payoff']['p50'] for debt in result['debts']},
+            {debt['id']: debt['payoff_date'] for debt in expected['debts']}
+        )
+
+    def test_same_seed_same_answer(self):
+        self.debt('Card', '4000', '21', '100')
+        Income.objects.create(user=self.user, source='Salary', amount=Decimal('3000'), frequency='MONTHLY')
+        self.expenses('2400', '2600', '2500')
+        first = self.engine().run()
+        second = self.engine().run()
+        first.pop('elapsed'), second.pop('elapsed')
+        self.assertEqual(first, second)
+        self.assertTrue(first['income_data'])
+
+    def test_expense_shock_raises_missed_minimums(self):
+        self.debt('Card', '4000', '21', '150')
+        Income.objects.create(user=self.user, source='Salary', amount=Decimal('3000'), frequency='MONTHLY')
+        self.expenses('2400', '2600', '2500')
+        base = self.engine().run()
+        shocked = self.engine().run(expense_change=0.2)
+        self.assertLess(base['probability_missed_minimum'], shocked['probability_missed_minimum'])
+        self.assertEqual(shocked['probability_missed_minimum'], 1.0)
+        self.assertGreater(shocked['expected_missed_months'], base['expected_missed_months'])
+
+    def test_exhausted_time_budget_is_flagged_approximate(self):
+        self.debt('Card', '4000', '21', '100')
+        result = ScenarioEngine(
+            self.user, paths=300, chunk_size=100, workers=1, time_budget=1e-9, seed=1, today=self.today
+        ).run()
+        self.assertEqual(result['paths'], 100)
+        self.assertTrue(result['approximate'])
+        self.assertFalse(self.engine().run()['approximate'])
+
+class ExtraPaymentAllocatorTests(PayoffTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.card = self.debt('Card', '6000', '24.99', '150')
+        self.car = self.debt('Car', '1500', '9.9', '40', debt_type='PERSONAL_LOAN')
+        self.store = self.debt('Store card', '3000', '17.5', '75')
+
+    def allocator(self, spare='250'):
+        return ExtraPaymentAllocator(self.user, spare, today=date(2024, 3, 10))
+
+    def test_extra_goes_to_the_highest_rate(self):
+        payments = self.allocator().allocate()['payments']
+        self.assertEqual([payment['id'] for payment in payments], [self.card.pk, self.store.pk, self.car.pk])
+        self.assertEqual([payment['extra'] for payment in payments], [Decimal('250.00'), 0, 0])
+        self.assertEqual(payments[0]['target_payment'], Decimal('400.00'))
+
+    def test_avalanche_beats_snowball(self):
+        result = self.allocator().allocate()
+        snowball = PayoffSimulator(self.user, monthly_budget=515, strategy='SNOWBALL', today=date(2024, 3, 10)).run()
+        self.assertEqual(result['total_interest'], Decimal('2328.30'))
+        self.assertEqual(snowball['total_interest'], Decimal('2929.61'))
+        self.assertEqual(result['months'], 25)
+        self.assertEqual(snowball['months'], 27)
+        self.assertGreater(result['interest_saved'], 0)
+
+    def test_results_are_cached_until_a_debt_changes(self):
+        allocator = self.allocator()
+        first = allocator.allocate()
+        self.assertEqual(cache.get(f'debt_manager:allocation:{self.user.pk}:{allocator.fingerprint}'), first)
+
+        self.card.balance = Decimal('5000')
+        self.card.save()
+        changed = self.allocator()
+        self.assertNotEqual(changed.fingerprint, allocator.fingerprint)
+        self.assertLess(changed.allocate()['total_interest'], first['total_interest'])
+        self.assertNotEqual(self.allocator('300').fingerprint, changed.fingerprint)
+
+    def test_save_writes_avalanche_plans_only(self):
+        self.plan(self.card, '150')
+        result = self.allocator().save()
+        plans = {plan.debt_account_id: plan for plan in DebtPaymentPlan.objects.filter(user=self.user)}
+        self.assertEqual(len(plans), 3)
+        for payment in result['payments']:
+            self.assertEqual(plans[payment['id']].target_payment, payment['target_payment'])
+            self.assertEqual(plans[payment['id']].estimated_payoff_date, payment['payoff_date'])
+
+        DebtPaymentPlan.objects.filter(user=self.user).update(strategy='SNOWBALL', target_payment=Decimal('10'))
+        cache.clear()
+        self.allocator('400').save()
+        targets = DebtPaymentPlan.objects.filter(user=self.user).values_list('target_payment', flat=True)
+        self.assertEqual(set(targets), {Decimal('10')})
@@ -25,6 +25,20 @@ QUICKBOOKS_CLIENT_ID = 'your_client_id'
 QUICKBOOKS_CLIENT_SECRET = 'your_client_secret'
 QUICKBOOKS_REDIRECT_URI = 'your_redirect_uri'
 QUICKBOOKS_ENVIRONMENT = 'sandbox'  # or 'production'
+QUICKBOOKS_API_URL = None  # Override the v3 API base, e.g. a local fake for benchmarks
+QUICKBOOKS_PAGE_SIZE = 1000
+
+# Integration sync scheduler; rate is requests per second per provider
+INTEGRATION_SYNC = {
+    'interval_minutes': 60,
+    'workers': 8,
+    'max_attempts': 5,
+    'progress_seconds': 30,
+    'pooled_clients': 1000,
+    'providers': {
+        'quickbooks': {'concurrency': 4, 'rate': 8, 'burst': 16},
+    },
+}
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -38,5 +52,64 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20
 }
 
+# Bulk journal ingestion
+BOOKKEEPING_BULK_CHUNK_SIZE = 500
+BOOKKEEPING_BULK_MAX_ENTRIES = 50000
+
+# Trailing window (days) for flow-based metrics such as operating cash flow
+BOOKKEEPING_METRICS_WINDOW_DAYS = 365
+
+# Upper bounds for the analytics endpoint's periods/rolling (per freq) and windows (days);
+# larger requests are clamped
+BOOKKEEPING_ANALYTICS_MAX_PERIODS = {'month': 120, 'day': 3660}
+BOOKKEEPING_ANALYTICS_MAX_WINDOWS = 10
+
+# Serialized dashboard/metrics payloads, keyed by ledger version
+BOOKKEEPING_RESPONSE_CACHE_TIMEOUT = 86400
+
+# Monte Carlo payoff scenarios; volatility is the income lognormal sigma and
+# the APR standard deviation (percentage points) for variable-rate debts
+DEBT_SCENARIOS = {
+    'paths': 2000,
+    'chunk_size': 1000,
+    'workers': 1,
+    'time_budget': 2.0,
+    'income_volatility': 0.1,
+    'rate_volatility': 1.0,
+}
+
+# Memoized extra-payment allocations; keys change whenever a balance or rate does
+DEBT_ALLOCATION_CACHE_TIMEOUT = 86400
+
+# Gamification catalogs are cached per process; each process looks at the
+# shared catalog version at most this often
+GAMIFICATION_CATALOG_CHECK_SECONDS = 5
+# Active-user count behind rank percentiles is shared for this long
+GAMIFICATION_POPULATION_CACHE_SECONDS = 300
+
+# Daily per-user batch jobs (reminders, achievements), split into user-id chunks;
+# a RUNNING chunk older than stale_after_minutes is assumed crashed and re-claimed
+DAILY_CHECKS = {
+    'chunk_size': 500,
+    'batch_size': 100,  # Users evaluated together inside a chunk
+    'workers': 4,
+    'stale_after_minutes': 30,
+    'reminder_batch_size': 500,
+}
+
 # OpenAI API settings
-OPENAI_API_KEY = 'your_openai_api_key'
\ No newline at end of file
+OPENAI_API_KEY = 'your_openai_api_key'
+# Advisor replies are cached by normalized message and a banded profile of the
+# session context; store is 'local' (per-process LRU) or 'django' (cache_alias).
+# provider 'stub' answers deterministically offline after stub_latency seconds
+DEBT_ADVISOR_RESPONSES = {
+    'provider': 'openai',
+    'model': 'gpt-4',
+    'temperature': 0.7,
+    'max_tokens': 150,
+    'store': 'local',
+    'cache_alias': 'default',
+    'max_entries': 1000,
+    'timeout': 86400,
+    'stub_latency': 0.0,
+}
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+class GoalsConfig(AppConfig):
+    name = 'goals'
+
+    def ready(self):
+        from . import signals  # noqa: F401
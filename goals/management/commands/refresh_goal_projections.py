@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from goals.models import FinancialGoal
+from goals.projections import refresh_goal_projections
+
+class Command(BaseCommand):
+    help = 'Recompute stored projections for every financial goal'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Limit to a single user id')
+
+    def handle(self, *args, **options):
+        goals = FinancialGoal.objects.all()
+        if options['user']:
+            goals = goals.filter(user_id=options['user'])
+        count = refresh_goal_projections(goals)
+        self.stdout.write(self.style.SUCCESS(f'Projected {count} goals'))
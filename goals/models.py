@@ -14,6 +14,32 @@ class FinancialGoal(models.Model):
         ('SAVINGS', 'Savings'),
         ('INVESTMENT', 'Investment'),
     ])
+    created_at = models.DateTimeField(auto_now_add=True, null=True)  # Null for goals predating the field
     
     def progress_percentage(self):
-        return (self.current_amount / self.target_amount) * 100 
\ No newline at end of file
+        return (self.current_amount / self.target_amount) * 100 
+
+class GoalContribution(models.Model):
+    """Net change in a goal's current_amount per month"""
+    goal = models.ForeignKey(FinancialGoal, on_delete=models.CASCADE, related_name='contributions')
+    month = models.DateField()  # First day of the month
+    amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ['goal', 'month']
+    
+    def __str__(self):
+        return f"{self.goal.title} {self.month:%Y-%m}: ${self.amount}"
+
+class GoalProjection(models.Model):
+    """Stored output of goals.projections for dashboard and advisor reads"""
+    goal = models.OneToOneField(FinancialGoal, on_delete=models.CASCADE, related_name='projection')
+    monthly_contribution = models.DecimalField(max_digits=10, decimal_places=2)
+    required_monthly = models.DecimalField(max_digits=10, decimal_places=2)
+    projected_completion = models.DateField(null=True, blank=True)  # None if not progressing
+    on_track = models.BooleanField(default=False)
+    risk = models.FloatField(default=0)  # 0 on track .. 1 no progress toward the deadline
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Projection for {self.goal.title}"
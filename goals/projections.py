@@ -0,0 +1,115 @@
+from datetime import timedelta
+from decimal import Decimal
+import numpy as np
+from django.db.models import F
+from django.utils import timezone
+from .models import FinancialGoal, GoalContribution, GoalProjection
+
+DAYS_PER_MONTH = 30.4375
+HISTORY_MONTHS = 6
+
+def month_start(day):
+    return day.replace(day=1)
+
+def _months_between(start, end):
+    return (end.year - start.year) * 12 + end.month - start.month
+
+def record_contribution(goal_id, amount, day=None):
+    """Add a change in current_amount to the goal's bucket for that month"""
+    if not amount:
+        return
+    month = month_start(day or timezone.now().date())
+    GoalContribution.objects.get_or_create(goal_id=goal_id, month=month)
+    GoalContribution.objects.filter(goal_id=goal_id, month=month).update(amount=F('amount') + amount)
+
+def refresh_goal_projections(goals=None, today=None, history_months=HISTORY_MONTHS):
+    """Project every goal in `goals` (default: all) in one vectorized pass.
+
+    The contribution rate is the mean of the complete months among the
+    last `history_months`, counting only months since the goal was created.
+    A goal younger than one complete month uses what it has received so
+    far, spread over at least a month. Required monthly is what is left
+    over the months to the deadline; risk is the share of that requirement
+    the current rate does not cover.
+    """
+    today = today or timezone.now().date()
+    goals = FinancialGoal.objects.all() if goals is None else goals
+    rows = list(goals.values_list('id', 'target_amount', 'current_amount', 'deadline', 'created_at'))
+    if not rows:
+        return 0
+
+    ids = [row[0] for row in rows]
+    index = {pk: i for i, pk in enumerate(ids)}
+    target = np.array([float(row[1]) for row in rows])
+    current = np.array([float(row[2]) for row in rows])
+    days_left = np.array([(row[3] - today).days for row in rows], dtype=float)
+
+    # Goals x months contribution matrix, oldest month first; the last
+    # column is the current, partial month
+    first_month = month_start(today)
+    for _ in range(history_months):
+        first_month = month_start(first_month - timedelta(days=1))
+    history = np.zeros((len(ids), history_months + 1))
+    contributions = GoalContribution.objects.filter(goal_id__in=ids, month__gte=first_month).values_list(
+        'goal_id', 'month', 'amount'
+    )
+    for goal_id, month, amount in contributions:
+        history[index[goal_id], _months_between(first_month, month)] += float(amount)
+
+    # First column each goal existed in, and whether that month is complete
+    created = [timezone.localdate(row[4]) if row[4] else None for row in rows]
+    opened = np.array([
+        max(_months_between(first_month, day), 0) if day else 0 for day in created
+    ])
+    first_full = opened + np.array([1 if day and day.day > 1 and day >= first_month else 0 for day in created])
+    columns = np.arange(history_months + 1)
+    complete = (columns >= first_full[:, None]) & (columns < history_months)
+    full_months = complete.sum(axis=1)
+    young_months = np.maximum(np.array([
+        (today - day).days / DAYS_PER_MONTH if day else 1.0 for day in created
+    ]), 1.0)
+    rate = np.where(
+        full_months > 0,
+        (history * complete).sum(axis=1) / np.maximum(full_months, 1),
+        (history * (columns >= opened[:, None])).sum(axis=1) / young_months
+    )
+    rate = np.maximum(rate, 0.0)
+    remaining = np.maximum(target - current, 0.0)
+    months_left = np.maximum(days_left / DAYS_PER_MONTH, 0.0)
+    required = np.where(remaining > 0, remaining / np.maximum(months_left, 1.0), 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        months_needed = np.where(remaining > 0, remaining / rate, 0.0)
+        coverage = np.where(required > 0, rate / required, 1.0)
+    risk = np.where(remaining > 0, np.clip(1.0 - coverage, 0.0, 1.0), 0.0)
+    on_track = (remaining <= 0) | (np.isfinite(months_needed) & (months_needed <= months_left))
+
+    projections = []
+    for i, pk in enumerate(ids):
+        completion = None
+        if np.isfinite(months_needed[i]):
+            completion = today + timedelta(days=int(np.ceil(months_needed[i] * DAYS_PER_MONTH)))
+        projections.append(GoalProjection(
+            goal_id=pk,
+            monthly_contribution=Decimal(str(round(rate[i], 2))),
+            required_monthly=Decimal(str(round(required[i], 2))),
+            projected_completion=completion,
+            on_track=bool(on_track[i]),
+            risk=round(float(risk[i]), 4),
+            computed_at=timezone.now()
+        ))
+    GoalProjection.objects.bulk_create(
+        projections,
+        update_conflicts=True,
+        unique_fields=['goal'],
+        update_fields=['monthly_contribution', 'required_monthly', 'projected_completion',
+                       'on_track', 'risk', 'computed_at'],
+        batch_size=1000
+    )
+    return len(projections)
+
+def ranked_goals(user):
+    """User's goals by priority (1 first), riskiest first within a priority, in one query"""
+    return FinancialGoal.objects.filter(user=user).select_related('projection').order_by(
+        'priority', F('projection__risk').desc(nulls_last=True), 'deadline'
+    )
@@ -0,0 +1,20 @@
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import receiver
+from .models import FinancialGoal
+from .projections import record_contribution, refresh_goal_projections
+
+@receiver(pre_save, sender=FinancialGoal)
+def remember_previous_amount(sender, instance, **kwargs):
+    instance._previous_amount = None
+    if instance.pk:
+        instance._previous_amount = FinancialGoal.objects.filter(pk=instance.pk).values_list(
+            'current_amount', flat=True
+        ).first()
+
+@receiver(post_save, sender=FinancialGoal)
+def track_contribution(sender, instance, created, **kwargs):
+    """The opening amount is a starting balance, so only later changes count as contributions"""
+    previous = getattr(instance, '_previous_amount', None)
+    if not created and previous is not None:
+        record_contribution(instance.pk, instance.current_amount - previous)
+    refresh_goal_projections(FinancialGoal.objects.filter(pk=instance.pk))
@@ -0,0 +1,104 @@
+from datetime import date, datetime
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from .models import FinancialGoal, GoalContribution, GoalProjection
+from .projections import ranked_goals, record_contribution, refresh_goal_projections
+
+TODAY = date(2024, 7, 15)
+
+def projection(goal):
+    return GoalProjection.objects.get(goal=goal)
+
+class GoalTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('saver')
+
+    def goal(self, title, target, current, deadline=date(2026, 7, 15), priority=3, created=None):
+        goal = FinancialGoal.objects.create(
+            user=self.user, title=title, target_amount=Decimal(target), current_amount=Decimal(current),
+            deadline=deadline, priority=priority, category='SAVINGS'
+        )
+        if created:
+            FinancialGoal.objects.filter(pk=goal.pk).update(created_at=timezone.make_aware(datetime(*created)))
+        return goal
+
+class GoalContributionTests(GoalTestCase):
+    def test_opening_amount_is_not_a_contribution(self):
+        self.goal('Holiday', '2000', '500')
+        self.assertFalse(GoalContribution.objects.exists())
+
+    def test_saves_net_into_one_row_per_month(self):
+        goal = self.goal('Holiday', '2000', '500')
+        for amount in ('650', '800', '700'):
+            goal.current_amount = Decimal(amount)
+            goal.save()
+        contribution = GoalContribution.objects.get(goal=goal)
+        self.assertEqual(contribution.amount, Decimal('200.00'))
+        self.assertEqual(contribution.month, timezone.now().date().replace(day=1))
+
+    def test_save_refreshes_the_projection(self):
+        goal = self.goal('Holiday', '2000', '2000')
+        self.assertTrue(projection(goal).on_track)
+        goal.target_amount = Decimal('3000')
+        goal.save()
+        self.assertEqual(projection(goal).risk, 1.0)
+
+class GoalProjectionTests(GoalTestCase):
+    def setUp(self):
+        super().setUp()
+        # Complete months in the window are January to June 2024
+        self.old = self.goal('House', '5000', '2000', created=(2023, 1, 1))
+        record_contribution(self.old.pk, Decimal('300'), date(2024, 3, 4))
+        record_contribution(self.old.pk, Decimal('300'), date(2024, 5, 4))
+        record_contribution(self.old.pk, Decimal('500'), date(2024, 7, 4))
+        self.recent = self.goal('Car', '3000', '1500', created=(2024, 3, 10))
+        record_contribution(self.recent.pk, Decimal('900'), date(2024, 3, 12))
+        record_contribution(self.recent.pk, Decimal('300'), date(2024, 4, 2))
+        record_contribution(self.recent.pk, Decimal('300'), date(2024, 6, 2))
+        self.young = self.goal('Laptop', '1200', '100', created=(2024, 7, 5))
+        record_contribution(self.young.pk, Decimal('100'), date(2024, 7, 6))
+        self.stalled = self.goal('Boat', '9000', '0', created=(2022, 1, 1))
+
+    def test_rate_averages_complete_months_since_creation(self):
+        self.assertEqual(refresh_goal_projections(today=TODAY), 4)
+        self.assertEqual(projection(self.old).monthly_contribution, Decimal('100.00'))
+        # March is partial (created on the 10th) and July is still running
+        self.assertEqual(projection(self.recent).monthly_contribution, Decimal('200.00'))
+        # Younger than a month: what it received so far, over one month
+        self.assertEqual(projection(self.young).monthly_contribution, Decimal('100.00'))
+
+    def test_required_rate_risk_and_completion(self):
+        refresh_goal_projections(today=TODAY)
+        old = projection(self.old)
+        months_left = (date(2026, 7, 15) - TODAY).days / 30.4375
+        self.assertEqual(old.required_monthly, Decimal(str(round(3000 / months_left, 2))))
+        self.assertAlmostEqual(old.risk, round(1 - 100 / (3000 / months_left), 4))
+        self.assertFalse(old.on_track)
+        self.assertEqual(old.projected_completion, date(2027, 1, 15))  # 30 months at 100
+
+        recent = projection(self.recent)
+        self.assertTrue(recent.on_track)
+        self.assertEqual(recent.risk, 0)
+
+        stalled = projection(self.stalled)
+        self.assertEqual(stalled.risk, 1.0)
+        self.assertIsNone(stalled.projected_completion)
+        self.assertFalse(stalled.on_track)
+
+    def test_batch_matches_one_goal_at_a_time(self):
+        fields = ('monthly_contribution', 'required_monthly', 'projected_completion', 'on_track', 'risk')
+        refresh_goal_projections(today=TODAY)
+        batch = list(GoalProjection.objects.order_by('goal_id').values_list(*fields))
+        GoalProjection.objects.all().delete()
+        for goal in FinancialGoal.objects.all():
+            refresh_goal_projections(FinancialGoal.objects.filter(pk=goal.pk), today=TODAY)
+        self.assertEqual(list(GoalProjection.objects.order_by('goal_id').values_list(*fields)), batch)
+
+    def test_ranked_goals_orders_by_priority_then_risk(self):
+        FinancialGoal.objects.filter(pk=self.young.pk).update(priority=1)
+        refresh_goal_projections(today=TODAY)
+        with self.assertNumQueries(1):
+            ranked = [(goal.title, goal.projection.risk) for goal in ranked_goals(self.user)]
+        self.assertEqual([title for title, _ in ranked], ['Laptop', 'Boat', 'House', 'Car'])